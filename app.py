@@ -1,8 +1,7 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for, send_from_directory
+from flask import Blueprint, Flask, render_template, jsonify, request, session, redirect, url_for, send_from_directory, send_file
 from flask_cors import CORS
 import logging
 from pathlib import Path
-import threading
 import time
 import json
 import os
@@ -10,53 +9,83 @@ import os
 import pycolmap
 
 from config import Config
-from models.login import login_required, LoginHandler
+from models.login import login_required, worker_token_required, LoginHandler
 from models.upload_handler import UploadHandler
 from models.viewer import ViewerManager
+from models.cost_estimator import CostEstimator
+from models.job_scheduler import JobScheduler
+from models.thumbnail import ThumbnailRenderer
+from models.artifact_store import ArtifactStore
+from models.model_stats import ModelStats
+from models.task_logger import task_log_manager
+from models.task_control import TaskControl, TaskCancelled, StageTimeout
+from models.presets import resolve_preset, file_digest, ResultCache
+from models.worker_queue import WorkQueue, RemotePipeline
+from models.admission import AdmissionController, AdmissionRejected
 
-# 初始化配置
-Config.init_dirs()
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOG_DIR / 'app.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# 创建Flask应用
-app = Flask(__name__, 
-           static_folder=Config.STATIC_DIR,
-           template_folder=Config.TEMPLATE_DIR)
-app.config['SECRET_KEY'] = Config.SECRET_KEY
-app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
-CORS(app)
+# 路由定义在蓝图上，目录、日志、Flask应用和后台线程在create_app()中初始化：
+# 阶段子进程以spawn方式启动，会以__mp_main__重新导入本模块，导入本身不能有这些副作用
+bp = Blueprint('main', __name__)
 
 # 初始化管理器
 login_handler = LoginHandler()
 upload_handler = UploadHandler()
 viewer_manager = ViewerManager()
+cost_estimator = CostEstimator()
+job_scheduler = JobScheduler()
+thumbnail_renderer = ThumbnailRenderer()
+artifact_store = ArtifactStore(thumbnail_renderer)
+result_cache = ResultCache()
+model_stats = ModelStats()
+work_queue = WorkQueue()
+remote_pipeline = RemotePipeline(work_queue)
 
 # 存储任务状态
 tasks = {}
+# 任务取消/超时控制（task_id -> TaskControl）
+task_controls = {}
+# 流式接收中的抽帧（task_id -> StreamingIngest），任务结束或排队中被取消时丢弃
+task_ingests = {}
 
 class TaskStatus:
     """任务状态跟踪"""
     UPLOADING = "uploading"
     UPLOADED = "uploaded"
+    QUEUED = "queued"
+    DEFERRED = "deferred"
     PROCESSING = "processing"
     TRAINING = "training"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
-def update_task_status(task_id, status, message="", progress=0, result=None):
-    """更新任务状态"""
+def active_tasks():
+    """已上传、尚未结束的任务（准入控制据此统计排队工作量和用户并发数）"""
+    active = (TaskStatus.QUEUED, TaskStatus.DEFERRED, TaskStatus.PROCESSING, TaskStatus.TRAINING)
+    return {task_id: task for task_id, task in list(tasks.items()) if task['status'] in active}
+
+admission = AdmissionController(job_scheduler, active_tasks)
+
+def rejection_response(rejection):
+    """准入拒绝的响应：429/503 + Retry-After"""
+    response = jsonify({
+        'success': False,
+        'message': f"{rejection}，请{rejection.retry_after}秒后重试",
+        'retry_after': rejection.retry_after
+    })
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response, rejection.status_code
+
+def update_task_status(task_id, status, message="", progress=0, result=None, owner=None):
+    """
+    更新任务状态
+    :param owner: 创建任务时记录所属用户（权限检查和准入控制按此判断，不依赖task_id前缀）
+    """
     if task_id not in tasks:
         tasks[task_id] = {
+            "owner": owner,
             "status": status,
             "message": message,
             "progress": progress,
@@ -72,13 +101,61 @@ def update_task_status(task_id, status, message="", progress=0, result=None):
             "result": result,
             "updated_at": time.time()
         })
+    
+    # 状态变化同时写入任务自己的日志
+    log_path = tasks[task_id].get('log_path')
+    if log_path:
+        task_log_manager.get_logger(log_path).info(f"[{status}] {message}")
+
+def parse_preset_options(raw):
+    """解析custom预设的覆盖参数（JSON对象），格式错误或不是对象时抛出ValueError"""
+    options = json.loads(raw or '{}')
+    if not isinstance(options, dict):
+        raise ValueError("preset_options必须是JSON对象")
+    return options
+
+def is_valid_scene_name(filename):
+    """请求体中的场景名（视频目录名）只能是单级目录名，不能含路径分隔符或.."""
+    return bool(filename) and '/' not in filename and '\\' not in filename and '..' not in filename
+
+def preview_result(username, filename, colmap_result):
+    """建图完成后的阶段性结果：稀疏预览链接（训练完成前即可查看）"""
+    result = {'username': username, 'filename': filename}
+    if colmap_result.get('preview_path'):
+        result['preview_url'] = f"/artifacts/{username}/{filename}/preview"
+    return result
+
+def task_state(task_id):
+    """任务状态的副本：运行中任务的资源统计取自TaskControl的加锁拷贝（采样线程同时在更新）"""
+    task = dict(tasks[task_id])
+    control = task_controls.get(task_id)
+    if control is not None:
+        task['resources'] = control.resources_snapshot()
+    return task
+
+def end_task_control(task_id):
+    """任务到达终态：保存最终的资源统计，移除TaskControl，释放准入预留"""
+    control = task_controls.get(task_id)
+    if control is not None:
+        tasks[task_id]['resources'] = control.resources_snapshot()
+    task_controls.pop(task_id, None)
+    task_ingests.pop(task_id, None)
+    admission.release_task(task_id)
+
+def update_task_eta(task_id, remaining_seconds):
+    """更新任务的预计剩余时间和预计完成时间"""
+    if task_id in tasks and remaining_seconds is not None:
+        tasks[task_id].update({
+            "remaining_seconds": remaining_seconds,
+            "eta": time.time() + remaining_seconds
+        })
 
-@app.route('/')
+@bp.route('/')
 def index():
     """首页"""
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     """登录页面"""
     if request.method == 'GET':
@@ -103,25 +180,30 @@ def login():
             'message': '用户名和密码不能为空'
         }), 401
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     """退出登录"""
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/upload', methods=['GET'])
+@bp.route('/upload', methods=['GET'])
 @login_required
 def upload_page():
     """上传页面"""
     username = session.get('username')
     return render_template('upload.html', username=username)
 
-@app.route('/upload/video', methods=['POST'])
+@bp.route('/upload/video', methods=['POST'])
 @login_required
 def upload_video():
     """上传视频文件"""
+    username = session.get('username')
+    # 在读取请求体之前做准入检查，超限时不接收上传
+    try:
+        admission_token = admission.admit(username, request.content_length)
+    except AdmissionRejected as e:
+        return rejection_response(e)
     try:
-        username = session.get('username')
         task_id = f"{username}_{int(time.time())}"
         
         # 检查文件
@@ -132,8 +214,15 @@ def upload_video():
         if file.filename == '':
             return jsonify({'success': False, 'message': '没有选择文件'}), 400
         
+        # 解析流水线预设（draft/balanced/quality/custom）
+        try:
+            preset_options = parse_preset_options(request.form.get('preset_options'))
+            preset = resolve_preset(request.form.get('preset'), preset_options)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'预设参数错误: {str(e)}'}), 400
+        
         # 更新任务状态
-        update_task_status(task_id, TaskStatus.UPLOADING, "开始上传文件...", 0)
+        update_task_status(task_id, TaskStatus.UPLOADING, "开始上传文件...", 0, owner=username)
         
         
         # 步骤1: 上传视频（在主线程中进行，避免file stream被关闭）
@@ -150,67 +239,471 @@ def upload_video():
         
         
         
-        # 异步处理生成COLMAP格式和训练
-        thread = threading.Thread(
-            target=process_colmap_and_train,
-            args=(username, video_info, task_id)
-        )
-        thread.daemon = True
-        thread.start()
+        return start_video_task(username, task_id, video_info, preset, file_digest(video_info['video_path']),
+                                admission_token=admission_token)
         
+    except Exception as e:
+        logger.error(f"上传错误: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        admission.finish_upload(admission_token)
+
+@bp.route('/upload/video/stream', methods=['PUT'])
+@login_required
+def upload_video_stream():
+    """
+    流式上传视频：请求体为视频原始字节，参数filename、preset、preset_options通过查询参数传递
+    可流式解码的容器在接收的同时抽帧，其他容器与/upload/video相同（上传完成后再抽帧）
+    """
+    username = session.get('username')
+    task_id = f"{username}_{int(time.time())}"
+    filename = request.args.get('filename', '')
+    if not filename:
+        return jsonify({'success': False, 'message': '缺少filename'}), 400
+    # 分块传输（无Content-Length）时Werkzeug会在MAX_CONTENT_LENGTH处静默截断，无法判断上传是否完整
+    if request.content_length is None:
+        return jsonify({'success': False, 'message': '缺少Content-Length'}), 411
+    if request.content_length > Config.MAX_CONTENT_LENGTH:
+        return jsonify({'success': False, 'message': f'视频过大（上限{Config.MAX_CONTENT_LENGTH}字节）'}), 413
+    try:
+        preset_options = parse_preset_options(request.args.get('preset_options'))
+        preset = resolve_preset(request.args.get('preset'), preset_options)
+        video_info = upload_handler.prepare_video_path(username, filename)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    try:
+        admission_token = admission.admit(username, request.content_length)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    
+    update_task_status(task_id, TaskStatus.UPLOADING, "上传视频文件中...", 10, owner=username)
+    from models.colmap_generator import ColmapGenerator
+    from models.stream_ingest import StreamingIngest
+    # 远程工作节点模式下由节点抽帧，只接收文件
+    ingest = StreamingIngest(video_info['video_path'], ColmapGenerator.with_settings(preset['colmap']),
+                             decode=Config.WORKER_MODE != "remote")
+    try:
+        ingest.receive(request.stream, request.content_length)
+        return start_video_task(username, task_id, video_info, preset, ingest.digest, ingest, admission_token)
+    except Exception as e:
+        logger.error(f"处理任务 {task_id} 出错: {str(e)}")
+        update_task_status(task_id, TaskStatus.FAILED, f"保存失败: {str(e)}", 0)
+        return jsonify({'success': False, 'task_id': task_id, 'message': str(e)}), 500
+    finally:
+        admission.finish_upload(admission_token)
+
+def start_video_task(username, task_id, video_info, preset, video_sha256, ingest=None, admission_token=None):
+    """
+    视频保存后的公共流程：查结果缓存、估计耗时、按预算提交到调度器
+    :param ingest: 流式接收时的StreamingIngest（上传期间已在抽帧），复用缓存或被拒绝时丢弃其抽帧结果
+    :param admission_token: 准入令牌，提交到调度器时磁盘预留转给任务，任务结束时释放
+    """
+    # 任务独立日志（异步写入，轮转压缩）
+    tasks[task_id]['log_path'] = str(Path(video_info['video_dir']) / "logs" / f"{task_id}.log")
+    tasks[task_id]['preset'] = preset
+    
+    # 相同视频以相同预设参数处理过时直接复用结果
+    cache_key = ResultCache.cache_key(username, video_sha256, preset)
+    cached = result_cache.lookup(cache_key)
+    if cached:
+        logger.info(f"任务 {task_id} 命中结果缓存: {cached['ply_path']}")
+        if ingest is not None:
+            ingest.discard()
+        update_task_status(task_id, TaskStatus.COMPLETED, "相同视频和预设已处理过，直接复用结果", 100, {
+            'ply_path': cached['ply_path'],
+            'username': username,
+            'filename': video_info['filename'],
+            'cached': True
+        })
+        task_log_manager.close(tasks[task_id]['log_path'])
         return jsonify({
             'success': True,
             'task_id': task_id,
-            'message': '开始上传和处理'
+            'preset': preset,
+            'cached': True,
+            'message': '复用已有结果'
         })
-        
+    
+    # 估计任务耗时（只读视频元数据）
+    estimate = None
+    try:
+        from models.colmap_generator import ColmapGenerator
+        estimate = cost_estimator.estimate(video_info['video_path'],
+                                           ColmapGenerator.with_settings(preset['colmap']),
+                                           preset['training']['iterations'])
+        tasks[task_id]['estimate'] = estimate
+        logger.info(f"任务 {task_id} 估计耗时 {estimate['total_seconds']}秒: {estimate['stages']}")
     except Exception as e:
-        logger.error(f"上传错误: {str(e)}")
-        return jsonify({'success': False, 'message': str(e)}), 500
+        logger.warning(f"任务 {task_id} 耗时估计失败: {str(e)}")
+    
+    # 超出耗时预算：拒绝或延后到空闲时执行；排队工作量偏高时同样延后
+    deferred = False
+    backlog = admission.should_defer()
+    if estimate and Config.JOB_TIME_BUDGET and estimate['total_seconds'] > Config.JOB_TIME_BUDGET:
+        message = f"预计耗时{estimate['total_seconds']:.0f}秒，超出预算{Config.JOB_TIME_BUDGET}秒"
+        if Config.JOB_OVER_BUDGET_POLICY == "reject":
+            update_task_status(task_id, TaskStatus.FAILED, f"{message}，已拒绝", 0)
+            if ingest is not None:
+                ingest.discard()
+            task_log_manager.close(tasks[task_id]['log_path'])
+            return jsonify({
+                'success': False,
+                'task_id': task_id,
+                'estimate': estimate,
+                'message': message
+            }), 422
+        deferred = True
+        update_task_status(task_id, TaskStatus.DEFERRED, f"{message}，将在空闲时处理", 20)
+    elif backlog:
+        deferred = True
+        update_task_status(task_id, TaskStatus.DEFERRED, f"{backlog}，将在空闲时处理", 20)
+    else:
+        update_task_status(task_id, TaskStatus.QUEUED, "视频文件上传完成，排队等待处理...", 20)
+    
+    if estimate:
+        update_task_eta(task_id, estimate['total_seconds'])
+    
+    # 提交到调度器，异步生成COLMAP格式和训练
+    task_controls[task_id] = TaskControl(task_id, workspace=video_info['video_dir'])
+    if ingest is not None:
+        task_ingests[task_id] = ingest
+    admission.attach(admission_token, task_id)
+    job_scheduler.submit(task_id, process_colmap_and_train,
+                         (username, video_info, task_id, estimate, preset, cache_key, ingest), deferred=deferred)
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'preset': preset,
+        'estimate': estimate,
+        'deferred': deferred,
+        'streamed': bool(ingest and ingest.streaming),
+        'message': '开始上传和处理'
+    })
 
-def process_colmap_and_train(username, video_info, task_id):
+def process_colmap_and_train(username, video_info, task_id, estimate=None, preset=None, cache_key=None, ingest=None):
     """处理COLMAP格式生成和训练过程"""
+    control = task_controls.get(task_id) or TaskControl(task_id)
+    preset = preset or resolve_preset()
+    prepared = None
     try:
-        update_task_status(task_id, TaskStatus.UPLOADING, "视频文件上传完成...", 20)
-            
-        # 步骤1: 生成COLMAP数据
+        # 步骤1: 生成COLMAP数据（独立进程，可取消/超时终止）
+        control.check()
         update_task_status(task_id, TaskStatus.PROCESSING, "正在生成COLMAP格式数据...", 30)
-        from models.colmap_generator import ColmapGenerator
-        colmap_gen = ColmapGenerator()
-        colmap_result = colmap_gen.generate_from_video(video_info['video_path'])
+        if estimate:
+            update_task_eta(task_id, estimate['total_seconds'])
+        # 输出目录将被覆盖，旧的缓存记录随之失效
+        result_cache.invalidate(video_info['video_dir'])
+        remote = Config.WORKER_MODE == "remote"
+        if remote:
+            colmap_result = remote_pipeline.generate_from_video(task_id, video_info['video_path'], preset['colmap'],
+                                                                control)
+        else:
+            # 流式接收时抽帧已与上传重叠进行，这里只等待收尾
+            prepared = ingest.finish() if ingest is not None else None
+            from models.colmap_generator import generate_from_video_stage
+            colmap_result = control.run_in_subprocess("colmap", generate_from_video_stage,
+                                                      (video_info['video_path'], preset['colmap'], None,
+                                                       prepared['frames_dir'] if prepared else None))
         
         if not colmap_result['success']:
             update_task_status(task_id, TaskStatus.FAILED, f"生成COLMAP数据失败: {colmap_result['message']}", 30)
             return
         
-        update_task_status(task_id, TaskStatus.TRAINING, f"生成COLMAP数据成功，开始训练高斯溅射模型...", 50)
-        
+        stage_result = preview_result(username, video_info['filename'], colmap_result)
+        update_task_status(task_id, TaskStatus.TRAINING, f"生成COLMAP数据成功，开始训练高斯溅射模型...", 50,
+                           stage_result)
+        if estimate:
+            cost_estimator.record(estimate, colmap_result=colmap_result)
+            update_task_eta(task_id, cost_estimator.remaining_seconds(
+                estimate, ("extract", "features", "matching", "mapping")))
         
         # 步骤2: 训练模型
-        from models.trainer import ModelTrainer
-        trainer = ModelTrainer()
-        training_result = trainer.train(colmap_result['colmap_path'])
+        if remote:
+            training_result = remote_pipeline.train(task_id, colmap_result['colmap_dir'], preset['training'], control)
+        else:
+            from models.scene_partition import ScenePartitioner
+            task_log = task_log_manager.get_logger(tasks[task_id]['log_path'])
+            if ScenePartitioner.should_partition(colmap_result['stats']['num_images']):
+                # 大场景：按空间分块并行训练再合并
+                training_result = ScenePartitioner().train(colmap_result['colmap_dir'], extra_args=preset['training'],
+                                                           task_log=task_log, control=control)
+            else:
+                from models.trainer import ModelTrainer
+                trainer = ModelTrainer()
+                training_result = trainer.train(colmap_result['colmap_dir'], extra_args=preset['training'],
+                                                task_log=task_log, control=control)
+        if estimate and not training_result.get('partitioned'):
+            # 分块训练为并行耗时，不计入单次训练的耗时样本
+            cost_estimator.record(estimate, training_result=training_result)
         
         if not training_result['success']:
             update_task_status(task_id, TaskStatus.FAILED, f"模型训练失败: {training_result['message']}", 50)
             return
         
         # 步骤3: 完成
-        update_task_status(task_id, TaskStatus.COMPLETED, 
-                          "模型训练完成", 100,
-                          {
-                              'ply_path': training_result['ply_path'],
-                              'username': username,
-                              'filename': video_info['filename']
-                          })
+        result = dict(stage_result, ply_path=training_result['ply_path'])
+        if training_result.get('partitioned'):
+            result['partition'] = training_result['cells']
+        update_task_status(task_id, TaskStatus.COMPLETED, "模型训练完成", 100, result)
+        if cache_key:
+            result_cache.store(cache_key, video_info['video_dir'], preset, result, control.resources_snapshot())
         
         logger.info(f"任务 {task_id} 完成: {training_result['ply_path']}")
         
+        # 预先生成缩略图，任务列表无需启动查看器
+        thumbnail_renderer.get_thumbnail(username, video_info['filename'])
+        
+    except TaskCancelled:
+        logger.info(f"任务 {task_id} 已取消")
+        update_task_status(task_id, TaskStatus.CANCELLED, "任务已取消", tasks[task_id]['progress'])
+    except StageTimeout as e:
+        logger.error(f"任务 {task_id} 超时: {str(e)}")
+        update_task_status(task_id, TaskStatus.FAILED, f"处理超时: {str(e)}", tasks[task_id]['progress'])
     except Exception as e:
         logger.error(f"处理任务 {task_id} 出错: {str(e)}")
         update_task_status(task_id, TaskStatus.FAILED, f"处理失败: {str(e)}", 0)
+    finally:
+        if ingest is not None and prepared is None:
+            # 抽帧结果未被使用（开始前已取消、远程模式等）：停止解码并删除抽帧
+            ingest.discard()
+        end_task_control(task_id)
+        task_log_manager.close(tasks[task_id]['log_path'])
+
+@bp.route('/api/extend', methods=['POST'])
+@login_required
+def extend_scene():
+    """扩展场景：把同一场景的新视频注册进已有重建，并从已有模型继续训练"""
+    username = session.get('username')
+    try:
+        admission_token = admission.admit(username, request.content_length)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    try:
+        filename = request.form.get('filename', '')
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'success': False, 'message': '没有选择文件'}), 400
+        if not filename:
+            return jsonify({'success': False, 'message': '缺少要扩展的场景filename'}), 400
+        if not is_valid_scene_name(filename):
+            return jsonify({'success': False, 'message': 'filename不合法'}), 400
+        
+        colmap_dir = Config.DATA_DIR / username / filename / "colmap"
+        if not (colmap_dir / "database.db").exists() or not (Config.sparse_model_dir(colmap_dir) / "images.bin").exists():
+            return jsonify({'success': False, 'message': '场景的COLMAP重建结果不存在'}), 404
+        
+        video_info = upload_handler.save_extension_video(username, filename, request.files['file'])
+        if not video_info['success']:
+            return jsonify({'success': False, 'message': video_info['message']}), 500
+        
+        task_id = f"{username}_extend_{int(time.time())}"
+        update_task_status(task_id, TaskStatus.QUEUED, "新视频上传完成，排队等待扩展场景...", 20, owner=username)
+        tasks[task_id]['log_path'] = str(Path(video_info['video_dir']) / "logs" / f"{task_id}.log")
+        task_controls[task_id] = TaskControl(task_id, workspace=video_info['video_dir'])
+        admission.attach(admission_token, task_id)
+        job_scheduler.submit(task_id, process_extend_scene, (username, video_info, task_id))
+    finally:
+        admission.finish_upload(admission_token)
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'message': '开始扩展场景'
+    })
+
+def process_extend_scene(username, video_info, task_id):
+    """扩展场景：增量注册新帧，再从检查点微调模型"""
+    control = task_controls.get(task_id) or TaskControl(task_id)
+    video_dir = Path(video_info['video_dir'])
+    # 沿用场景原来的预设，保证新帧的特征分辨率与已有帧一致
+    job = ResultCache.read_job(video_dir)
+    preset = job['preset'] if job else resolve_preset()
+    try:
+        control.check()
+        update_task_status(task_id, TaskStatus.PROCESSING, "正在注册新视频帧到已有场景...", 30)
+        result_cache.invalidate(video_dir)
+        from models.colmap_generator import extend_scene_stage
+        colmap_result = control.run_in_subprocess("colmap", extend_scene_stage,
+                                                  (video_info['video_path'], str(video_dir / "colmap"), preset['colmap']))
+        if not colmap_result['success']:
+            update_task_status(task_id, TaskStatus.FAILED, f"注册新视频帧失败: {colmap_result['message']}", 30)
+            return
+        
+        stats = colmap_result['stats']
+        stage_result = preview_result(username, video_info['filename'], colmap_result)
+        update_task_status(task_id, TaskStatus.TRAINING,
+                           f"新帧注册{stats['num_new_registered']}/{stats['num_new_frames']}张，开始继续训练...", 50,
+                           stage_result)
+        
+        from models.trainer import ModelTrainer
+        task_log = task_log_manager.get_logger(tasks[task_id]['log_path'])
+        training_extra_args = {k: v for k, v in preset['training'].items() if k != 'iterations'}
+        training_result = ModelTrainer().fine_tune(colmap_result['colmap_dir'], extra_args=training_extra_args,
+                                                   task_log=task_log, control=control)
+        if not training_result['success']:
+            update_task_status(task_id, TaskStatus.FAILED, f"模型训练失败: {training_result['message']}", 50)
+            return
+        
+        result = dict(
+            stage_result,
+            ply_path=training_result['ply_path'],
+            registration=stats,
+            resumed_from=training_result.get('resumed_from'))
+        # 扩展后的场景不再对应原视频，重新记录任务信息但不登记缓存（后续扩展仍沿用该预设）
+        ResultCache.write_job(video_dir, preset, result, control.resources_snapshot())
+        update_task_status(task_id, TaskStatus.COMPLETED, "场景扩展完成", 100, result)
+        thumbnail_renderer.get_thumbnail(username, video_info['filename'])
+        
+    except TaskCancelled:
+        update_task_status(task_id, TaskStatus.CANCELLED, "任务已取消", tasks[task_id]['progress'])
+    except StageTimeout as e:
+        update_task_status(task_id, TaskStatus.FAILED, f"处理超时: {str(e)}", tasks[task_id]['progress'])
+    except Exception as e:
+        logger.error(f"扩展场景任务 {task_id} 出错: {str(e)}")
+        update_task_status(task_id, TaskStatus.FAILED, f"扩展场景失败: {str(e)}", 0)
+    finally:
+        end_task_control(task_id)
+        task_log_manager.close(tasks[task_id]['log_path'])
+
+@bp.route('/api/sweep', methods=['POST'])
+@login_required
+def start_sweep():
+    """参数扫描：复用已有的COLMAP结果，并发训练多组参数"""
+    username = session.get('username')
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    variants = data.get('variants') or data.get('grid')
+    max_parallel = data.get('max_parallel')
+    
+    if not filename or not variants:
+        return jsonify({'success': False, 'message': '缺少filename或参数组'}), 400
+    if not is_valid_scene_name(filename):
+        return jsonify({'success': False, 'message': 'filename不合法'}), 400
+    if max_parallel is not None and (not isinstance(max_parallel, int) or isinstance(max_parallel, bool)
+                                     or max_parallel < 1):
+        return jsonify({'success': False, 'message': 'max_parallel必须是正整数'}), 400
+    from models.sweep import TrainingSweep
+    try:
+        variants = TrainingSweep.validate_variants(variants)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    video_dir = Config.DATA_DIR / username / filename
+    if not (Config.sparse_model_dir(video_dir / "colmap") / "images.bin").exists():
+        return jsonify({'success': False, 'message': 'COLMAP稀疏重建结果不存在'}), 404
+    
+    task_id = f"{username}_sweep_{int(time.time())}"
+    update_task_status(task_id, TaskStatus.QUEUED, "排队等待参数扫描...", 50, owner=username)
+    task_controls[task_id] = TaskControl(task_id, workspace=str(video_dir))
+    job_scheduler.submit(task_id, process_sweep, (video_dir / "colmap", variants, max_parallel, task_id))
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'message': '参数扫描已开始'
+    })
+
+def process_sweep(colmap_dir, variants, max_parallel, task_id):
+    """执行参数扫描并记录对比结果"""
+    control = task_controls.get(task_id) or TaskControl(task_id)
+    try:
+        control.check()
+        update_task_status(task_id, TaskStatus.TRAINING, "参数扫描训练中...", 50)
+        from models.sweep import TrainingSweep
+        sweep_result = TrainingSweep(max_parallel).run(colmap_dir, variants, control=control)
+        
+        if not sweep_result['success']:
+            update_task_status(task_id, TaskStatus.FAILED, sweep_result['message'], 50)
+            return
+        
+        update_task_status(task_id, TaskStatus.COMPLETED, sweep_result['message'], 100, {
+            'output_root': sweep_result['output_root'],
+            'table': sweep_result['table']
+        })
+        
+    except TaskCancelled:
+        update_task_status(task_id, TaskStatus.CANCELLED, "任务已取消", tasks[task_id]['progress'])
+    except StageTimeout as e:
+        update_task_status(task_id, TaskStatus.FAILED, f"处理超时: {str(e)}", tasks[task_id]['progress'])
+    except Exception as e:
+        logger.error(f"参数扫描任务 {task_id} 出错: {str(e)}")
+        update_task_status(task_id, TaskStatus.FAILED, f"参数扫描失败: {str(e)}", 0)
+    finally:
+        end_task_control(task_id)
+
+@bp.route('/api/partition', methods=['POST'])
+@login_required
+def start_partition_training():
+    """分块训练：复用已有的COLMAP结果，按空间分块并行训练后合并为一个模型"""
+    username = session.get('username')
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    if not filename:
+        return jsonify({'success': False, 'message': '缺少filename'}), 400
+    if not is_valid_scene_name(filename):
+        return jsonify({'success': False, 'message': 'filename不合法'}), 400
+    max_images_per_cell, max_parallel = data.get('max_images_per_cell'), data.get('max_parallel')
+    for name, value in (('max_images_per_cell', max_images_per_cell), ('max_parallel', max_parallel)):
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            return jsonify({'success': False, 'message': f'{name}必须是正整数'}), 400
+    
+    video_dir = Config.DATA_DIR / username / filename
+    if not (Config.sparse_model_dir(video_dir / "colmap") / "images.bin").exists():
+        return jsonify({'success': False, 'message': 'COLMAP稀疏重建结果不存在'}), 404
+    
+    task_id = f"{username}_partition_{int(time.time())}"
+    update_task_status(task_id, TaskStatus.QUEUED, "排队等待分块训练...", 50, owner=username)
+    tasks[task_id]['log_path'] = str(video_dir / "logs" / f"{task_id}.log")
+    task_controls[task_id] = TaskControl(task_id, workspace=str(video_dir))
+    job_scheduler.submit(task_id, process_partition_training,
+                         (username, filename, task_id, max_images_per_cell, max_parallel))
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'message': '分块训练已开始'
+    })
+
+def process_partition_training(username, filename, task_id, max_images_per_cell, max_parallel):
+    """执行分块训练，合并模型覆盖场景原有的输出"""
+    control = task_controls.get(task_id) or TaskControl(task_id)
+    video_dir = Config.DATA_DIR / username / filename
+    job = ResultCache.read_job(video_dir)
+    preset = job['preset'] if job else resolve_preset()
+    try:
+        control.check()
+        update_task_status(task_id, TaskStatus.TRAINING, "分块训练中...", 50)
+        result_cache.invalidate(video_dir)
+        from models.scene_partition import ScenePartitioner
+        task_log = task_log_manager.get_logger(tasks[task_id]['log_path'])
+        training_result = ScenePartitioner(max_images_per_cell, max_parallel=max_parallel).train(
+            video_dir / "colmap", extra_args=preset['training'], task_log=task_log, control=control)
+        if not training_result['success']:
+            update_task_status(task_id, TaskStatus.FAILED, training_result['message'], 50)
+            return
+        
+        result = {
+            'ply_path': training_result['ply_path'],
+            'num_gaussians': training_result['num_gaussians'],
+            'partition': training_result['cells'],
+        }
+        # 开始时删除了job.json，重新记录（预设不变，后续扩展/分块训练仍沿用）；不登记缓存
+        ResultCache.write_job(video_dir, preset, result, control.resources_snapshot())
+        update_task_status(task_id, TaskStatus.COMPLETED, training_result['message'], 100, result)
+        thumbnail_renderer.get_thumbnail(username, filename)
+        
+    except TaskCancelled:
+        update_task_status(task_id, TaskStatus.CANCELLED, "任务已取消", tasks[task_id]['progress'])
+    except StageTimeout as e:
+        update_task_status(task_id, TaskStatus.FAILED, f"处理超时: {str(e)}", tasks[task_id]['progress'])
+    except Exception as e:
+        logger.error(f"分块训练任务 {task_id} 出错: {str(e)}")
+        update_task_status(task_id, TaskStatus.FAILED, f"分块训练失败: {str(e)}", 0)
+    finally:
+        end_task_control(task_id)
+        task_log_manager.close(tasks[task_id]['log_path'])
 
-@app.route('/task/status/<task_id>')
+@bp.route('/task/status/<task_id>')
 @login_required
 def get_task_status(task_id):
     """获取任务状态"""
@@ -223,10 +716,69 @@ def get_task_status(task_id):
     
     return jsonify({
         'success': True,
-        'task': task
+        'task': task_state(task_id)
     })
 
-@app.route('/viewer/<username>/<filename>')
+@bp.route('/task/cancel/<task_id>', methods=['POST'])
+@login_required
+def cancel_task(task_id):
+    """取消任务：排队中的直接移出队列，运行中的终止当前阶段的进程组"""
+    username = session.get('username')
+    task = tasks.get(task_id)
+    if not task or task.get('owner') != username:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    
+    control = task_controls.get(task_id)
+    if control is None or task['status'] in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED):
+        return jsonify({'success': False, 'message': f"任务当前状态（{task['status']}）无法取消"}), 409
+    
+    if job_scheduler.cancel(task_id):
+        # 尚未开始运行，直接结束；流式接收的抽帧随之停止并删除
+        ingest = task_ingests.get(task_id)
+        if ingest is not None:
+            ingest.discard()
+        end_task_control(task_id)
+        update_task_status(task_id, TaskStatus.CANCELLED, "任务已取消", task['progress'])
+        task_log_manager.close(task['log_path'])
+        message = '任务已从队列移除'
+    else:
+        control.cancel()
+        message = '正在终止任务'
+    
+    return jsonify({'success': True, 'task_id': task_id, 'message': message})
+
+@bp.route('/api/task/<task_id>/log')
+@login_required
+def get_task_log(task_id):
+    """
+    按偏移量读取任务日志，便于前端增量拉取
+    参数: offset（默认0）、unit（bytes或lines，默认bytes）、limit（最多字节数/行数，不超过TASK_LOG_READ_MAX_BYTES/LINES）
+    """
+    username = session.get('username')
+    task = tasks.get(task_id)
+    if not task or task.get('owner') != username:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    
+    log_path = task.get('log_path')
+    if not log_path or not Path(log_path).exists():
+        return jsonify({'success': False, 'message': '任务日志不存在'}), 404
+    
+    unit = request.args.get('unit', 'bytes')
+    if unit not in ('bytes', 'lines'):
+        return jsonify({'success': False, 'message': 'unit只能是bytes或lines'}), 400
+    
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'offset和limit必须是整数'}), 400
+    if offset < 0:
+        return jsonify({'success': False, 'message': 'offset不能为负'}), 400
+    
+    log_chunk = task_log_manager.read(log_path, offset, unit, limit)
+    return jsonify(dict(log_chunk, success=True, status=task['status']))
+
+@bp.route('/viewer/<username>/<filename>')
 @login_required
 def viewer_page(username, filename):
     """查看器页面"""
@@ -257,7 +809,74 @@ def viewer_page(username, filename):
                          ply_exists=True,
                          viewer_url=viewer_url)
 
-@app.route('/api/viewer/start', methods=['POST'])
+@bp.route('/api/model/<username>/<filename>/stats')
+@login_required
+def get_model_stats(username, filename):
+    """模型统计（高斯数、包围盒、不透明度/尺度直方图、球谐阶数、文件大小、稀疏模型规模）"""
+    if username != session.get('username'):
+        return jsonify({'success': False, 'message': '没有权限访问'}), 403
+    
+    try:
+        stats = model_stats.get_model_stats(username, filename)
+    except Exception as e:
+        logger.error(f"统计模型失败 {username}/{filename}: {str(e)}")
+        return jsonify({'success': False, 'message': f'统计模型失败: {str(e)}'}), 500
+    if stats is None or (stats['model'] is None and stats['sparse'] is None):
+        return jsonify({'success': False, 'message': '模型不存在'}), 404
+    
+    return jsonify(dict(stats, success=True))
+
+@bp.route('/thumbnail/<username>/<filename>')
+@login_required
+def model_thumbnail(username, filename):
+    """模型缩略图（CPU渲染，缓存在PLY旁边）"""
+    current_user = session.get('username')
+    if current_user != username:
+        return jsonify({'success': False, 'message': '没有权限访问'}), 403
+    
+    thumbnail_path = thumbnail_renderer.get_thumbnail(username, filename)
+    if thumbnail_path is None:
+        return jsonify({'success': False, 'message': '缩略图不存在'}), 404
+    
+    return send_file(thumbnail_path, mimetype='image/jpeg', conditional=True)
+
+@bp.route('/artifacts/<username>/<filename>/<path:artifact>')
+@login_required
+def download_artifact(username, filename, artifact):
+    """
+    产物下载：model / thumbnail / log / cameras / sparse/<file>
+    强ETag（内容哈希）+ If-None-Match + Range断点续传；无Range请求时优先返回预压缩的gzip副本
+    """
+    current_user = session.get('username')
+    if current_user != username:
+        return jsonify({'success': False, 'message': '没有权限访问'}), 403
+    
+    path = artifact_store.resolve(username, filename, artifact)
+    if path is None:
+        return jsonify({'success': False, 'message': '产物不存在'}), 404
+    
+    meta = artifact_store.describe(path)
+    use_gzip = ('gzip_path' in meta
+                and 'Range' not in request.headers
+                and 'gzip' in request.accept_encodings)
+    
+    # 模型和稀疏模型作为附件下载，其余（缩略图、日志、相机）直接显示
+    as_attachment = artifact == 'model' or artifact.startswith('sparse/')
+    mimetype = 'text/plain' if path.suffix == '.log' else None
+    if use_gzip:
+        response = send_file(meta['gzip_path'], mimetype=mimetype or 'application/octet-stream',
+                             as_attachment=as_attachment, download_name=path.name,
+                             conditional=True, etag=f"{meta['sha256']}-gz")
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=path.name,
+                             conditional=True, etag=meta['sha256'])
+    
+    response.vary.add('Accept-Encoding')
+    response.cache_control.private = True
+    return response
+
+@bp.route('/api/viewer/start', methods=['POST'])
 @login_required
 def start_viewer():
     """启动查看器API"""
@@ -278,7 +897,7 @@ def start_viewer():
         logger.error(f"启动查看器失败: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/viewer/stop')
+@bp.route('/api/viewer/stop')
 @login_required
 def stop_viewer():
     """停止查看器"""
@@ -288,13 +907,39 @@ def stop_viewer():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/tasks')
+@bp.route('/api/scheduler/status')
+@login_required
+def scheduler_status():
+    """调度器状态：各队列的任务数，任务ID和排队位置只列出当前用户自己的任务"""
+    username = session.get('username')
+    status = job_scheduler.get_status()
+    own = lambda tid: tasks.get(tid, {}).get('owner') == username
+    scheduler = {'max_concurrent': status['max_concurrent']}
+    for name in ('running', 'queued', 'deferred'):
+        scheduler[f'{name}_count'] = len(status[name])
+        scheduler[name] = [tid for tid in status[name] if own(tid)]
+    # 排队位置从1开始（延后的任务排在所有排队任务之后）
+    waiting = status['queued'] + status['deferred']
+    scheduler['positions'] = {tid: index + 1 for index, tid in enumerate(waiting) if own(tid)}
+    return jsonify({
+        'success': True,
+        'scheduler': scheduler,
+        'admission': admission.get_status()
+    })
+
+@bp.route('/tasks')
 @login_required
 def list_tasks():
     """列出用户的任务"""
     username = session.get('username')
-    user_tasks = {tid: task for tid, task in tasks.items() 
-                  if tid.startswith(f"{username}_")}
+    user_tasks = {tid: task_state(tid) for tid, task in list(tasks.items()) 
+                  if task.get('owner') == username}
+    
+    # 已完成的任务附带缩略图地址（首次访问时在CPU上生成并缓存）
+    for task in user_tasks.values():
+        result = task.get('result') or {}
+        if task['status'] == TaskStatus.COMPLETED and result.get('filename'):
+            task['thumbnail_url'] = url_for('main.model_thumbnail', username=username, filename=result['filename'])
     
     return jsonify({
         'success': True,
@@ -302,17 +947,135 @@ def list_tasks():
         'count': len(user_tasks)
     })
 
-@app.route('/static/<path:filename>')
+@bp.route('/api/worker/claim', methods=['POST'])
+@worker_token_required
+def worker_claim():
+    """工作节点领取阶段任务，参数: worker_id、stages（可执行的阶段列表）"""
+    data = request.get_json(silent=True) or {}
+    worker_id = data.get('worker_id')
+    if not worker_id:
+        return jsonify({'success': False, 'message': '缺少worker_id'}), 400
+    job = work_queue.claim(worker_id, data.get('stages'))
+    if job is not None:
+        task = tasks.get(job['task_id'])
+        if task is not None:
+            task_log_manager.get_logger(task['log_path']).info(f"{job['stage']}阶段由工作节点 {worker_id} 执行")
+    return jsonify({'success': True, 'job': job})
+
+@bp.route('/api/worker/jobs/<job_id>/heartbeat', methods=['POST'])
+@worker_token_required
+def worker_heartbeat(job_id):
+    """续约；返回cancel=true时节点应终止当前阶段，租约已失效返回409"""
+    data = request.get_json(silent=True) or {}
+    state = work_queue.heartbeat(job_id, data.get('worker_id'), data.get('message'))
+    if state is None:
+        return jsonify({'success': False, 'message': '租约已失效'}), 409
+    return jsonify({'success': True, **state})
+
+@bp.route('/api/worker/jobs/<job_id>/inputs/<name>')
+@worker_token_required
+def worker_input(job_id, name):
+    """节点拉取阶段输入（视频或COLMAP归档）"""
+    path = work_queue.input_path(job_id, request.args.get('worker_id'), name)
+    if path is None or not Path(path).exists():
+        return jsonify({'success': False, 'message': '输入不存在或租约已失效'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=Path(path).name, conditional=True)
+
+@bp.route('/api/worker/jobs/<job_id>/artifact', methods=['PUT'])
+@worker_token_required
+def worker_upload_artifact(job_id):
+    """
+    节点上传结果归档（请求体为tar原始字节）
+    按Content-Length分块直接写盘，不受MAX_CONTENT_LENGTH限制（训练输出含检查点，通常远大于上传视频），
+    上限为WORKER_MAX_ARTIFACT_BYTES
+    """
+    target = work_queue.artifact_target(job_id, request.args.get('worker_id'))
+    if target is None:
+        return jsonify({'success': False, 'message': '租约已失效'}), 409
+    length = request.headers.get('Content-Length', type=int)
+    if length is None:
+        return jsonify({'success': False, 'message': '缺少Content-Length'}), 411
+    if length > Config.WORKER_MAX_ARTIFACT_BYTES:
+        return jsonify({'success': False, 'message': f'结果归档过大（上限{Config.WORKER_MAX_ARTIFACT_BYTES}字节）'}), 413
+    
+    stream = request.environ['wsgi.input']
+    tmp_path = target.with_name(f".{target.name}.tmp")
+    received = 0
+    with open(tmp_path, 'wb') as f:
+        while received < length:
+            chunk = stream.read(min(Config.WORKER_TRANSFER_CHUNK_SIZE, length - received))
+            if not chunk:
+                break
+            f.write(chunk)
+            received += len(chunk)
+    if received != length:
+        tmp_path.unlink()
+        return jsonify({'success': False, 'message': f'上传不完整（{received}/{length}字节）'}), 400
+    os.replace(tmp_path, target)
+    return jsonify({'success': True, 'size': received})
+
+@bp.route('/api/worker/jobs/<job_id>/complete', methods=['POST'])
+@worker_token_required
+def worker_complete(job_id):
+    """节点提交阶段结果（成功时需先上传结果归档）"""
+    data = request.get_json(silent=True) or {}
+    worker_id = data.get('worker_id')
+    result = data.get('result') or {'success': False, 'message': '工作节点未返回结果'}
+    artifact_path = None
+    if result.get('success'):
+        artifact_path = work_queue.artifact_target(job_id, worker_id)
+        if artifact_path is None or not artifact_path.exists():
+            return jsonify({'success': False, 'message': '结果归档未上传或租约已失效'}), 409
+    if not work_queue.complete(job_id, worker_id, result, artifact_path):
+        return jsonify({'success': False, 'message': '租约已失效'}), 409
+    return jsonify({'success': True})
+
+@bp.route('/api/worker/status')
+@worker_token_required
+def worker_status():
+    """阶段任务队列状态"""
+    return jsonify({'success': True, 'mode': Config.WORKER_MODE, 'jobs': work_queue.get_status()})
+
+@bp.route('/static/<path:filename>')
 def static_files(filename):
     """静态文件服务"""
     return send_from_directory(Config.STATIC_DIR, filename)
 
-@app.errorhandler(413)
+@bp.app_errorhandler(413)
 def too_large(e):
     """文件太大错误处理"""
     return jsonify({'success': False, 'message': '文件太大'}), 413
 
+def create_app():
+    """初始化目录和日志，创建Flask应用并启动任务调度线程"""
+    Config.check_worker_mode()
+    Config.init_dirs()
+    
+    # 配置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(Config.LOG_DIR / 'app.log'),
+            logging.StreamHandler()
+        ]
+    )
+    
+    # 创建Flask应用
+    app = Flask(__name__, 
+               static_folder=Config.STATIC_DIR,
+               template_folder=Config.TEMPLATE_DIR)
+    app.config['SECRET_KEY'] = Config.SECRET_KEY
+    app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+    CORS(app)
+    app.register_blueprint(bp)
+    
+    job_scheduler.start()
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     logger.info(f"启动服务器: {Config.HOST}:{Config.PORT}")
     
     print(pycolmap.__version__)
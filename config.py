@@ -19,6 +19,10 @@ class Config:
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB
     ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
     UPLOAD_CHUNK_SIZE = 8192
+    # 流式接收：可流式解码的容器（MKV、moov在前或分片的MP4）边上传边抽帧
+    STREAM_INGEST_ENABLED = True
+    STREAM_INGEST_PROBE_BYTES = 64 * 1024  # 判断容器能否流式解码时读取的文件头大小
+    STREAM_INGEST_MIN_DECODED_RATIO = 0.95  # 流式解码帧数低于完整文件帧数的该比例时重新抽帧
     
     
     # ==================== Conda 环境基础配置 ====================
@@ -52,6 +56,70 @@ class Config:
     GAUSSIAN_TRAINING_ARGS = {
         "iterations": 30000,  # 训练迭代数
     }
+    GAUSSIAN_SAVE_CHECKPOINT = True  # 训练结束时保存检查点（扩展场景时从检查点继续训练）
+    EXTEND_TRAINING_ITERATIONS = 7000  # 扩展场景后在检查点基础上追加的迭代数
+    # 参数扫描最大并发训练数（None表示按可用GPU数量，无GPU时为1）
+    SWEEP_MAX_PARALLEL = None
+
+    # ==================== 流水线预设 ====================
+    # 每个预设同时决定抽帧数量、匹配策略、特征分辨率和训练参数，上传时选择；
+    # custom在某个预设基础上覆盖单项参数。max_frames为抽帧上限（超出时自动加大抽帧间隔），None表示不限制
+    PIPELINE_PRESETS = {
+        "draft": {
+            "colmap": {"frame_interval": 10, "max_frames": 150, "matcher": "sequential",
+                       "max_image_size": 480, "sift_num_octaves": 4, "camera_model": "PINHOLE"},
+            "training": {"iterations": 7000, "resolution": 4},
+        },
+        "balanced": {
+            "colmap": {"frame_interval": 10, "max_frames": 400, "matcher": "exhaustive",
+                       "max_image_size": 640, "sift_num_octaves": 8, "camera_model": "PINHOLE"},
+            "training": {"iterations": 30000, "resolution": -1},
+        },
+        "quality": {
+            "colmap": {"frame_interval": 5, "max_frames": None, "matcher": "exhaustive",
+                       "max_image_size": 1600, "sift_num_octaves": 8, "camera_model": "PINHOLE"},
+            "training": {"iterations": 30000, "resolution": 1},
+        },
+    }
+    DEFAULT_PRESET = "balanced"
+    RESULT_CACHE_PATH = DATA_DIR / "result_cache.json"  # (视频, 预设) -> 已训练模型
+
+    # ==================== COLMAP 分段重建配置 ====================
+    # 抽帧数达到该值时自动切分为重叠段并行重建，再通过共享帧对齐合并
+    COLMAP_SEGMENTED_MIN_FRAMES = 300
+    COLMAP_SEGMENT_SIZE = 120  # 每段帧数
+    COLMAP_SEGMENT_OVERLAP = 30  # 相邻段重叠帧数（用于子模型对齐）
+    COLMAP_SEGMENT_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # 并行重建进程数
+
+    # ==================== 特征匹配缓存配置 ====================
+    # 按帧内容哈希缓存SIFT特征和已验证的匹配，重跑、相同间隔重新抽帧、重叠片段只处理新增的帧和图像对
+    FEATURE_CACHE_ENABLED = True
+    FEATURE_CACHE_PATH = DATA_DIR / "feature_cache.db"
+    FEATURE_CACHE_MAX_BYTES = 20 * 1024 ** 3  # 特征总大小上限，超出时淘汰最久未用的图像
+    FEATURE_CACHE_LOCK_TIMEOUT = 120  # 多个重建进程同时写缓存时等待锁的秒数
+
+    # ==================== 重建回退策略配置 ====================
+    # 单段重建失败或注册比例过低时，用多组参数变体并行重建，采用注册比例最高的模型
+    RECONSTRUCTION_FALLBACK_ENABLED = True
+    RECONSTRUCTION_MIN_REGISTERED_RATIO = 0.5  # 首次重建注册比例低于该值时启动回退
+    RECONSTRUCTION_GOOD_RATIO = 0.9  # 某个变体达到该注册比例时立即采用，终止其余尝试
+    RECONSTRUCTION_FALLBACK_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))  # 同时运行的变体数
+    # 变体参数覆盖ColmapGenerator的属性，以_scale结尾的键表示按比例缩放原值
+    # 不提供带畸变的相机模型变体：gaussian-splatting只接受PINHOLE/SIMPLE_PINHOLE的稀疏模型
+    RECONSTRUCTION_FALLBACK_VARIANTS = [
+        {"name": "dense_frames", "frame_interval_scale": 0.5, "max_frames_scale": 2},
+        {"name": "high_res", "max_image_size_scale": 2},
+        {"name": "relaxed_matches", "min_num_matches": 8, "init_min_num_inliers": 50, "abs_pose_min_num_inliers": 15},
+    ]
+
+    # ==================== 场景分块训练配置 ====================
+    # 注册图像数达到该值时，按相机位置和稀疏点密度把场景切分为重叠的空间分块并行训练，再合并PLY
+    PARTITION_ENABLED = True
+    PARTITION_MIN_IMAGES = 600
+    PARTITION_MAX_IMAGES_PER_CELL = 300  # 每个分块（不含重叠区）的相机数上限
+    PARTITION_OVERLAP = 0.15  # 分块向外扩展的比例（相对分块尺寸），扩展区只用于训练，合并时裁掉
+    PARTITION_VISIBILITY_RATIO = 0.25  # 相机在扩展区外、但观测点有该比例落在分块内时也加入该分块
+    PARTITION_MAX_PARALLEL = None  # 同时训练的分块数（None表示按可用GPU数量，无GPU时为1）
 
     
     # ==================== web-dgs项目配置 ====================
@@ -79,9 +147,77 @@ class Config:
         "CXXFLAGS" : "-D_GLIBCXX_USE_CXX11_ABI=0 $CXXFLAGS"
     }
     WEB_3DGS_TRAIN_SCRIPT = WEB_3DGS_REPO_PATH / "main.py" if WEB_3DGS_REPO_PATH.exists() else None
+    WEB_3DGS_MAIN_SCRIPT = WEB_3DGS_TRAIN_SCRIPT  # 查看器入口（main.py）
 
    
     
+    # ==================== 稀疏预览配置 ====================
+    SPARSE_MODEL_SUBDIR = "0"  # 稀疏模型写入sparse/0（gaussian-splatting从该目录读取）
+    SPARSE_PREVIEW_NAME = "preview.bin"  # 建图完成后导出到sparse/0的预览文件
+    SPARSE_PREVIEW_MAX_POINTS = 200000  # 预览中最多包含的点数（超出则均匀降采样）
+
+    # ==================== 缩略图配置 ====================
+    THUMBNAIL_NAME = "thumbnail.jpg"  # 缩略图文件名（与PLY同目录缓存）
+    THUMBNAIL_WIDTH = 320  # 缩略图宽度（高度按训练相机宽高比）
+    THUMBNAIL_MAX_POINTS = 500000  # 渲染时最多使用的高斯/点数量（超出则均匀降采样）
+    
+    # ==================== 产物下载配置 ====================
+    ARTIFACT_COMPRESS_MIN_SIZE = 64 * 1024  # 小于该大小的产物不生成压缩副本
+    ARTIFACT_COMPRESS_MIN_RATIO = 0.9  # 压缩后不大于原大小的该比例才保留压缩副本
+    
+    # ==================== 模型统计配置 ====================
+    MODEL_STATS_CHUNK_SIZE = 1000000  # 统计PLY时每次处理的高斯数（限制内存占用）
+
+    # ==================== 任务日志配置 ====================
+    TASK_LOG_MAX_BYTES = 10 * 1024 * 1024  # 单个任务/查看器日志文件轮转大小
+    TASK_LOG_BACKUP_COUNT = 3  # 保留的压缩历史日志数
+    TASK_LOG_READ_MAX_BYTES = 64 * 1024  # 日志接口单次最多返回字节数
+    TASK_LOG_READ_MAX_LINES = 500  # 日志接口单次最多返回行数
+    VIEWER_LOG_DIR = LOG_DIR / "viewers"  # 查看器日志目录
+    
+    # ==================== 任务调度与耗时估计配置 ====================
+    MAX_CONCURRENT_JOBS = 1  # 同时运行的重建+训练任务数
+    COST_HISTORY_PATH = LOG_DIR / "cost_history.json"  # 各阶段实测耗时样本
+    COST_HISTORY_WINDOW = 50  # 每个阶段保留的最近样本数
+    COST_MIN_SAMPLES = 3  # 样本数达到该值后才替换默认单位成本
+    JOB_TIME_BUDGET = None  # 单个任务的估计耗时上限（秒），None表示不限制
+    JOB_OVER_BUDGET_POLICY = "defer"  # 超出预算时：defer（空闲时再执行）/ reject（拒绝）
+    # 各阶段墙钟时限（秒），None表示不限制；超时后终止该阶段整个进程组
+    STAGE_TIMEOUTS = {
+        "colmap": 4 * 3600,
+        "training": 8 * 3600,
+    }
+    STAGE_KILL_GRACE = 10  # 取消/超时时SIGTERM后等待退出的秒数，之后SIGKILL
+    RESOURCE_SAMPLE_INTERVAL = 1.0  # 阶段进程树资源采样间隔（秒，读取/proc）
+    RESOURCE_DISK_INTERVAL = 30  # 工作目录磁盘占用的统计间隔（秒，需遍历目录）
+
+    # ==================== 上传准入控制配置 ====================
+    # 接收上传前检查用户并发数、排队深度、排队工作量和磁盘空间，超限时返回429/503并带Retry-After
+    ADMISSION_MAX_JOBS_PER_USER = 3  # 每个用户同时上传中/排队/运行的任务数上限
+    ADMISSION_MAX_QUEUE_DEPTH = 20  # 调度器排队（含延后）任务数上限
+    ADMISSION_DEFER_BACKLOG_SECONDS = 4 * 3600  # 排队工作量（按并发数折算的估计秒数）超过该值时新任务延后到空闲时执行
+    ADMISSION_MAX_BACKLOG_SECONDS = 24 * 3600  # 排队工作量超过该值时拒绝新上传
+    ADMISSION_DEFAULT_JOB_SECONDS = 1800  # 没有耗时估计的任务按该值计入排队工作量
+    ADMISSION_MIN_FREE_BYTES = 5 * 1024 ** 3  # DATA_DIR所在磁盘至少保留的空闲空间
+    ADMISSION_DISK_FACTOR = 4  # 每字节视频预留的磁盘空间倍数（视频、抽帧、COLMAP数据库和训练输出）
+    ADMISSION_DISK_RETRY_AFTER = 600  # 磁盘空间不足时建议的重试间隔（秒）
+    ADMISSION_RETRY_AFTER_RANGE = (30, 3600)  # Retry-After的取值范围（秒）
+
+    # ==================== 远程工作节点配置 ====================
+    # local: 本机执行COLMAP和训练；remote: 发布阶段任务，由worker.py节点通过HTTP领取执行
+    WORKER_MODE = os.environ.get("WORKER_MODE", "local")
+    # 节点请求头X-Worker-Token；remote模式必须通过环境变量设置，仍为默认值时拒绝启动
+    WORKER_DEFAULT_TOKEN = "change-this-worker-token"
+    WORKER_TOKEN = os.environ.get("WORKER_TOKEN", WORKER_DEFAULT_TOKEN)
+    WORKER_LEASE_SECONDS = 60  # 租约时长，节点超过该时间未心跳则任务重新排队
+    WORKER_HEARTBEAT_SECONDS = 10  # 节点心跳间隔
+    WORKER_MAX_ATTEMPTS = 3  # 单个阶段任务最多被领取的次数
+    # 服务端等待阶段任务的时限 = STAGE_TIMEOUTS + 该宽限（等待节点领取、传输输入和结果），超时后取消并按阶段超时处理
+    WORKER_PENDING_GRACE_SECONDS = 1800
+    WORKER_POLL_SECONDS = 5  # 节点无任务时的轮询间隔
+    WORKER_TRANSFER_CHUNK_SIZE = 1024 * 1024  # 输入下载/结果上传的分块大小
+    WORKER_MAX_ARTIFACT_BYTES = 50 * 1024 ** 3  # 节点上传结果归档的大小上限（训练输出含检查点）
+
     # 用户会话配置
     SECRET_KEY = "your-secret-key-change-this"
     
@@ -92,6 +228,14 @@ class Config:
         for dir_path in dirs:
             dir_path.mkdir(exist_ok=True)
     
+    @classmethod
+    def check_worker_mode(cls):
+        """校验工作节点模式配置，remote模式下令牌未设置（仍为默认值）时抛出RuntimeError"""
+        if cls.WORKER_MODE not in ("local", "remote"):
+            raise RuntimeError(f"WORKER_MODE只能是local或remote: {cls.WORKER_MODE}")
+        if cls.WORKER_MODE == "remote" and cls.WORKER_TOKEN in ("", cls.WORKER_DEFAULT_TOKEN):
+            raise RuntimeError("WORKER_MODE=remote时必须通过环境变量WORKER_TOKEN设置工作节点令牌")
+
     @classmethod
     def get_user_dir(cls, username):
         """获取用户目录"""
@@ -99,6 +243,23 @@ class Config:
         user_dir.mkdir(exist_ok=True)
         return user_dir
     
+    @classmethod
+    def find_model_ply(cls, username, filename):
+        """查找训练得到的PLY文件（优先最大迭代数），不存在返回None"""
+        video_dir = cls.DATA_DIR / username / filename
+        iteration_plys = list((video_dir / "output" / "point_cloud").glob("iteration_*/point_cloud.ply"))
+        if iteration_plys:
+            return max(iteration_plys, key=lambda p: int(p.parent.name.split("_")[-1]))
+        for ply_path in (video_dir / "output" / "point_cloud.ply", video_dir / "point_cloud.ply"):
+            if ply_path.exists():
+                return ply_path
+        return None
+    
+    @classmethod
+    def sparse_model_dir(cls, colmap_dir):
+        """COLMAP目录下训练读取的稀疏模型目录（sparse/0）"""
+        return Path(colmap_dir) / "sparse" / cls.SPARSE_MODEL_SUBDIR
+
     @classmethod
     def get_video_dir(cls, username, filename):
         """获取视频文件目录"""
@@ -3,6 +3,7 @@ from .upload_handler import UploadHandler
 from .colmap_generator import ColmapGenerator
 from .trainer import ModelTrainer
 from .viewer import ViewerManager
+from .sweep import TrainingSweep
 
 __all__ = [
     'login_required',
@@ -10,5 +11,6 @@ __all__ = [
     'UploadHandler',
     'ColmapGenerator', 
     'ModelTrainer',
-    'ViewerManager'
+    'ViewerManager',
+    'TrainingSweep'
 ]
\ No newline at end of file
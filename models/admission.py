@@ -0,0 +1,155 @@
+import itertools
+import logging
+import shutil
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """上传被准入控制拒绝"""
+
+    def __init__(self, status_code, message, retry_after):
+        """
+        :param status_code: 429（用户自身超限）或503（系统整体繁忙/磁盘不足）
+        :param retry_after: 建议的重试间隔（秒）
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    上传准入控制：在接收上传数据之前检查用户并发任务数、调度器排队深度、排队工作量和磁盘空间，
+    超限时尽早拒绝并给出Retry-After；排队工作量偏高但未超限时新任务延后到空闲时执行。
+    准入时按视频大小预留磁盘空间（视频、抽帧、COLMAP数据和训练输出），避免并发上传同时通过检查后写满磁盘；
+    上传转为任务后预留随任务保留，直到任务结束（完成、失败、取消）才释放。
+    """
+
+    def __init__(self, job_scheduler, active_tasks):
+        """
+        :param job_scheduler: JobScheduler（排队深度和并发数）
+        :param active_tasks: 返回{task_id: 任务状态}的函数，包含已上传、尚未结束的任务（任务状态含owner）
+        """
+        self.job_scheduler = job_scheduler
+        self.active_tasks = active_tasks
+        self._lock = threading.Lock()
+        self._uploads = {}  # 令牌 -> (用户名, 预留字节, 任务ID)，任务ID为None表示仍在上传
+        self._tokens = itertools.count(1)
+
+    @staticmethod
+    def _clamp(seconds):
+        low, high = Config.ADMISSION_RETRY_AFTER_RANGE
+        return int(min(max(seconds, low), high))
+
+    @staticmethod
+    def remaining_seconds(task, now=None):
+        """任务的估计剩余秒数：优先用ETA，其次用上传时的耗时估计"""
+        now = now or time.time()
+        if task.get('eta') is not None:
+            return max(0.0, task['eta'] - now)
+        estimate = task.get('estimate')
+        if estimate:
+            return estimate['total_seconds']
+        return Config.ADMISSION_DEFAULT_JOB_SECONDS
+
+    def backlog_seconds(self, active=None):
+        """排队与运行中任务的剩余工作量，按调度器并发数折算为墙钟秒数"""
+        active = self.active_tasks() if active is None else active
+        now = time.time()
+        total = sum(self.remaining_seconds(task, now) for task in active.values())
+        return total / self.job_scheduler.max_concurrent
+
+    def admit(self, username, content_length=None):
+        """
+        准入检查，通过时预留磁盘空间
+        :param content_length: 上传大小（未知时按MAX_CONTENT_LENGTH预留）
+        :return: 上传令牌；提交任务时调用attach把预留转给任务，请求结束时调用finish_upload
+        :raises AdmissionRejected: 超出限制
+        """
+        with self._lock:
+            active = self.active_tasks()
+            now = time.time()
+
+            user_tasks = [task for task in active.values() if task.get('owner') == username]
+            # 已转为任务的预留在user_tasks中计数
+            user_uploads = sum(1 for owner, _, task_id in self._uploads.values()
+                               if owner == username and task_id is None)
+            if len(user_tasks) + user_uploads >= Config.ADMISSION_MAX_JOBS_PER_USER:
+                # 用户最早结束的任务完成后即可重试
+                soonest = min((self.remaining_seconds(task, now) for task in user_tasks), default=0)
+                self._reject(429, f"已有{len(user_tasks) + user_uploads}个任务在上传或处理中"
+                                  f"（上限{Config.ADMISSION_MAX_JOBS_PER_USER}）", soonest, username)
+
+            pending = self.job_scheduler.pending_count()
+            backlog = self.backlog_seconds(active)
+            if pending >= Config.ADMISSION_MAX_QUEUE_DEPTH:
+                self._reject(503, f"排队任务已满（{pending}个）", backlog / max(1, pending), username)
+            if backlog >= Config.ADMISSION_MAX_BACKLOG_SECONDS:
+                self._reject(503, f"排队工作量过大（约{backlog / 3600:.1f}小时）",
+                             backlog - Config.ADMISSION_MAX_BACKLOG_SECONDS, username)
+
+            needed = (content_length or Config.MAX_CONTENT_LENGTH) * Config.ADMISSION_DISK_FACTOR
+            reserved = sum(size for _, size, _ in self._uploads.values())
+            free = shutil.disk_usage(Config.DATA_DIR).free
+            if free - reserved - needed < Config.ADMISSION_MIN_FREE_BYTES:
+                self._reject(503, f"磁盘空间不足（剩余{free / 1024 ** 3:.1f}GB，"
+                                  f"进行中的上传已预留{reserved / 1024 ** 3:.1f}GB）",
+                             Config.ADMISSION_DISK_RETRY_AFTER, username)
+
+            token = next(self._tokens)
+            self._uploads[token] = (username, needed, None)
+            return token
+
+    def _reject(self, status_code, message, retry_after, username):
+        retry_after = self._clamp(retry_after)
+        logger.warning(f"拒绝用户 {username} 的上传（{status_code}）: {message}，{retry_after}秒后重试")
+        raise AdmissionRejected(status_code, message, retry_after)
+
+    def attach(self, token, task_id):
+        """上传已提交为任务：预留随任务保留，任务结束时由release_task释放"""
+        with self._lock:
+            if token in self._uploads:
+                username, needed, _ = self._uploads[token]
+                self._uploads[token] = (username, needed, task_id)
+
+    def finish_upload(self, token):
+        """上传请求结束：未提交为任务（出错、被拒绝、命中缓存）的预留立即释放"""
+        with self._lock:
+            entry = self._uploads.get(token)
+            if entry is not None and entry[2] is None:
+                del self._uploads[token]
+
+    def release_task(self, task_id):
+        """任务到达终态时释放其磁盘预留"""
+        with self._lock:
+            for token, (_, _, owner_task) in list(self._uploads.items()):
+                if owner_task == task_id:
+                    del self._uploads[token]
+
+    def should_defer(self):
+        """
+        排队工作量超过延后阈值时，新任务延后到空闲时执行
+        :return: 延后原因，不需要延后返回None
+        """
+        backlog = self.backlog_seconds()
+        if backlog >= Config.ADMISSION_DEFER_BACKLOG_SECONDS:
+            return f"排队工作量约{backlog / 3600:.1f}小时"
+        return None
+
+    def get_status(self):
+        with self._lock:
+            uploads = list(self._uploads.values())
+        usage = shutil.disk_usage(Config.DATA_DIR)
+        return {
+            'uploads_in_progress': sum(1 for _, _, task_id in uploads if task_id is None),
+            'tasks_reserving': sum(1 for _, _, task_id in uploads if task_id is not None),
+            'reserved_bytes': sum(size for _, size, _ in uploads),
+            'free_bytes': usage.free,
+            'backlog_seconds': round(self.backlog_seconds(), 1),
+            'queue_depth': self.job_scheduler.pending_count(),
+        }
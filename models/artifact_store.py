@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    """
+    训练产物（模型、缩略图、日志、稀疏模型及其预览）的定位与缓存元数据
+    - 强ETag：内容SHA-256，按(大小, mtime)缓存在旁路文件中，文件不变就不再重新计算
+    - 预压缩：后台生成一次gzip副本并复用
+    """
+
+    CACHE_DIR_NAME = ".artifact_cache"
+    SPARSE_FILES = {"cameras.bin", "images.bin", "points3D.bin", "rigs.bin", "frames.bin"}
+
+    def __init__(self, thumbnail_renderer=None):
+        self.thumbnail_renderer = thumbnail_renderer
+        self.compress_min_size = Config.ARTIFACT_COMPRESS_MIN_SIZE
+        self.compress_min_ratio = Config.ARTIFACT_COMPRESS_MIN_RATIO
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-compress")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def resolve(self, username, filename, artifact):
+        """
+        把产物名解析为文件路径
+        :param artifact: model | thumbnail | log | cameras | preview | sparse/<cameras.bin|images.bin|points3D.bin>
+        :return: 文件路径，不存在返回None
+        """
+        video_dir = Config.DATA_DIR / username / filename
+        if artifact == "model":
+            return Config.find_model_ply(username, filename)
+        if artifact == "thumbnail":
+            if self.thumbnail_renderer is None:
+                return None
+            return self.thumbnail_renderer.get_thumbnail(username, filename)
+        if artifact == "log":
+            # 优先最近一次任务的日志，其次训练输出目录的日志
+            task_logs = list((video_dir / "logs").glob("*.log"))
+            if task_logs:
+                return max(task_logs, key=lambda p: p.stat().st_mtime)
+            path = video_dir / "output" / "training.log"
+        elif artifact == "cameras":
+            path = video_dir / "output" / "cameras.json"
+        elif artifact == "preview":
+            path = Config.sparse_model_dir(video_dir / "colmap") / Config.SPARSE_PREVIEW_NAME
+        elif artifact.startswith("sparse/") and artifact.split("/", 1)[1] in self.SPARSE_FILES:
+            path = Config.sparse_model_dir(video_dir / "colmap") / artifact.split("/", 1)[1]
+        else:
+            return None
+        return path if path.exists() else None
+
+    def _cache_paths(self, path):
+        cache_dir = path.parent / self.CACHE_DIR_NAME
+        return cache_dir / f"{path.name}.json", cache_dir / f"{path.name}.gz"
+
+    def _read_meta(self, path, stat):
+        """读取旁路元数据，文件大小或mtime变化时视为失效"""
+        meta_path, _ = self._cache_paths(path)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('size') == stat.st_size and meta.get('mtime_ns') == stat.st_mtime_ns:
+                return meta
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _write_meta(self, path, meta):
+        meta_path, _ = self._cache_paths(path)
+        meta_path.parent.mkdir(exist_ok=True)
+        tmp_path = meta_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    @staticmethod
+    def _sha256(path, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def describe(self, path):
+        """
+        获取产物的元数据（内容哈希、gzip副本），必要时计算哈希并安排后台压缩
+        :return: {'sha256', 'size', 'mtime_ns', 'gzip': 压缩副本路径或None}
+        """
+        path = Path(path)
+        stat = path.stat()
+        meta = self._read_meta(path, stat)
+        if meta is None:
+            meta = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': self._sha256(path),
+                'gzip': None,
+            }
+            self._write_meta(path, meta)
+
+        _, gz_path = self._cache_paths(path)
+        if meta.get('gzip') and gz_path.exists():
+            meta['gzip_path'] = gz_path
+        elif meta.get('gzip') is None and stat.st_size >= self.compress_min_size:
+            self._schedule_compress(path)
+        return meta
+
+    def _schedule_compress(self, path):
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._executor.submit(self._compress, path)
+
+    def _compress(self, path):
+        """后台生成gzip副本；压缩收益不足时记录下来，不再重复尝试"""
+        try:
+            stat = path.stat()
+            _, gz_path = self._cache_paths(path)
+            gz_path.parent.mkdir(exist_ok=True)
+            tmp_path = gz_path.with_suffix(".gz.tmp")
+            with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+            meta = self._read_meta(path, stat)
+            if meta is None:
+                # 压缩期间文件已变化，放弃本次结果
+                tmp_path.unlink()
+                return
+            compressed_size = tmp_path.stat().st_size
+            if compressed_size <= stat.st_size * self.compress_min_ratio:
+                os.replace(tmp_path, gz_path)
+                meta['gzip'] = True
+                meta['gzip_size'] = compressed_size
+                logger.info(f"生成压缩副本: {gz_path}（{stat.st_size} -> {compressed_size}字节）")
+            else:
+                tmp_path.unlink()
+                meta['gzip'] = False
+            self._write_meta(path, meta)
+        except Exception as e:
+            logger.error(f"生成压缩副本失败 {path}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
@@ -1,23 +1,93 @@
 import os
+import re
 import cv2
 import logging
+import multiprocessing
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pycolmap
 from typing import Optional
 
+from config import Config
+from models import colmap_io
+from models.feature_cache import FeatureCache
+from models.model_merger import ModelMerger
+from models.sparse_preview import export_sparse_preview
+
 # 日志配置
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _reconstruct_segment(settings: dict, segment_dir: str) -> dict:
+    """
+    子进程入口：对单个分段做完整的特征提取、匹配和增量重建
+    :param settings: ColmapGenerator的参数（跨进程传递）
+    :param segment_dir: 分段目录（含images子目录）
+    """
+    segment_dir = Path(segment_dir)
+    generator = ColmapGenerator.with_settings(settings)
+    try:
+        stats = generator.run_sparse_reconstruction(segment_dir, segment_dir / "images", segment_dir / "sparse")
+        return dict(stats, success=True, model_dir=str(Config.sparse_model_dir(segment_dir)))
+    except Exception as e:
+        return {"success": False, "message": str(e), "model_dir": str(Config.sparse_model_dir(segment_dir))}
+
+
+def generate_from_video_stage(video_path: str, settings: Optional[dict] = None,
+                              segmented: Optional[bool] = None, prepared_frames: Optional[str] = None) -> dict:
+    """
+    子进程入口：在可终止的独立进程中完成抽帧和稀疏重建（pycolmap调用本身无法中断）
+    :param settings: 覆盖ColmapGenerator的参数
+    :param prepared_frames: 上传时已流式抽好的帧目录
+    """
+    generator = ColmapGenerator.with_settings(settings)
+    return generator.generate_from_video(video_path, segmented, prepared_frames)
+
+
+def extend_scene_stage(video_path: str, colmap_dir: str, settings: Optional[dict] = None) -> dict:
+    """子进程入口：把新视频注册进已有重建"""
+    generator = ColmapGenerator.with_settings(settings)
+    return generator.extend_from_video(video_path, colmap_dir)
+
+
 class ColmapGenerator:
     def __init__(self):
         # 可配置参数
         self.frame_interval = 10  # 每10帧提取一帧（可根据视频帧率调整）
+        self.max_frames = None     # 抽帧上限，超出时自动加大抽帧间隔（None表示不限制）
         self.image_ext = "jpg"     # 提取帧的格式
         self.min_num_matches = 15  # pycolmap特征匹配最小数量
-        self.camera_model = "PINHOLE"  # 相机模型（可选：SIMPLE_PINHOLE, RADIAL等）
+        self.init_min_num_inliers = 100  # 初始图像对最少内点数
+        self.abs_pose_min_num_inliers = 30  # 注册新图像（绝对位姿估计）最少内点数
+        self.camera_model = "PINHOLE"  # 相机模型（可选：SIMPLE_PINHOLE；训练只支持无畸变针孔模型）
         self.max_image_size = 640     # 特征提取最大图像尺寸
         self.sift_num_octaves = 8     # SIFT八度数量
+        self.num_threads = -1         # 特征提取线程数（-1为全部核心）
+        self.matcher = "exhaustive"   # 匹配策略：exhaustive（穷举）/ sequential（相邻帧，适合视频）
+        self.sequential_overlap = 10  # 顺序匹配时每帧与后续多少帧匹配
+        # 分段并行重建参数
+        self.segmented_min_frames = Config.COLMAP_SEGMENTED_MIN_FRAMES
+        self.segment_size = Config.COLMAP_SEGMENT_SIZE
+        self.segment_overlap = Config.COLMAP_SEGMENT_OVERLAP
+        self.segment_workers = Config.COLMAP_SEGMENT_WORKERS
+
+    @classmethod
+    def with_settings(cls, settings: Optional[dict] = None) -> "ColmapGenerator":
+        """按参数字典（预设或跨进程传递的参数）创建生成器"""
+        generator = cls()
+        generator.__dict__.update(settings or {})
+        return generator
+
+    def effective_frame_interval(self, total_frames: int) -> int:
+        """实际抽帧间隔：保证抽帧数不超过max_frames"""
+        interval = max(1, self.frame_interval)
+        if self.max_frames and total_frames > 0:
+            interval = max(interval, -(-total_frames // self.max_frames))
+        return interval
 
     def extract_video_frames(self, video_path: Path, output_dir: Path) -> None:
         """
@@ -41,7 +111,8 @@ class ColmapGenerator:
         saved_count = 0
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        logger.info(f"开始提取视频帧：总帧数={total_frames}, 帧率={fps}, 提取间隔={self.frame_interval}")
+        frame_interval = self.effective_frame_interval(total_frames)
+        logger.info(f"开始提取视频帧：总帧数={total_frames}, 帧率={fps}, 提取间隔={frame_interval}")
 
         while True:
             ret, frame = cap.read()
@@ -49,7 +120,7 @@ class ColmapGenerator:
                 break
             
             # 按间隔提取帧
-            if frame_count % self.frame_interval == 0:
+            if frame_count % frame_interval == 0:
                 frame_filename = f"frame_{saved_count:06d}.{self.image_ext}"
                 frame_path = output_dir / frame_filename
                 # 保存帧（高质量）
@@ -61,12 +132,37 @@ class ColmapGenerator:
         cap.release()
         logger.info(f"帧提取完成：共保存 {saved_count} 帧到 {output_dir}")
 
-    def run_sparse_reconstruction(self, colmap_dir:Path, frames_dir: Path, sparse_dir: Path) -> None:
+    def adopt_prepared_frames(self, prepared_dir: Path, output_dir: Path) -> None:
+        """用上传时流式抽好的帧替换帧目录（同一文件系统内移动，不重新编码）"""
+        for img_file in output_dir.glob(f"*.{self.image_ext}"):
+            img_file.unlink()
+        frames = sorted(prepared_dir.glob(f"*.{self.image_ext}"))
+        for frame in frames:
+            os.replace(frame, output_dir / frame.name)
+        shutil.rmtree(prepared_dir, ignore_errors=True)
+        logger.info(f"使用上传时流式抽取的 {len(frames)} 帧: {output_dir}")
+
+    def run_sparse_reconstruction(self, colmap_dir:Path, frames_dir: Path, sparse_dir: Path) -> dict:
         # 步骤2：pycolmap稀疏重建（生成二进制.bin文件）
         logger.info("开始COLMAP稀疏重建...")
+        timings = {}
+        stage_start = time.time()
         
         # 2.1 特征提取（适配3.13.0版本）
         database_path = colmap_dir / "database.db"
+        # 帧已重新提取，旧数据库中的特征（可能来自其他预设参数）不能复用
+        if database_path.exists():
+            database_path.unlink()
+        # 用全局特征缓存预填数据库，下面的提取和匹配只处理缓存中没有的图像和图像对
+        feature_cache = FeatureCache() if Config.FEATURE_CACHE_ENABLED else None
+        cache_state = None
+        if feature_cache is not None:
+            try:
+                cache_state = feature_cache.seed(database_path, frames_dir, self)
+            except Exception as e:
+                logger.warning(f"特征缓存预填失败，完整提取特征: {e}")
+                if database_path.exists():
+                    database_path.unlink()
         
         reader_opts = pycolmap.ImageReaderOptions()
        
@@ -74,6 +170,7 @@ class ColmapGenerator:
         extraction_opts = pycolmap.FeatureExtractionOptions()
         extraction_opts.max_image_size = self.max_image_size
         extraction_opts.sift.num_octaves = self.sift_num_octaves  # 8
+        extraction_opts.num_threads = self.num_threads
 
     # 1.3 执行特征提取（3.13 精准参数，无报错）
         pycolmap.extract_features(
@@ -84,34 +181,325 @@ class ColmapGenerator:
             reader_options=reader_opts,
             extraction_options=extraction_opts
         )
+        timings["features"] = time.time() - stage_start
         logger.info("特征提取完成")
        
          # ========== 2.2 特征匹配（3.13.0 直接传参） ==========
-        pycolmap.match_exhaustive(str(database_path))
+        stage_start = time.time()
+        if self.matcher == "sequential":
+            pairing_opts = pycolmap.SequentialPairingOptions()
+            pairing_opts.overlap = self.sequential_overlap
+            pycolmap.match_sequential(str(database_path), pairing_options=pairing_opts)
+        else:
+            pycolmap.match_exhaustive(str(database_path))
+        timings["matching"] = time.time() - stage_start
         logger.info("特征匹配完成")
+        cache_stats = None
+        if cache_state is not None:
+            try:
+                cache_stats = dict(feature_cache.harvest(database_path, cache_state),
+                                   cached_images=cache_state["cached_images"],
+                                   cached_pairs=cache_state["cached_pairs"])
+            except Exception as e:
+                logger.warning(f"特征缓存收录失败: {e}")
+            # 部分命中缓存时的耗时不代表完整工作量，不作为耗时估计样本
+            if cache_state["cached_images"]:
+                timings.pop("features")
+            if cache_state["cached_pairs"]:
+                timings.pop("matching")
 
         # ========== 2.3 稀疏重建（3.13.0 直接传参） ==========
         # 执行增量重建（无需IncrementalMapperOptions，直接传参）
-        reconstructions = pycolmap.incremental_mapping(str(database_path),str(frames_dir),str(sparse_dir))
+        stage_start = time.time()
+        mapper_opts = pycolmap.IncrementalPipelineOptions()
+        mapper_opts.min_num_matches = self.min_num_matches
+        mapper_opts.mapper.init_min_num_inliers = self.init_min_num_inliers
+        mapper_opts.mapper.abs_pose_min_num_inliers = self.abs_pose_min_num_inliers
+        reconstructions = pycolmap.incremental_mapping(str(database_path), str(frames_dir), str(sparse_dir),
+                                                       options=mapper_opts)
+        timings["mapping"] = time.time() - stage_start
          # 验证并保存结果
         if not reconstructions:
             raise RuntimeError("稀疏重建失败，无有效数据")
         
-        # 取第一个重建结果（主流场景只有一个模型）
-        reconstruction = reconstructions[0]
+        # 取注册图像最多的子模型（主流场景只有一个模型），写入sparse/0，其余编号子模型删除
+        reconstruction = max(reconstructions.values(), key=lambda r: r.num_reg_images())
         
-        sparse_dir.mkdir(exist_ok=True, parents=True)
-        reconstruction.write_binary(str(sparse_dir))
+        reconstruction.write_binary(str(self._reset_sparse_dir(sparse_dir)))
         #reconstruction.write(str(sparse_dir))
         
         logger.info(f"稀疏重建完成：相机数={len(reconstruction.cameras)}, 图像数={len(reconstruction.images)}, 点云数={len(reconstruction.points3D)}")
+        return {
+            "num_cameras": len(reconstruction.cameras),
+            "num_images": len(reconstruction.images),
+            "num_points3D": len(reconstruction.points3D),
+            "num_sub_models": len(reconstructions),
+            "num_frames": len(list(frames_dir.glob(f"*.{self.image_ext}"))),
+            "timings": timings,
+            "feature_cache": cache_stats,
+        }
+
+    def run_reconstruction_with_fallback(self, video_path: Path, colmap_dir: Path, frames_dir: Path,
+                                         sparse_dir: Path) -> dict:
+        """
+        单段重建；失败或注册比例过低时并行尝试参数变体，采用注册比例最高的模型
+        """
+        from models.reconstruction_strategy import ReconstructionStrategy
+        strategy = ReconstructionStrategy(self)
+        try:
+            stats, error = self.run_sparse_reconstruction(colmap_dir, frames_dir, sparse_dir), None
+        except Exception as e:
+            if not Config.RECONSTRUCTION_FALLBACK_ENABLED:
+                raise
+            stats, error = None, str(e)
+        if not Config.RECONSTRUCTION_FALLBACK_ENABLED or (stats is not None and not strategy.is_weak(stats)):
+            return stats
+        return strategy.run(video_path, colmap_dir, frames_dir, sparse_dir, stats, error)
+
+    @staticmethod
+    def _reset_sparse_dir(sparse_dir: Path) -> Path:
+        """
+        清空sparse目录（增量建图写出的编号子模型、旧版本写在根目录的模型和预览）
+        :return: 训练读取的模型目录sparse/0（已创建，为空）
+        """
+        if sparse_dir.exists():
+            shutil.rmtree(sparse_dir)
+        model_dir = sparse_dir / Config.SPARSE_MODEL_SUBDIR
+        model_dir.mkdir(parents=True)
+        return model_dir
+
+    def _settings(self) -> dict:
+        """可跨进程传递的重建参数"""
+        return {k: v for k, v in self.__dict__.items() if isinstance(v, (int, float, str, bool))}
+
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path) -> None:
+        """优先软链接帧文件，不支持时复制"""
+        try:
+            os.symlink(src.absolute(), dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def split_segments(self, frame_names: list) -> list:
+        """按段长和重叠把帧序列切分为重叠的分段"""
+        step = max(1, self.segment_size - self.segment_overlap)
+        segments = []
+        for start in range(0, len(frame_names), step):
+            segments.append(frame_names[start:start + self.segment_size])
+            if start + self.segment_size >= len(frame_names):
+                break
+        return segments
+
+    def run_segmented_reconstruction(self, colmap_dir: Path, frames_dir: Path, sparse_dir: Path) -> dict:
+        """
+        分段并行稀疏重建：帧序列切分为重叠段，多进程分别重建，再按共享帧对齐合并
+        合并结果写入sparse_dir/0，目录布局与单段重建一致
+        """
+        frame_names = sorted(p.name for p in frames_dir.glob(f"*.{self.image_ext}"))
+        segments = self.split_segments(frame_names)
+        logger.info(f"开始分段并行重建：帧数={len(frame_names)}, 分段数={len(segments)}, 进程数={self.segment_workers}")
+
+        segments_root = colmap_dir / "segments"
+        if segments_root.exists():
+            shutil.rmtree(segments_root)
+
+        segment_dirs = []
+        for index, segment in enumerate(segments):
+            segment_dir = segments_root / f"segment_{index:03d}"
+            (segment_dir / "images").mkdir(parents=True)
+            for name in segment:
+                self._link_or_copy(frames_dir / name, segment_dir / "images" / name)
+            segment_dirs.append(segment_dir)
+
+        # 每个进程分到的特征提取线程数，避免过度订阅
+        settings = self._settings()
+        settings["num_threads"] = max(1, (os.cpu_count() or 1) // self.segment_workers)
+
+        # spawn方式启动，避免在多线程的Flask进程中fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.segment_workers, mp_context=context) as executor:
+            results = list(executor.map(_reconstruct_segment,
+                                        [settings] * len(segment_dirs),
+                                        [str(d) for d in segment_dirs]))
+
+        model_dirs = []
+        segment_stats = []
+        for index, result in enumerate(results):
+            if result["success"]:
+                model_dirs.append(result["model_dir"])
+                segment_stats.append(result)
+                logger.info(f"分段{index}重建完成：图像数={result['num_images']}, 点云数={result['num_points3D']}")
+            else:
+                logger.warning(f"分段{index}重建失败: {result['message']}")
+        if not model_dirs:
+            raise RuntimeError("稀疏重建失败，所有分段均无有效数据")
 
+        stats = ModelMerger().merge(model_dirs, self._reset_sparse_dir(sparse_dir))
+        logger.info(f"分段重建合并完成：合并子模型{stats['merged_models']}个，跳过{stats['skipped_models']}个，"
+                    f"相机数={stats['num_cameras']}, 图像数={stats['num_images']}, 点云数={stats['num_points3D']}")
+        stats["num_segments"] = len(segments)
+        stats["num_frames"] = len(frame_names)
+        stats["segment_stats"] = segment_stats
+        return stats
 
 
-    def generate_from_video(self, video_path: str) -> dict:
+
+    @staticmethod
+    def _check_database_matches_model(database_path: Path, sparse_dir: Path) -> int:
+        """
+        确认稀疏模型的图像ID与数据库一致（增量注册依赖这一点）
+        分段重建合并后的模型重新编号过，不能直接在其上继续注册
+        :return: 模型中已注册的图像数
+        """
+        images = colmap_io.read_images_binary(sparse_dir / "images.bin")
+        with sqlite3.connect(str(database_path)) as connection:
+            db_names = dict(connection.execute("SELECT image_id, name FROM images"))
+        mismatched = [image.name for image_id, image in images.items() if db_names.get(image_id) != image.name]
+        if mismatched:
+            raise RuntimeError(f"稀疏模型与database.db的图像编号不一致（{len(mismatched)}张），"
+                               f"可能是分段重建的合并模型，无法增量注册")
+        return len(images)
+
+    def _next_extension_prefix(self, frames_dir: Path) -> str:
+        """新素材帧的文件名前缀（ext01、ext02……），避免与已有帧重名"""
+        indices = [int(m.group(1)) for p in frames_dir.iterdir()
+                   for m in [re.match(r"ext(\d+)_", p.name)] if m]
+        return f"ext{max(indices, default=0) + 1:02d}"
+
+    def extend_from_video(self, video_path: str, colmap_dir: str) -> dict:
+        """
+        把同一场景的新视频注册进已有重建，不重新建图
+        只为新帧提取特征；匹配时数据库中已有的图像对会被跳过（只计算新帧相关的对）；
+        以已有模型（sparse/0）为输入做增量注册，已有帧位姿固定，结果写回sparse/0。原模型备份到sparse_before_<前缀>。
+        :param video_path: 新视频路径
+        :param colmap_dir: 已有场景的COLMAP目录（含images、sparse、database.db）
+        :return: 结果字典（与generate_from_video相同的结构，stats中含新增注册数）
+        """
+        try:
+            video_path = Path(video_path)
+            colmap_dir = Path(colmap_dir)
+            frames_dir = colmap_dir / "images"
+            sparse_dir = colmap_dir / "sparse"
+            model_dir = Config.sparse_model_dir(colmap_dir)
+            database_path = colmap_dir / "database.db"
+            for path in (frames_dir, model_dir / "images.bin", database_path):
+                if not path.exists():
+                    raise FileNotFoundError(f"已有重建不完整，缺少: {path}")
+            num_images_before = self._check_database_matches_model(database_path, model_dir)
+
+            # 步骤1：抽取新帧（先抽到临时目录，再加前缀移入images）
+            timings = {}
+            stage_start = time.time()
+            prefix = self._next_extension_prefix(frames_dir)
+            staging_dir = colmap_dir / f"{prefix}_frames"
+            staging_dir.mkdir(exist_ok=True)
+            self.extract_video_frames(video_path, staging_dir)
+            new_names = []
+            for frame_path in sorted(staging_dir.glob(f"*.{self.image_ext}")):
+                name = f"{prefix}_{frame_path.name}"
+                shutil.move(str(frame_path), str(frames_dir / name))
+                new_names.append(name)
+            shutil.rmtree(staging_dir)
+            timings["extract"] = time.time() - stage_start
+            if not new_names:
+                raise RuntimeError("新视频未提取到任何帧")
+            logger.info(f"扩展场景：新增{len(new_names)}帧（前缀{prefix}），已有注册图像{num_images_before}张")
+
+            # 步骤2：只为新帧提取特征
+            stage_start = time.time()
+            extraction_opts = pycolmap.FeatureExtractionOptions()
+            extraction_opts.max_image_size = self.max_image_size
+            extraction_opts.sift.num_octaves = self.sift_num_octaves
+            extraction_opts.num_threads = self.num_threads
+            pycolmap.extract_features(
+                database_path=str(database_path),
+                image_path=str(frames_dir),
+                image_names=new_names,
+                camera_mode=pycolmap.CameraMode.SINGLE,
+                camera_model=self.camera_model,
+                extraction_options=extraction_opts
+            )
+            timings["features"] = time.time() - stage_start
+
+            # 步骤3：匹配（新帧需与所有旧帧匹配，顺序匹配无法跨素材，这里固定用穷举；已有的对自动跳过）
+            stage_start = time.time()
+            pycolmap.match_exhaustive(str(database_path))
+            timings["matching"] = time.time() - stage_start
+
+            # 步骤4：在已有模型上增量注册新帧
+            stage_start = time.time()
+            mapping_output = colmap_dir / f"{prefix}_mapping"
+            mapping_output.mkdir(exist_ok=True)
+            mapper_opts = pycolmap.IncrementalPipelineOptions()
+            mapper_opts.fix_existing_frames = True
+            mapper_opts.multiple_models = False
+            reconstructions = pycolmap.incremental_mapping(
+                str(database_path), str(frames_dir), str(mapping_output),
+                options=mapper_opts, input_path=str(model_dir))
+            timings["mapping"] = time.time() - stage_start
+            if not reconstructions:
+                raise RuntimeError("增量注册失败，无有效模型")
+
+            # 取包含原有图像最多的模型
+            old_names = {image.name for image in colmap_io.read_images_binary(model_dir / "images.bin").values()}
+            reconstruction = max(reconstructions.values(), key=lambda r: (
+                sum(image.name in old_names for image in r.images.values()), r.num_reg_images()))
+
+            backup_dir = colmap_dir / f"sparse_before_{prefix}"
+            shutil.copytree(model_dir, backup_dir, dirs_exist_ok=True)
+            reconstruction.write_binary(str(model_dir))
+            shutil.rmtree(mapping_output, ignore_errors=True)
+            preview_path = self._export_preview(model_dir)
+
+            new_name_set = set(new_names)
+            num_new_registered = sum(image.name in new_name_set for image in reconstruction.images.values())
+            logger.info(f"扩展场景完成：新帧注册{num_new_registered}/{len(new_names)}张，"
+                        f"图像数{num_images_before}->{reconstruction.num_reg_images()}, 点云数={len(reconstruction.points3D)}")
+            return {
+                "success": True,
+                "video_path": str(video_path),
+                "colmap_dir": str(colmap_dir),
+                "frames_dir": str(frames_dir),
+                "sparse_dir": str(sparse_dir),
+                "backup_dir": str(backup_dir),
+                "preview_path": preview_path,
+                "mode": "extend",
+                "stats": {
+                    "num_cameras": len(reconstruction.cameras),
+                    "num_images": reconstruction.num_reg_images(),
+                    "num_points3D": len(reconstruction.points3D),
+                    "num_images_before": num_images_before,
+                    "num_new_frames": len(new_names),
+                    "num_new_registered": num_new_registered,
+                    "frame_prefix": prefix,
+                },
+                "timings": timings,
+            }
+
+        except Exception as e:
+            logger.error(f"扩展场景失败: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "message": str(e),
+                "video_path": str(video_path) if 'video_path' in locals() else ""
+            }
+
+    @staticmethod
+    def _export_preview(model_dir: Path) -> Optional[str]:
+        """建图完成后立即导出稀疏预览（写在模型目录sparse/0），失败不影响重建结果"""
+        try:
+            return export_sparse_preview(model_dir)['path']
+        except Exception as e:
+            logger.warning(f"导出稀疏预览失败: {str(e)}")
+            return None
+
+    def generate_from_video(self, video_path: str, segmented: Optional[bool] = None,
+                            prepared_frames: Optional[str] = None) -> dict:
         """
         从视频生成COLMAP格式稀疏重建数据（二进制.bin格式）
         :param video_path: 视频文件路径
+        :param segmented: 是否分段并行重建，None表示按抽帧数自动选择
+        :param prepared_frames: 上传时已流式抽好的帧目录（移入images目录，跳过抽帧）
         :return: 重建结果字典
         """
         try:
@@ -131,12 +519,28 @@ class ColmapGenerator:
                 dir_path.mkdir(exist_ok=True, parents=True)
 
             # 步骤1：提取视频帧
-            self.extract_video_frames(video_path, frames_dir)
-            if not list(frames_dir.glob(f"*.{self.image_ext}")):
+            timings = {}
+            stage_start = time.time()
+            if prepared_frames and Path(prepared_frames).is_dir():
+                self.adopt_prepared_frames(Path(prepared_frames), frames_dir)
+            else:
+                prepared_frames = None
+                self.extract_video_frames(video_path, frames_dir)
+                timings["extract"] = time.time() - stage_start
+            num_frames = len(list(frames_dir.glob(f"*.{self.image_ext}")))
+            if not num_frames:
                 raise RuntimeError("未提取到任何视频帧，无法进行COLMAP重建")
 
-            #稀疏重建
-            self.run_sparse_reconstruction(colmap_dir, frames_dir, sparse_dir)
+            #稀疏重建（长视频分段并行）
+            if segmented is None:
+                segmented = num_frames >= self.segmented_min_frames
+            stage_start = time.time()
+            if segmented:
+                stats = self.run_segmented_reconstruction(colmap_dir, frames_dir, sparse_dir)
+            else:
+                stats = self.run_reconstruction_with_fallback(video_path, colmap_dir, frames_dir, sparse_dir)
+            timings["reconstruction"] = time.time() - stage_start
+            preview_path = self._export_preview(sparse_dir / Config.SPARSE_MODEL_SUBDIR)
 
             # 返回结果信息
             return {
@@ -145,6 +549,11 @@ class ColmapGenerator:
                 "colmap_dir": str(colmap_dir),
                 "frames_dir": str(frames_dir),
                 "sparse_dir": str(sparse_dir),
+                "preview_path": preview_path,
+                "mode": "segmented" if segmented else "single",
+                "streamed_frames": prepared_frames is not None,
+                "stats": stats,
+                "timings": timings,
             }
 
         except Exception as e:
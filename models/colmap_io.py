@@ -0,0 +1,187 @@
+import collections
+import struct
+from pathlib import Path
+
+import numpy as np
+
+# COLMAP二进制模型（cameras.bin / images.bin / points3D.bin）读写
+# 格式与COLMAP及gaussian-splatting的read_write_model.py一致，不依赖pycolmap版本
+
+Camera = collections.namedtuple("Camera", ["id", "model", "width", "height", "params"])
+Image = collections.namedtuple("Image", ["id", "qvec", "tvec", "camera_id", "name", "xys", "point3D_ids"])
+Point3D = collections.namedtuple("Point3D", ["id", "xyz", "rgb", "error", "image_ids", "point2D_idxs"])
+
+# 相机模型ID -> (名称, 参数个数)
+CAMERA_MODELS = {
+    0: ("SIMPLE_PINHOLE", 3),
+    1: ("PINHOLE", 4),
+    2: ("SIMPLE_RADIAL", 4),
+    3: ("RADIAL", 5),
+    4: ("OPENCV", 8),
+    5: ("OPENCV_FISHEYE", 8),
+    6: ("FULL_OPENCV", 12),
+    7: ("FOV", 5),
+    8: ("SIMPLE_RADIAL_FISHEYE", 4),
+    9: ("RADIAL_FISHEYE", 5),
+    10: ("THIN_PRISM_FISHEYE", 12),
+}
+CAMERA_MODEL_IDS = {name: model_id for model_id, (name, _) in CAMERA_MODELS.items()}
+
+
+def _read(fid, num_bytes, fmt):
+    return struct.unpack("<" + fmt, fid.read(num_bytes))
+
+
+def read_cameras_binary(path):
+    """读取cameras.bin，返回{camera_id: Camera}"""
+    cameras = {}
+    with open(path, "rb") as fid:
+        num_cameras = _read(fid, 8, "Q")[0]
+        for _ in range(num_cameras):
+            camera_id, model_id, width, height = _read(fid, 24, "iiQQ")
+            model_name, num_params = CAMERA_MODELS[model_id]
+            params = np.array(_read(fid, 8 * num_params, "d" * num_params))
+            cameras[camera_id] = Camera(camera_id, model_name, width, height, params)
+    return cameras
+
+
+def read_images_binary(path):
+    """读取images.bin，返回{image_id: Image}"""
+    images = {}
+    with open(path, "rb") as fid:
+        num_images = _read(fid, 8, "Q")[0]
+        for _ in range(num_images):
+            props = _read(fid, 64, "idddddddi")
+            image_id = props[0]
+            qvec = np.array(props[1:5])
+            tvec = np.array(props[5:8])
+            camera_id = props[8]
+            name = b""
+            char = fid.read(1)
+            while char != b"\x00":
+                name += char
+                char = fid.read(1)
+            num_points2D = _read(fid, 8, "Q")[0]
+            data = np.frombuffer(fid.read(24 * num_points2D),
+                                 dtype=[("xy", "<f8", 2), ("point3D_id", "<i8")])
+            images[image_id] = Image(image_id, qvec, tvec, camera_id, name.decode("utf-8"),
+                                     data["xy"].copy(), data["point3D_id"].copy())
+    return images
+
+
+def read_points3D_binary(path):
+    """读取points3D.bin，返回{point3D_id: Point3D}"""
+    points3D = {}
+    with open(path, "rb") as fid:
+        num_points = _read(fid, 8, "Q")[0]
+        for _ in range(num_points):
+            props = _read(fid, 43, "QdddBBBd")
+            point3D_id = props[0]
+            xyz = np.array(props[1:4])
+            rgb = np.array(props[4:7], dtype=np.uint8)
+            error = props[7]
+            track_length = _read(fid, 8, "Q")[0]
+            track = np.frombuffer(fid.read(8 * track_length), dtype="<i4").reshape(-1, 2)
+            points3D[point3D_id] = Point3D(point3D_id, xyz, rgb, error,
+                                           track[:, 0].copy(), track[:, 1].copy())
+    return points3D
+
+
+def write_cameras_binary(cameras, path):
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", len(cameras)))
+        for camera in cameras.values():
+            model_id = CAMERA_MODEL_IDS[camera.model]
+            fid.write(struct.pack("<iiQQ", camera.id, model_id, camera.width, camera.height))
+            fid.write(struct.pack("<" + "d" * len(camera.params), *camera.params))
+
+
+def write_images_binary(images, path):
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", len(images)))
+        for image in images.values():
+            fid.write(struct.pack("<i", image.id))
+            fid.write(struct.pack("<dddd", *image.qvec))
+            fid.write(struct.pack("<ddd", *image.tvec))
+            fid.write(struct.pack("<i", image.camera_id))
+            fid.write(image.name.encode("utf-8") + b"\x00")
+            fid.write(struct.pack("<Q", len(image.point3D_ids)))
+            data = np.empty(len(image.point3D_ids), dtype=[("xy", "<f8", 2), ("point3D_id", "<i8")])
+            data["xy"] = image.xys
+            data["point3D_id"] = image.point3D_ids
+            fid.write(data.tobytes())
+
+
+def write_points3D_binary(points3D, path):
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", len(points3D)))
+        for point in points3D.values():
+            fid.write(struct.pack("<Q", point.id))
+            fid.write(struct.pack("<ddd", *point.xyz))
+            fid.write(struct.pack("<BBB", *[int(c) for c in point.rgb]))
+            fid.write(struct.pack("<d", point.error))
+            fid.write(struct.pack("<Q", len(point.image_ids)))
+            track = np.stack([point.image_ids, point.point2D_idxs], axis=1).astype("<i4")
+            fid.write(track.tobytes())
+
+
+def read_entry_count(path):
+    """只读取二进制文件开头的条目数（相机/图像/三维点数），不解析内容"""
+    with open(path, "rb") as fid:
+        return _read(fid, 8, "Q")[0]
+
+
+def read_model(model_dir):
+    """读取二进制稀疏模型目录，返回(cameras, images, points3D)"""
+    model_dir = Path(model_dir)
+    cameras = read_cameras_binary(model_dir / "cameras.bin")
+    images = read_images_binary(model_dir / "images.bin")
+    points3D = read_points3D_binary(model_dir / "points3D.bin")
+    return cameras, images, points3D
+
+
+def write_model(cameras, images, points3D, model_dir):
+    """写出二进制稀疏模型到目录"""
+    model_dir = Path(model_dir)
+    model_dir.mkdir(exist_ok=True, parents=True)
+    write_cameras_binary(cameras, model_dir / "cameras.bin")
+    write_images_binary(images, model_dir / "images.bin")
+    write_points3D_binary(points3D, model_dir / "points3D.bin")
+
+
+def qvec2rotmat(qvec):
+    w, x, y, z = qvec
+    return np.array([
+        [1 - 2 * y * y - 2 * z * z, 2 * x * y - 2 * w * z, 2 * z * x + 2 * w * y],
+        [2 * x * y + 2 * w * z, 1 - 2 * x * x - 2 * z * z, 2 * y * z - 2 * w * x],
+        [2 * z * x - 2 * w * y, 2 * y * z + 2 * w * x, 1 - 2 * x * x - 2 * y * y],
+    ])
+
+
+def rotmat2qvec(R):
+    Rxx, Ryx, Rzx, Rxy, Ryy, Rzy, Rxz, Ryz, Rzz = R.flat
+    K = np.array([
+        [Rxx - Ryy - Rzz, 0, 0, 0],
+        [Ryx + Rxy, Ryy - Rxx - Rzz, 0, 0],
+        [Rzx + Rxz, Rzy + Ryz, Rzz - Rxx - Ryy, 0],
+        [Ryz - Rzy, Rzx - Rxz, Rxy - Ryx, Rxx + Ryy + Rzz],
+    ]) / 3.0
+    eigvals, eigvecs = np.linalg.eigh(K)
+    qvec = eigvecs[[3, 0, 1, 2], np.argmax(eigvals)]
+    if qvec[0] < 0:
+        qvec *= -1
+    return qvec
+
+
+def camera_intrinsics(camera):
+    """相机内参(fx, fy, cx, cy)，单焦距模型fx=fy"""
+    params = camera.params
+    if camera.model in ("SIMPLE_PINHOLE", "SIMPLE_RADIAL", "RADIAL", "SIMPLE_RADIAL_FISHEYE", "RADIAL_FISHEYE"):
+        return params[0], params[0], params[1], params[2]
+    return params[0], params[1], params[2], params[3]
+
+
+def camera_center(image):
+    """图像的相机中心（世界坐标）: C = -R^T t"""
+    R = qvec2rotmat(image.qvec)
+    return -R.T @ image.tvec
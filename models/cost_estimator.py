@@ -0,0 +1,194 @@
+import json
+import logging
+import math
+import statistics
+import threading
+from pathlib import Path
+
+import cv2
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class CostEstimator:
+    """
+    流水线耗时估计器
+    每个阶段的耗时 = 工作量 × 单位成本；单位成本取历史任务实测值的中位数，
+    历史不足时使用默认值，每完成一个任务就用实测阶段耗时更新。
+    """
+
+    STAGES = ("extract", "features", "matching", "mapping", "training")
+
+    # 默认单位成本（秒/工作量单位），历史样本不足时使用
+    DEFAULT_UNIT_COSTS = {
+        "extract": 0.002,   # 每解码一帧百万像素
+        "features": 1.0,    # 每张图在特征分辨率下的百万像素
+        "matching": 0.02,   # 每个匹配图像对
+        "mapping": 0.05,    # 每 帧数^1.5
+        "training": 0.06,   # 每训练迭代
+    }
+
+    def __init__(self, history_path=None, window=None):
+        self.history_path = Path(history_path or Config.COST_HISTORY_PATH)
+        self.window = window or Config.COST_HISTORY_WINDOW
+        self.min_samples = Config.COST_MIN_SAMPLES
+        self._lock = threading.Lock()
+        self._history = self._load_history()
+
+    def _load_history(self):
+        """读取历史样本 {stage: [[units, seconds], ...]}"""
+        try:
+            if self.history_path.exists():
+                with open(self.history_path, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+                return {stage: history.get(stage, []) for stage in self.STAGES}
+        except Exception as e:
+            logger.warning(f"读取耗时历史失败: {e}")
+        return {stage: [] for stage in self.STAGES}
+
+    def _save_history(self):
+        try:
+            self.history_path.parent.mkdir(exist_ok=True, parents=True)
+            tmp_path = self.history_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._history, f)
+            tmp_path.replace(self.history_path)
+        except Exception as e:
+            logger.warning(f"保存耗时历史失败: {e}")
+
+    @staticmethod
+    def probe_video(video_path):
+        """只读取视频元数据（帧数、帧率、分辨率），不解码帧"""
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            raise RuntimeError(f"无法打开视频文件: {video_path}")
+        try:
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        finally:
+            cap.release()
+        return {
+            "frame_count": frame_count,
+            "fps": fps,
+            "width": width,
+            "height": height,
+            "duration": round(frame_count / fps, 2) if fps else None,
+        }
+
+    @staticmethod
+    def matching_pairs(num_frames, matcher="exhaustive", overlap=10):
+        """匹配图像对数：穷举为n(n-1)/2，顺序匹配约为n*overlap"""
+        if matcher == "sequential":
+            return max(0, num_frames * min(overlap, num_frames - 1))
+        return num_frames * (num_frames - 1) // 2
+
+    def work_units(self, probe, num_frames, max_image_size, iterations, matcher="exhaustive"):
+        """计算各阶段工作量"""
+        megapixels = probe["width"] * probe["height"] / 1e6
+        scale = min(1.0, max_image_size / max(probe["width"], probe["height"], 1))
+        return {
+            "extract": probe["frame_count"] * megapixels,
+            "features": num_frames * megapixels * scale * scale,
+            "matching": self.matching_pairs(num_frames, matcher),
+            "mapping": num_frames ** 1.5,
+            "training": iterations,
+        }
+
+    def unit_cost(self, stage):
+        """阶段单位成本：历史样本中位数，样本不足时为默认值"""
+        with self._lock:
+            samples = [seconds / units for units, seconds in self._history[stage] if units > 0]
+        if len(samples) < self.min_samples:
+            return self.DEFAULT_UNIT_COSTS[stage]
+        return statistics.median(samples)
+
+    def estimate(self, video_path, generator=None, iterations=None):
+        """
+        估计任务耗时
+        :param video_path: 已保存的视频路径
+        :param generator: ColmapGenerator实例（提供抽帧间隔、匹配策略、特征分辨率、分段参数），默认新建
+        :param iterations: 训练迭代数，默认取Config
+        :return: 估计结果字典（视频信息、抽帧数、匹配对数、各阶段秒数、总秒数）
+        """
+        if generator is None:
+            from models.colmap_generator import ColmapGenerator
+            generator = ColmapGenerator()
+        if iterations is None:
+            iterations = Config.GAUSSIAN_TRAINING_ARGS["iterations"]
+
+        probe = self.probe_video(video_path)
+        num_frames = math.ceil(probe["frame_count"] / generator.effective_frame_interval(probe["frame_count"]))
+        matcher = generator.matcher
+        units = self.work_units(probe, num_frames, generator.max_image_size, iterations, matcher)
+        stages = {stage: units[stage] * self.unit_cost(stage) for stage in self.STAGES}
+        matching_pairs = units["matching"]
+
+        # 分段并行重建：按每段工作量估计，再按并行进程数折算
+        segmented = num_frames >= generator.segmented_min_frames
+        if segmented:
+            step = max(1, generator.segment_size - generator.segment_overlap)
+            num_segments = math.ceil(max(0, num_frames - generator.segment_size) / step) + 1
+            segment_units = self.work_units(probe, generator.segment_size, generator.max_image_size,
+                                            iterations, matcher)
+            waves = math.ceil(num_segments / max(1, generator.segment_workers))
+            for stage in ("features", "matching", "mapping"):
+                stages[stage] = waves * segment_units[stage] * self.unit_cost(stage)
+            matching_pairs = num_segments * segment_units["matching"]
+
+        stages = {stage: round(seconds, 1) for stage, seconds in stages.items()}
+        return {
+            "video": probe,
+            "extracted_frames": num_frames,
+            "matching_pairs": int(matching_pairs),
+            "segmented": segmented,
+            "max_image_size": generator.max_image_size,
+            "matcher": matcher,
+            "iterations": iterations,
+            "units": units,
+            "stages": stages,
+            "total_seconds": round(sum(stages.values()), 1),
+        }
+
+    def remaining_seconds(self, estimate, completed_stages):
+        """剩余阶段的估计秒数"""
+        return round(sum(seconds for stage, seconds in estimate["stages"].items()
+                         if stage not in completed_stages), 1)
+
+    def _add_sample(self, stage, units, seconds):
+        if units > 0 and seconds > 0:
+            self._history[stage].append([units, seconds])
+            self._history[stage] = self._history[stage][-self.window:]
+
+    def record(self, estimate, colmap_result=None, training_result=None):
+        """
+        用任务实测的阶段耗时更新单位成本
+        :param estimate: 上传时的估计结果（提供视频信息和工作量）
+        :param colmap_result: ColmapGenerator.generate_from_video的返回值
+        :param training_result: ModelTrainer.train的返回值
+        """
+        probe = estimate["video"]
+        with self._lock:
+            if colmap_result and colmap_result.get("success"):
+                timings = colmap_result.get("timings", {})
+                stats = colmap_result.get("stats", {})
+                # 流式抽帧与上传重叠，没有单独的抽帧耗时
+                if "extract" in timings:
+                    self._add_sample("extract", estimate["units"]["extract"], timings["extract"])
+
+                # 单段重建一个样本；分段重建每段一个样本
+                runs = stats.get("segment_stats") or [stats]
+                for run in runs:
+                    run_timings = run.get("timings", {})
+                    units = self.work_units(probe, run.get("num_frames", 0), estimate["max_image_size"],
+                                            estimate["iterations"], estimate["matcher"])
+                    for stage in ("features", "matching", "mapping"):
+                        self._add_sample(stage, units[stage], run_timings.get(stage, 0))
+
+            if training_result and training_result.get("success"):
+                self._add_sample("training", training_result.get("iterations", estimate["iterations"]),
+                                 training_result.get("elapsed_time", 0))
+            self._save_history()
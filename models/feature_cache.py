@@ -0,0 +1,303 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pycolmap
+
+from config import Config
+from models import colmap_io
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_ID = 2147483647  # COLMAP数据库中pair_id = image_id1 * MAX_IMAGE_ID + image_id2（image_id1 < image_id2）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    image_hash TEXT NOT NULL,
+    options_key TEXT NOT NULL,
+    keypoint_rows INTEGER NOT NULL,
+    keypoint_cols INTEGER NOT NULL,
+    keypoints BLOB,
+    descriptor_rows INTEGER NOT NULL,
+    descriptor_cols INTEGER NOT NULL,
+    descriptors BLOB,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (image_hash, options_key)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    hash1 TEXT NOT NULL,
+    hash2 TEXT NOT NULL,
+    options_key TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    data BLOB,
+    inlier_rows INTEGER NOT NULL,
+    inlier_cols INTEGER NOT NULL,
+    inliers BLOB,
+    config INTEGER NOT NULL,
+    F BLOB, E BLOB, H BLOB, qvec BLOB, tvec BLOB,
+    PRIMARY KEY (hash1, hash2, options_key)
+);
+"""
+
+
+def image_hash(path):
+    """帧内容的SHA-256（相同视频按相同间隔抽出的帧字节完全一致）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _pair_id(image_id1, image_id2):
+    return image_id1 * MAX_IMAGE_ID + image_id2
+
+
+def _swap_matches(blob, rows, cols):
+    if not blob or rows == 0:
+        return blob
+    return np.ascontiguousarray(np.frombuffer(blob, dtype=np.uint32).reshape(rows, cols)[:, ::-1]).tobytes()
+
+
+def _swap_geometry(F, E, H, qvec, tvec):
+    """
+    交换图像对顺序后的两视图几何：F、E转置，H求逆，相对位姿取逆
+    （对矩阵按行优先或列优先解读，转置和求逆的结果都一致）
+    """
+    def matrix(blob, op):
+        if not blob:
+            return blob
+        return op(np.frombuffer(blob, dtype=np.float64).reshape(3, 3)).astype(np.float64).tobytes()
+
+    F = matrix(F, lambda m: m.T.copy())
+    E = matrix(E, lambda m: m.T.copy())
+    H = matrix(H, lambda m: np.linalg.inv(m) if abs(np.linalg.det(m)) > 1e-12 else m)
+    if qvec and tvec:
+        q = np.frombuffer(qvec, dtype=np.float64)
+        t = np.frombuffer(tvec, dtype=np.float64)
+        R = colmap_io.qvec2rotmat(q)
+        qvec = np.array([q[0], -q[1], -q[2], -q[3]]).tobytes()
+        tvec = (-R.T @ t).tobytes()
+    return F, E, H, qvec, tvec
+
+
+class FeatureCache:
+    """
+    全局SIFT特征与匹配缓存（SQLite）：特征以（帧内容哈希, 提取参数）为键，
+    匹配及几何验证结果以（两帧内容哈希, 参数）为键，跨任务、跨用户复用。
+    重建前用缓存预填新的database.db（pycolmap.import_images建立相机和图像记录，再写入关键点、描述子和
+    已验证的图像对），COLMAP会跳过已有特征的图像和已有匹配的图像对，只处理新增部分；
+    重建后把新提取的特征和新匹配的图像对收录回缓存。
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = Path(path or Config.FEATURE_CACHE_PATH)
+        self.max_bytes = Config.FEATURE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def _connect(self):
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        # 分段重建和回退变体在多个进程中同时读写，使用WAL并等待写锁
+        conn = sqlite3.connect(str(self.path), timeout=Config.FEATURE_CACHE_LOCK_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    @staticmethod
+    def feature_key(generator):
+        """影响特征提取结果的参数"""
+        return json.dumps({
+            "max_image_size": generator.max_image_size,
+            "sift_num_octaves": generator.sift_num_octaves,
+            "pycolmap": pycolmap.__version__,
+        }, sort_keys=True)
+
+    @classmethod
+    def match_key(cls, generator):
+        """影响匹配和几何验证结果的参数（相机模型决定验证时使用的内参）"""
+        return json.dumps({"features": cls.feature_key(generator), "camera_model": generator.camera_model},
+                          sort_keys=True)
+
+    @staticmethod
+    def candidate_pairs(names, generator):
+        """本次匹配策略会匹配的图像对（只预填这些对，保证结果与不使用缓存时一致）"""
+        names = sorted(names)
+        if generator.matcher == "sequential":
+            # 与COLMAP顺序匹配一致：后续overlap帧，加上间隔为2^k的帧（quadratic_overlap默认开启）
+            pairs = set()
+            for i in range(len(names)):
+                for k in range(generator.sequential_overlap):
+                    for j in (i + k + 1, i + (1 << k)):
+                        if j < len(names):
+                            pairs.add((names[i], names[j]))
+            return sorted(pairs)
+        return [(names[i], names[j]) for i in range(len(names)) for j in range(i + 1, len(names))]
+
+    def seed(self, database_path, frames_dir, generator):
+        """
+        用缓存预填新数据库（数据库须不存在）
+        :return: 预填信息，重建后传给harvest
+        """
+        start = time.time()
+        frames_dir = Path(frames_dir)
+        names = sorted(path.name for path in frames_dir.glob(f"*.{generator.image_ext}"))
+        hashes = {name: image_hash(frames_dir / name) for name in names}
+        feature_key, match_key = self.feature_key(generator), self.match_key(generator)
+        state = {"hashes": hashes, "feature_key": feature_key, "match_key": match_key,
+                 "cached_images": 0, "cached_pairs": 0}
+
+        conn = self._connect()
+        try:
+            unique = sorted(set(hashes.values()))
+            features = {}
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT image_hash, keypoint_rows, keypoint_cols, keypoints, descriptor_rows, descriptor_cols, "
+                    f"descriptors FROM features WHERE options_key = ? AND image_hash IN ({','.join('?' * len(batch))})",
+                    [feature_key] + batch)
+                features.update((row[0], row[1:]) for row in rows)
+            if not features:
+                return state
+
+            # 候选图像对写入临时表后一次连接查询（穷举匹配400帧约8万对，逐对查询的往返开销抵消了缓存收益）
+            wanted = {}
+            for name1, name2 in self.candidate_pairs(names, generator):
+                hash1, hash2 = hashes[name1], hashes[name2]
+                if hash1 == hash2 or hash1 not in features or hash2 not in features:
+                    continue
+                wanted.setdefault((min(hash1, hash2), max(hash1, hash2)), []).append((name1, name2))
+            conn.execute("CREATE TEMP TABLE wanted_pairs (hash1 TEXT NOT NULL, hash2 TEXT NOT NULL, "
+                         "PRIMARY KEY (hash1, hash2))")
+            conn.executemany("INSERT INTO wanted_pairs VALUES (?, ?)", wanted)
+            pairs = {}
+            for row in conn.execute("SELECT m.hash1, m.hash2, m.rows, m.cols, m.data, m.inlier_rows, m.inlier_cols, "
+                                    "m.inliers, m.config, m.F, m.E, m.H, m.qvec, m.tvec FROM wanted_pairs w "
+                                    "JOIN matches m ON m.hash1 = w.hash1 AND m.hash2 = w.hash2 AND m.options_key = ?",
+                                    (match_key,)):
+                for name1, name2 in wanted[(row[0], row[1])]:
+                    pairs[(name1, name2)] = (hashes[name1] > hashes[name2], row[2:])
+            with conn:
+                conn.executemany("UPDATE features SET last_used = ? WHERE image_hash = ? AND options_key = ?",
+                                 [(time.time(), image_hash_, feature_key) for image_hash_ in features])
+        finally:
+            conn.close()
+
+        # 建立与特征提取一致的相机、帧和图像记录
+        pycolmap.Database.open(str(database_path)).close()
+        reader_opts = pycolmap.ImageReaderOptions()
+        reader_opts.camera_model = generator.camera_model
+        pycolmap.import_images(str(database_path), str(frames_dir), pycolmap.CameraMode.SINGLE,
+                               options=reader_opts)
+
+        # 数据库连接必须在调用pycolmap之前关闭，否则未完成的读语句持有的锁会使COLMAP写入失败
+        database = sqlite3.connect(str(database_path))
+        try:
+            with database:
+                image_ids = {name: image_id for image_id, name in database.execute("SELECT image_id, name FROM images")}
+                keypoint_rows, descriptor_rows = [], []
+                for name, image_id in image_ids.items():
+                    cached = features.get(hashes.get(name))
+                    if cached is None:
+                        continue
+                    kp_rows, kp_cols, keypoints, desc_rows, desc_cols, descriptors = cached
+                    keypoint_rows.append((image_id, kp_rows, kp_cols, keypoints))
+                    descriptor_rows.append((image_id, desc_rows, desc_cols, descriptors))
+                database.executemany("INSERT INTO keypoints VALUES (?, ?, ?, ?)", keypoint_rows)
+                database.executemany("INSERT INTO descriptors VALUES (?, ?, ?, ?)", descriptor_rows)
+                state["cached_images"] = len(keypoint_rows)
+
+                match_rows, geometry_rows = [], []
+                for (name1, name2), (hash_swapped, row) in pairs.items():
+                    rows, cols, data, inlier_rows, inlier_cols, inliers, config, F, E, H, qvec, tvec = row
+                    id1, id2 = image_ids[name1], image_ids[name2]
+                    # 缓存按哈希顺序存储，数据库按image_id顺序存储，两者相反时交换
+                    if hash_swapped != (id1 > id2):
+                        data = _swap_matches(data, rows, cols)
+                        inliers = _swap_matches(inliers, inlier_rows, inlier_cols)
+                        F, E, H, qvec, tvec = _swap_geometry(F, E, H, qvec, tvec)
+                    pair_id = _pair_id(min(id1, id2), max(id1, id2))
+                    match_rows.append((pair_id, rows, cols, data))
+                    geometry_rows.append((pair_id, inlier_rows, inlier_cols, inliers, config, F, E, H, qvec, tvec))
+                database.executemany("INSERT INTO matches VALUES (?, ?, ?, ?)", match_rows)
+                database.executemany("INSERT INTO two_view_geometries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     geometry_rows)
+                state["cached_pairs"] = len(match_rows)
+        finally:
+            database.close()
+
+        logger.info(f"特征缓存命中：{state['cached_images']}/{len(names)}张图像，{state['cached_pairs']}个图像对，"
+                    f"预填耗时{time.time() - start:.2f}秒")
+        return state
+
+    def harvest(self, database_path, state):
+        """把数据库中缓存尚未收录的特征和图像对写回缓存，超出容量时淘汰最久未用的特征"""
+        hashes, feature_key, match_key = state["hashes"], state["feature_key"], state["match_key"]
+        database = sqlite3.connect(str(database_path))
+        conn = self._connect()
+        try:
+            names = dict(database.execute("SELECT image_id, name FROM images"))
+            image_hashes = {image_id: hashes[name] for image_id, name in names.items() if name in hashes}
+            known = {row[0] for row in conn.execute("SELECT image_hash FROM features WHERE options_key = ?",
+                                                    (feature_key,))}
+            new_images = 0
+            new_pairs = 0
+            with conn:
+                for image_id, kp_rows, kp_cols, keypoints, desc_rows, desc_cols, descriptors in database.execute(
+                        "SELECT k.image_id, k.rows, k.cols, k.data, d.rows, d.cols, d.data "
+                        "FROM keypoints k JOIN descriptors d ON k.image_id = d.image_id"):
+                    hash_ = image_hashes.get(image_id)
+                    if hash_ is None or hash_ in known:
+                        continue
+                    known.add(hash_)
+                    size = len(keypoints or b"") + len(descriptors or b"")
+                    conn.execute("INSERT OR IGNORE INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (hash_, feature_key, kp_rows, kp_cols, keypoints, desc_rows, desc_cols, descriptors,
+                                  size, time.time()))
+                    new_images += 1
+
+                for row in database.execute(
+                        "SELECT m.pair_id, m.rows, m.cols, m.data, g.rows, g.cols, g.data, g.config, "
+                        "g.F, g.E, g.H, g.qvec, g.tvec FROM matches m JOIN two_view_geometries g ON m.pair_id = g.pair_id"):
+                    pair_id, rows, cols, data, inlier_rows, inlier_cols, inliers, config, F, E, H, qvec, tvec = row
+                    hash1, hash2 = image_hashes.get(pair_id // MAX_IMAGE_ID), image_hashes.get(pair_id % MAX_IMAGE_ID)
+                    if hash1 is None or hash2 is None or hash1 == hash2:
+                        continue
+                    if hash1 > hash2:
+                        hash1, hash2 = hash2, hash1
+                        data = _swap_matches(data, rows, cols)
+                        inliers = _swap_matches(inliers, inlier_rows, inlier_cols)
+                        F, E, H, qvec, tvec = _swap_geometry(F, E, H, qvec, tvec)
+                    cursor = conn.execute("INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                          (hash1, hash2, match_key, rows, cols, data, inlier_rows, inlier_cols, inliers,
+                                           config, F, E, H, qvec, tvec))
+                    new_pairs += cursor.rowcount
+            self._evict(conn)
+        finally:
+            conn.close()
+            database.close()
+        logger.info(f"特征缓存收录：{new_images}张图像，{new_pairs}个图像对")
+        return {"new_images": new_images, "new_pairs": new_pairs}
+
+    def _evict(self, conn):
+        """按最近使用时间淘汰特征，直到总大小不超过上限；同时删除引用已淘汰图像的匹配"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM features").fetchone()[0]
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+        evicted = 0
+        with conn:
+            for image_hash_, options_key, size in conn.execute(
+                    "SELECT image_hash, options_key, size FROM features ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM features WHERE image_hash = ? AND options_key = ?", (image_hash_, options_key))
+                total -= size
+                evicted += 1
+            conn.execute("DELETE FROM matches WHERE NOT EXISTS (SELECT 1 FROM features WHERE image_hash = hash1) "
+                         "OR NOT EXISTS (SELECT 1 FROM features WHERE image_hash = hash2)")
+        logger.info(f"特征缓存超出容量，淘汰{evicted}张图像的特征")
@@ -0,0 +1,99 @@
+import collections
+import logging
+import threading
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class JobScheduler:
+    """
+    任务调度器：限制同时运行的任务数
+    普通任务按提交顺序执行；延后任务（如超出耗时预算）只在没有其他任务运行或排队时执行。
+    """
+
+    def __init__(self, max_concurrent=None):
+        self.max_concurrent = max(1, max_concurrent or Config.MAX_CONCURRENT_JOBS)
+        self._queue = collections.deque()
+        self._deferred = collections.deque()
+        self._running = set()
+        self._condition = threading.Condition()
+        self._workers = []
+
+    def start(self):
+        """启动工作线程（重复调用无效）；启动前提交的任务排队等待"""
+        with self._condition:
+            if self._workers:
+                return
+            for index in range(self.max_concurrent):
+                worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{index}")
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, task_id, target, args=(), deferred=False):
+        """提交任务，返回当前排队位置（从1开始）"""
+        with self._condition:
+            queue = self._deferred if deferred else self._queue
+            queue.append((task_id, target, args))
+            position = len(self._queue) + (len(self._deferred) if deferred else 0)
+            self._condition.notify()
+        logger.info(f"任务 {task_id} 已{'延后' if deferred else ''}排队，位置: {position}")
+        return position
+
+    def _next_job(self):
+        """取下一个可执行任务（调用方需持有锁）"""
+        if self._queue:
+            return self._queue.popleft()
+        if self._deferred and not self._running:
+            return self._deferred.popleft()
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+                task_id, target, args = job
+                self._running.add(task_id)
+
+            try:
+                target(*args)
+            except Exception as e:
+                logger.error(f"任务 {task_id} 执行异常: {str(e)}", exc_info=True)
+            finally:
+                with self._condition:
+                    self._running.discard(task_id)
+                    # 空出槽位后唤醒所有工作线程（延后任务可能因此变为可执行）
+                    self._condition.notify_all()
+
+    def cancel(self, task_id):
+        """从队列中移除尚未开始的任务，成功移除返回True"""
+        with self._condition:
+            for queue in (self._queue, self._deferred):
+                for job in queue:
+                    if job[0] == task_id:
+                        queue.remove(job)
+                        logger.info(f"任务 {task_id} 已从队列移除")
+                        return True
+        return False
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._queue) + len(self._deferred)
+
+    def running_count(self):
+        with self._condition:
+            return len(self._running)
+
+    def get_status(self):
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': sorted(self._running),
+                'queued': [job[0] for job in self._queue],
+                'deferred': [job[0] for job in self._deferred],
+            }
@@ -1,5 +1,8 @@
+import hmac
 from functools import wraps
-from flask import session, redirect, url_for, jsonify
+from flask import session, redirect, url_for, jsonify, request
+
+from config import Config
 
 def login_required(f):
     """登录装饰器"""
@@ -8,7 +11,19 @@ def login_required(f):
         if not session.get('logged_in'):
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'success': False, 'message': '需要登录'}), 401
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def worker_token_required(f):
+    """工作节点接口装饰器（仅remote模式开放，校验请求头X-Worker-Token）"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if Config.WORKER_MODE != "remote":
+            return jsonify({'success': False, 'message': '未启用远程工作节点模式'}), 404
+        token = request.headers.get('X-Worker-Token', '')
+        if not hmac.compare_digest(token.encode('utf-8'), Config.WORKER_TOKEN.encode('utf-8')):
+            return jsonify({'success': False, 'message': '工作节点令牌无效'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
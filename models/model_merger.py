@@ -0,0 +1,174 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from models import colmap_io
+
+logger = logging.getLogger(__name__)
+
+
+class ModelMerger:
+    """通过共享帧对齐并合并多个COLMAP子模型（相似变换 + 相机/图像/点云重编号）"""
+
+    def __init__(self, min_shared_images=3, max_align_error=0.05):
+        self.min_shared_images = min_shared_images  # 对齐所需的最少共享帧数
+        self.max_align_error = max_align_error      # 对齐残差上限（相对场景尺度）
+
+    @staticmethod
+    def umeyama(src, dst):
+        """
+        求相似变换 dst ≈ s * R @ src + t（Umeyama方法）
+        :param src: Nx3 源点
+        :param dst: Nx3 目标点
+        :return: (s, R, t)
+        """
+        src_mean = src.mean(axis=0)
+        dst_mean = dst.mean(axis=0)
+        src_c = src - src_mean
+        dst_c = dst - dst_mean
+
+        cov = dst_c.T @ src_c / len(src)
+        U, D, Vt = np.linalg.svd(cov)
+        S = np.eye(3)
+        if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+            S[2, 2] = -1
+        R = U @ S @ Vt
+        src_var = (src_c ** 2).sum() / len(src)
+        s = np.trace(np.diag(D) @ S) / src_var if src_var > 0 else 1.0
+        t = dst_mean - s * R @ src_mean
+        return s, R, t
+
+    def _estimate_alignment(self, src_centers, dst_centers):
+        """估计对齐变换并剔除一次离群共享帧，返回(s, R, t, 相对残差)"""
+        s, R, t = self.umeyama(src_centers, dst_centers)
+        residuals = np.linalg.norm((s * (R @ src_centers.T)).T + t - dst_centers, axis=1)
+        inliers = residuals <= max(3 * np.median(residuals), 1e-12)
+        if self.min_shared_images <= inliers.sum() < len(residuals):
+            s, R, t = self.umeyama(src_centers[inliers], dst_centers[inliers])
+            residuals = np.linalg.norm((s * (R @ src_centers.T)).T + t - dst_centers, axis=1)[inliers]
+
+        scene_scale = np.median(np.linalg.norm(dst_centers - dst_centers.mean(axis=0), axis=1))
+        relative_error = float(np.median(residuals) / scene_scale) if scene_scale > 0 else float("inf")
+        return s, R, t, relative_error
+
+    def _add_model(self, merged, model, s, R, t):
+        """把已对齐的子模型加入合并结果（共享帧保留已有位姿，只加入新帧和新点）"""
+        cameras, images, points3D = merged
+        sub_cameras, sub_images, sub_points3D = model
+
+        camera_map = {}
+        for camera in sub_cameras.values():
+            new_id = max(cameras, default=0) + 1
+            cameras[new_id] = camera._replace(id=new_id)
+            camera_map[camera.id] = new_id
+
+        merged_names = {image.name for image in images.values()}
+        image_map = {}
+        for image in sub_images.values():
+            if image.name in merged_names:
+                continue
+            image_map[image.id] = max(images, default=0) + 1 + len(image_map)
+
+        # 点云变换：X' = s * R @ X + t，只保留新帧上至少两个观测的点
+        point_map = {}
+        next_point_id = max(points3D, default=0) + 1
+        for point in sub_points3D.values():
+            keep = np.array([image_id in image_map for image_id in point.image_ids], dtype=bool)
+            if keep.sum() < 2:
+                continue
+            new_id = next_point_id + len(point_map)
+            point_map[point.id] = new_id
+            points3D[new_id] = colmap_io.Point3D(
+                new_id,
+                s * R @ point.xyz + t,
+                point.rgb,
+                point.error,
+                np.array([image_map[i] for i in point.image_ids[keep]]),
+                point.point2D_idxs[keep],
+            )
+
+        # 位姿变换：R_i' = R_i R^T, t_i' = s * t_i - R_i R^T t
+        for old_id, new_id in image_map.items():
+            image = sub_images[old_id]
+            R_i = colmap_io.qvec2rotmat(image.qvec) @ R.T
+            t_i = s * image.tvec - R_i @ t
+            point3D_ids = np.array([point_map.get(int(pid), -1) for pid in image.point3D_ids], dtype=np.int64)
+            images[new_id] = colmap_io.Image(
+                new_id,
+                colmap_io.rotmat2qvec(R_i),
+                t_i,
+                camera_map[image.camera_id],
+                image.name,
+                image.xys,
+                point3D_ids,
+            )
+
+        return len(image_map), len(point_map)
+
+    def merge(self, model_dirs, output_dir):
+        """
+        对齐并合并子模型，写出到output_dir（cameras/images/points3D.bin）
+        :param model_dirs: 子模型目录列表
+        :param output_dir: 合并结果目录
+        :return: 合并统计信息字典
+        """
+        models = []
+        for model_dir in model_dirs:
+            try:
+                models.append(colmap_io.read_model(model_dir))
+            except Exception as e:
+                logger.warning(f"读取子模型失败，跳过 {model_dir}: {e}")
+        if not models:
+            raise RuntimeError("没有可合并的子模型")
+
+        # 以注册图像最多的子模型为基准
+        models.sort(key=lambda m: len(m[1]), reverse=True)
+        anchor = models.pop(0)
+        merged = ({}, {}, {})
+        self._add_model(merged, anchor, 1.0, np.eye(3), np.zeros(3))  # 恒等变换
+        merged_count = 1
+        rejected_count = 0
+
+        # 逐轮合并与当前结果共享帧足够的子模型，直到没有新的可合并模型
+        progress = True
+        while models and progress:
+            progress = False
+            for model in list(models):
+                name_to_merged = {image.name: image for image in merged[1].values()}
+                shared = [image for image in model[1].values() if image.name in name_to_merged]
+                if len(shared) < self.min_shared_images:
+                    continue
+
+                src = np.array([colmap_io.camera_center(image) for image in shared])
+                dst = np.array([colmap_io.camera_center(name_to_merged[image.name]) for image in shared])
+                s, R, t, error = self._estimate_alignment(src, dst)
+                models = [m for m in models if m is not model]
+                if error > self.max_align_error:
+                    logger.warning(f"子模型对齐残差过大({error:.4f})，跳过该子模型")
+                    rejected_count += 1
+                    continue
+
+                new_images, new_points = self._add_model(merged, model, s, R, t)
+                merged_count += 1
+                progress = True
+                logger.info(f"合并子模型：共享帧{len(shared)}，新增图像{new_images}，新增点{new_points}，"
+                            f"尺度{s:.4f}，相对残差{error:.4f}")
+
+        if models:
+            logger.warning(f"{len(models)}个子模型与其他模型共享帧不足，未能合并")
+
+        output_dir = Path(output_dir)
+        # 合并结果只包含cameras/images/points3D，删除旧的rig/frame文件避免不一致
+        for stale in ("rigs.bin", "frames.bin"):
+            if (output_dir / stale).exists():
+                (output_dir / stale).unlink()
+        colmap_io.write_model(*merged, output_dir)
+
+        return {
+            'merged_models': merged_count,
+            'skipped_models': len(models) + rejected_count,
+            'num_cameras': len(merged[0]),
+            'num_images': len(merged[1]),
+            'num_points3D': len(merged[2]),
+        }
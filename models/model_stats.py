@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from config import Config
+from models import colmap_io
+from models.ply_reader import read_ply_header, mmap_vertices, sh_degree
+
+logger = logging.getLogger(__name__)
+
+
+class ModelStats:
+    """
+    模型统计（高斯数、包围盒、不透明度/尺度直方图、球谐阶数、稀疏模型规模）
+    PLY以内存映射分块统计，不整体载入；结果按文件(大小, mtime)缓存在内存和旁路文件中，文件不变时直接返回。
+    """
+
+    CACHE_DIR_NAME = ".artifact_cache"
+    OPACITY_BINS = np.linspace(0.0, 1.0, 21)        # sigmoid后的不透明度
+    SCALE_BINS = np.linspace(-5.0, 2.0, 29)         # log10(最大轴尺度)
+    SAMPLE_SIZE = 200000                            # 计算稳健包围盒的采样点数
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or Config.MODEL_STATS_CHUNK_SIZE
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, ply_path):
+        return ply_path.parent / self.CACHE_DIR_NAME / f"{ply_path.name}.stats.json"
+
+    def _load_cached(self, ply_path, stat):
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._cache.get(ply_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            with open(self._cache_path(ply_path), 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            if (stats['file_size'], stats['mtime_ns']) == key:
+                with self._lock:
+                    self._cache[ply_path] = (key, stats)
+                return stats
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _store(self, ply_path, stats):
+        with self._lock:
+            self._cache[ply_path] = ((stats['file_size'], stats['mtime_ns']), stats)
+        try:
+            cache_path = self._cache_path(ply_path)
+            cache_path.parent.mkdir(exist_ok=True)
+            tmp_path = cache_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"写入模型统计缓存失败 {ply_path}: {e}")
+
+    def compute_ply_stats(self, ply_path):
+        """分块统计PLY（内存占用与分块大小成正比，与模型大小无关）"""
+        ply_path = Path(ply_path)
+        stat = ply_path.stat()
+        header = read_ply_header(ply_path)
+        vertices = mmap_vertices(ply_path, header)
+        names = vertices.dtype.names or ()
+        count = len(vertices)
+
+        bounds_min = np.full(3, np.inf)
+        bounds_max = np.full(3, -np.inf)
+        opacity_hist = np.zeros(len(self.OPACITY_BINS) - 1, dtype=np.int64)
+        scale_hist = np.zeros(len(self.SCALE_BINS) - 1, dtype=np.int64)
+        has_opacity = 'opacity' in names
+        has_scale = 'scale_0' in names
+
+        for start in range(0, count, self.chunk_size):
+            chunk = vertices[start:start + self.chunk_size]
+            xyz = np.stack([chunk['x'], chunk['y'], chunk['z']], axis=1).astype(np.float64)
+            bounds_min = np.minimum(bounds_min, xyz.min(axis=0))
+            bounds_max = np.maximum(bounds_max, xyz.max(axis=0))
+            if has_opacity:
+                opacity = 1 / (1 + np.exp(-chunk['opacity'].astype(np.float64)))
+                opacity_hist += np.histogram(opacity, self.OPACITY_BINS)[0]
+            if has_scale:
+                # PLY中存的是log尺度，取三轴最大值
+                log_scale = np.max(np.stack([chunk['scale_0'], chunk['scale_1'], chunk['scale_2']], axis=1), axis=1)
+                scale_hist += np.histogram(np.clip(log_scale / np.log(10), self.SCALE_BINS[0], self.SCALE_BINS[-1]),
+                                           self.SCALE_BINS)[0]
+
+        stats = {
+            'ply_path': str(ply_path),
+            'file_size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'format': header['format'],
+            'num_gaussians': count,
+            'sh_degree': sh_degree(header),
+            'properties': list(names),
+            'bounds': None,
+            'opacity_histogram': None,
+            'scale_histogram': None,
+        }
+        if count:
+            # 稳健包围盒（1%~99%分位）用等间隔采样估计，排除离群的漂浮高斯
+            sample = vertices[::max(1, count // self.SAMPLE_SIZE)]
+            sample_xyz = np.stack([sample['x'], sample['y'], sample['z']], axis=1).astype(np.float64)
+            stats['bounds'] = {
+                'min': bounds_min.tolist(),
+                'max': bounds_max.tolist(),
+                'p01': np.percentile(sample_xyz, 1, axis=0).tolist(),
+                'p99': np.percentile(sample_xyz, 99, axis=0).tolist(),
+            }
+        if has_opacity:
+            stats['opacity_histogram'] = {'bin_edges': self.OPACITY_BINS.round(3).tolist(),
+                                          'counts': opacity_hist.tolist()}
+        if has_scale:
+            stats['scale_histogram'] = {'log10_bin_edges': self.SCALE_BINS.round(3).tolist(),
+                                        'counts': scale_hist.tolist()}
+        del vertices
+        return stats
+
+    def ply_stats(self, ply_path):
+        """获取PLY统计（命中缓存时不读取顶点数据）"""
+        ply_path = Path(ply_path)
+        stat = ply_path.stat()
+        stats = self._load_cached(ply_path, stat)
+        if stats is None:
+            stats = self.compute_ply_stats(ply_path)
+            self._store(ply_path, stats)
+        return stats
+
+    @staticmethod
+    def sparse_stats(sparse_dir):
+        """稀疏模型的相机/图像/三维点数（只读各文件头部计数）"""
+        sparse_dir = Path(sparse_dir)
+        counts = {}
+        for key, name in (('num_cameras', 'cameras.bin'), ('num_images', 'images.bin'),
+                          ('num_points3D', 'points3D.bin')):
+            path = sparse_dir / name
+            counts[key] = colmap_io.read_entry_count(path) if path.exists() else None
+        return counts
+
+    def get_model_stats(self, username, filename):
+        """
+        汇总场景的模型统计
+        :return: {'model': PLY统计或None, 'sparse': 稀疏模型计数或None}，场景不存在返回None
+        """
+        video_dir = Config.DATA_DIR / username / filename
+        if not video_dir.is_dir():
+            return None
+        ply_path = Config.find_model_ply(username, filename)
+        sparse_dir = Config.sparse_model_dir(video_dir / "colmap")
+        return {
+            'model': self.ply_stats(ply_path) if ply_path is not None else None,
+            'sparse': self.sparse_stats(sparse_dir) if (sparse_dir / "images.bin").exists() else None,
+        }
@@ -0,0 +1,132 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# PLY属性类型 -> numpy dtype字符
+PLY_TYPE_MAP = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8',
+}
+
+
+def read_ply_header(ply_path):
+    """
+    只解析PLY文件头（不读取顶点数据）
+    :param ply_path: PLY文件路径
+    :return: 头信息字典（格式、顶点数、顶点属性、头部字节长度）
+    """
+    ply_path = Path(ply_path)
+    header = {
+        'format': None,
+        'vertex_count': 0,
+        'properties': [],
+        'header_size': 0,
+    }
+
+    with open(ply_path, 'rb') as f:
+        magic = f.readline().strip()
+        if magic != b'ply':
+            raise ValueError(f"不是有效的PLY文件: {ply_path}")
+
+        current_element = None
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"PLY文件头不完整: {ply_path}")
+            tokens = line.decode('ascii', errors='ignore').split()
+            if not tokens:
+                continue
+            if tokens[0] == 'format':
+                header['format'] = tokens[1]
+            elif tokens[0] == 'element':
+                current_element = tokens[1]
+                if current_element == 'vertex':
+                    header['vertex_count'] = int(tokens[2])
+            elif tokens[0] == 'property' and current_element == 'vertex':
+                # 高斯PLY不含list属性，这里只记录标量属性
+                if tokens[1] != 'list':
+                    header['properties'].append((tokens[2], tokens[1]))
+            elif tokens[0] == 'end_header':
+                break
+
+        header['header_size'] = f.tell()
+
+    return header
+
+
+def vertex_dtype(header):
+    """根据PLY头构造顶点的numpy结构化dtype"""
+    if header['format'] == 'binary_little_endian':
+        byte_order = '<'
+    elif header['format'] == 'binary_big_endian':
+        byte_order = '>'
+    else:
+        raise ValueError(f"不支持的PLY格式: {header['format']}（仅支持二进制PLY）")
+    return np.dtype([(name, byte_order + PLY_TYPE_MAP[ply_type]) for name, ply_type in header['properties']])
+
+
+def read_vertices(ply_path):
+    """
+    读取二进制PLY的顶点数据
+    :param ply_path: PLY文件路径
+    :return: numpy结构化数组，字段名即PLY属性名（x, y, z, f_dc_0, opacity, ...）
+    """
+    header = read_ply_header(ply_path)
+    dtype = vertex_dtype(header)
+    return np.fromfile(str(ply_path), dtype=dtype, count=header['vertex_count'], offset=header['header_size'])
+
+
+def mmap_vertices(ply_path, header=None):
+    """
+    以内存映射方式打开二进制PLY的顶点块（只读，按需分页，不整体载入内存）
+    :return: numpy结构化memmap数组
+    """
+    header = header or read_ply_header(ply_path)
+    dtype = vertex_dtype(header)
+    if header['vertex_count'] == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(str(ply_path), dtype=dtype, mode='r', offset=header['header_size'],
+                     shape=(header['vertex_count'],))
+
+
+def sh_degree(header):
+    """由f_rest_*属性个数推算球谐阶数（每个颜色通道(d+1)^2-1个系数），无球谐属性返回None"""
+    names = [name for name, _ in header['properties']]
+    if 'f_dc_0' not in names:
+        return None
+    num_rest = sum(name.startswith('f_rest_') for name in names)
+    return int(round((num_rest / 3 + 1) ** 0.5)) - 1
+
+
+def ply_header_bytes(dtype, vertex_count):
+    """由顶点dtype构造二进制小端PLY文件头"""
+    names = {np.dtype(code).str[1:]: name for name, code in PLY_TYPE_MAP.items()
+             if name in ('char', 'uchar', 'short', 'ushort', 'int', 'uint', 'float', 'double')}
+    lines = ["ply", "format binary_little_endian 1.0", f"element vertex {vertex_count}"]
+    for field in dtype.names:
+        lines.append(f"property {names[dtype[field].str[1:]]} {field}")
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode('ascii')
+
+
+def little_endian_dtype(dtype):
+    """同字段的小端dtype（写出PLY时统一字节序）"""
+    return np.dtype([(field, dtype[field].newbyteorder('<')) for field in dtype.names])
+
+
+def count_gaussians(ply_path):
+    """读取PLY头中的顶点数（即高斯数量），失败返回None"""
+    try:
+        return read_ply_header(ply_path)['vertex_count']
+    except Exception as e:
+        logger.warning(f"读取PLY头失败 {ply_path}: {e}")
+        return None
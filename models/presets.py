@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 可覆盖的参数及其所属阶段
+COLMAP_OPTIONS = ("frame_interval", "max_frames", "matcher", "max_image_size", "sift_num_octaves", "camera_model")
+TRAINING_OPTIONS = ("iterations", "resolution")
+MATCHERS = ("exhaustive", "sequential")
+# gaussian-splatting只能加载无畸变针孔相机的稀疏模型，其他相机模型会在COLMAP阶段跑完后才在训练时失败
+CAMERA_MODELS = ("PINHOLE", "SIMPLE_PINHOLE")
+
+
+def _validate_option(key, value):
+    """校验单个参数，非法时抛出ValueError"""
+    if key == "matcher":
+        if value not in MATCHERS:
+            raise ValueError(f"matcher只能是: {', '.join(MATCHERS)}")
+    elif key == "camera_model":
+        if value not in CAMERA_MODELS:
+            raise ValueError(f"不支持的相机模型: {value}，可选: {', '.join(CAMERA_MODELS)}")
+    elif key == "max_frames":
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 2):
+            raise ValueError("max_frames必须是不小于2的整数或null")
+    elif key == "resolution":
+        if not isinstance(value, int) or isinstance(value, bool) or (value != -1 and value < 1):
+            raise ValueError("resolution必须是-1（自动）或正整数")
+    elif not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"{key}必须是正整数")
+
+
+def validate_options(options, allowed=COLMAP_OPTIONS + TRAINING_OPTIONS):
+    """
+    校验一组可覆盖参数
+    :param allowed: 允许出现的参数名
+    :raises ValueError: 含不允许的参数或参数值非法
+    """
+    for key, value in options.items():
+        if key not in allowed:
+            raise ValueError(f"不支持的参数: {key}，可选: {', '.join(allowed)}")
+        _validate_option(key, value)
+
+
+def resolve_preset(name=None, overrides=None):
+    """
+    解析流水线预设
+    :param name: draft | balanced | quality | custom，默认Config.DEFAULT_PRESET
+    :param overrides: custom预设的覆盖参数（扁平字典，可含base指定基础预设），如{"base": "draft", "iterations": 15000}
+    :return: {'name', 'base', 'colmap': {...}, 'training': {...}}
+    """
+    name = name or Config.DEFAULT_PRESET
+    overrides = dict(overrides or {})
+    if name == "custom":
+        base = overrides.pop("base", Config.DEFAULT_PRESET)
+    elif name in Config.PIPELINE_PRESETS:
+        base = name
+        if overrides:
+            raise ValueError("只有custom预设可以覆盖参数")
+    else:
+        raise ValueError(f"未知预设: {name}，可选: {', '.join(list(Config.PIPELINE_PRESETS) + ['custom'])}")
+    if base not in Config.PIPELINE_PRESETS:
+        raise ValueError(f"未知的基础预设: {base}")
+
+    preset = copy.deepcopy(Config.PIPELINE_PRESETS[base])
+    for key, value in overrides.items():
+        if key in COLMAP_OPTIONS:
+            section = "colmap"
+        elif key in TRAINING_OPTIONS:
+            section = "training"
+        else:
+            raise ValueError(f"不支持的预设参数: {key}")
+        _validate_option(key, value)
+        preset[section][key] = value
+
+    return {"name": name, "base": base, "colmap": preset["colmap"], "training": preset["training"]}
+
+
+def preset_key(preset):
+    """预设的内容指纹（只取影响结果的参数，与预设名无关）"""
+    content = json.dumps({"colmap": preset["colmap"], "training": preset["training"]}, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """文件内容SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    训练结果缓存：同一用户以相同预设参数处理相同视频时直接复用已有模型
+    索引键为(用户, 视频SHA-256, 预设指纹)；命中时还要求视频目录的job.json仍是同一次任务的记录
+    （同名视频以其他预设重新处理会覆盖输出，此时视为失效）。
+    """
+
+    JOB_FILE_NAME = "job.json"
+
+    def __init__(self, index_path=None):
+        self.index_path = Path(index_path or Config.RESULT_CACHE_PATH)
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def cache_key(username, video_sha256, preset):
+        return f"{username}:{video_sha256}:{preset_key(preset)}"
+
+    @classmethod
+    def read_job(cls, video_dir):
+        """读取视频目录下记录的任务信息（预设、缓存键、结果），不存在返回None"""
+        try:
+            with open(Path(video_dir) / cls.JOB_FILE_NAME, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def lookup(self, key):
+        """查找可复用的结果，返回缓存条目或None"""
+        with self._lock:
+            entry = self._load_index().get(key)
+        if not entry:
+            return None
+        job = self.read_job(entry["video_dir"])
+        if not job or job.get("cache_key") != key or not Path(entry["ply_path"]).exists():
+            return None
+        return entry
+
+    def invalidate(self, video_dir):
+        """视频目录即将被新任务覆盖时删除旧的任务记录"""
+        job_path = Path(video_dir) / self.JOB_FILE_NAME
+        if job_path.exists():
+            job_path.unlink()
+
+    @classmethod
+    def write_job(cls, video_dir, preset, result, resources=None, key=None):
+        """
+        记录任务信息（含各阶段资源占用）到job.json，不登记缓存索引
+        :param key: 缓存键；场景已不对应任何一次上传（如扩展场景后）时为None，不会被缓存命中
+        """
+        job = {"cache_key": key, "preset": preset, "result": result, "resources": resources}
+        job_path = Path(video_dir) / cls.JOB_FILE_NAME
+        tmp_path = job_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(job_path)
+
+    def store(self, key, video_dir, preset, result, resources=None):
+        """记录任务信息到job.json，并登记到缓存索引"""
+        video_dir = Path(video_dir)
+        self.write_job(video_dir, preset, result, resources, key)
+
+        with self._lock:
+            index = self._load_index()
+            index[key] = dict(result, video_dir=str(video_dir), preset=preset["name"])
+            self.index_path.parent.mkdir(exist_ok=True, parents=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            tmp_path.replace(self.index_path)
@@ -0,0 +1,183 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _run_attempt(conn, settings, attempt_dir, video_path, frames_dir, extract):
+    """
+    子进程入口：用一组参数变体完成一次完整的单段重建
+    :param extract: 是否按变体的抽帧参数重新抽帧，否则直接链接已有帧
+    """
+    from models.colmap_generator import ColmapGenerator
+    attempt_dir = Path(attempt_dir)
+    try:
+        generator = ColmapGenerator.with_settings(settings)
+        images_dir = attempt_dir / "images"
+        images_dir.mkdir(parents=True)
+        if extract:
+            generator.extract_video_frames(Path(video_path), images_dir)
+        else:
+            for frame in sorted(Path(frames_dir).glob(f"*.{generator.image_ext}")):
+                generator._link_or_copy(frame, images_dir / frame.name)
+        stats = generator.run_sparse_reconstruction(attempt_dir, images_dir, attempt_dir / "sparse")
+        conn.send(dict(stats, success=True))
+    except Exception as e:
+        conn.send({"success": False, "message": str(e)})
+    finally:
+        conn.close()
+
+
+def registered_ratio(stats):
+    """注册图像数占帧数的比例"""
+    if not stats or not stats.get("num_frames"):
+        return 0.0
+    return stats["num_images"] / stats["num_frames"]
+
+
+class ReconstructionStrategy:
+    """
+    重建回退策略：首次单段重建失败或注册比例过低时，并行尝试多组参数变体
+    （更密的抽帧、更高的特征分辨率、放宽匹配/注册阈值），
+    按注册比例选出最好的模型；某个变体已足够好时立即终止其余尝试。
+    """
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.min_ratio = Config.RECONSTRUCTION_MIN_REGISTERED_RATIO
+        self.good_ratio = Config.RECONSTRUCTION_GOOD_RATIO
+        self.max_workers = Config.RECONSTRUCTION_FALLBACK_WORKERS
+
+    def is_weak(self, stats):
+        return registered_ratio(stats) < self.min_ratio
+
+    def variants(self):
+        """
+        把Config中的变体定义展开为完整参数，与首次重建参数相同的变体被跳过
+        变体中以_scale结尾的键表示对原参数按比例缩放
+        :return: [(名称, 参数, 是否需要重新抽帧)]
+        """
+        base = self.generator._settings()
+        variants = []
+        for variant in Config.RECONSTRUCTION_FALLBACK_VARIANTS:
+            settings = dict(base)
+            for key, value in variant.items():
+                if key == "name":
+                    continue
+                if key.endswith("_scale"):
+                    attribute = key[:-len("_scale")]
+                    if settings.get(attribute) is not None:
+                        settings[attribute] = max(1, int(round(settings[attribute] * value)))
+                else:
+                    settings[key] = value
+            if settings == base:
+                continue
+            extract = any(settings.get(key) != base.get(key) for key in ("frame_interval", "max_frames"))
+            variants.append((variant["name"], settings, extract))
+        return variants
+
+    def _install(self, attempt_dir, colmap_dir, frames_dir, sparse_dir, extracted):
+        """把胜出变体的模型（sparse/0，及重新抽取的帧、数据库）移入正式目录"""
+        if sparse_dir.exists():
+            shutil.rmtree(sparse_dir)
+        sparse_dir.mkdir(parents=True)
+        os.replace(Config.sparse_model_dir(attempt_dir), sparse_dir / Config.SPARSE_MODEL_SUBDIR)
+        os.replace(attempt_dir / "database.db", colmap_dir / "database.db")
+        if extracted:
+            shutil.rmtree(frames_dir)
+            os.replace(attempt_dir / "images", frames_dir)
+
+    def run(self, video_path, colmap_dir, frames_dir, sparse_dir, primary_stats=None, primary_error=None):
+        """
+        并行运行参数变体并选出最佳模型（首次重建的结果也参与比较）
+        :return: 最佳模型的重建统计，附带strategy（胜出的变体名）和attempts（各尝试结果）
+        :raises RuntimeError: 所有尝试均失败
+        """
+        colmap_dir, frames_dir, sparse_dir = Path(colmap_dir), Path(frames_dir), Path(sparse_dir)
+        attempts_root = colmap_dir / "attempts"
+        if attempts_root.exists():
+            shutil.rmtree(attempts_root)
+        attempts = [{
+            "name": "primary",
+            "status": "done" if primary_stats else "failed",
+            "registered_ratio": round(registered_ratio(primary_stats), 3),
+            "num_images": primary_stats["num_images"] if primary_stats else 0,
+            "message": primary_error,
+        }]
+        logger.warning(f"首次重建{'失败' if primary_stats is None else '注册比例过低'}"
+                       f"（{attempts[0]['registered_ratio']:.0%}），并行尝试参数变体")
+
+        pending = list(self.variants())
+        workers = max(1, min(self.max_workers, len(pending)))
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        context = multiprocessing.get_context("spawn")
+        running = {}  # 管道 -> (变体名, 进程, 尝试目录, 是否重新抽帧, 记录)
+        best = ("primary", primary_stats, None, False) if primary_stats else None
+        start = time.time()
+        good_enough = False
+        try:
+            while (pending or running) and not good_enough:
+                while pending and len(running) < workers:
+                    name, settings, extract = pending.pop(0)
+                    settings["num_threads"] = num_threads
+                    attempt_dir = attempts_root / name
+                    attempt_dir.mkdir(parents=True)
+                    parent_conn, child_conn = context.Pipe(duplex=False)
+                    process = context.Process(target=_run_attempt, name=f"attempt-{name}",
+                                              args=(child_conn, settings, str(attempt_dir), str(video_path),
+                                                    str(frames_dir), extract))
+                    process.start()
+                    child_conn.close()
+                    record = {"name": name, "status": "running"}
+                    attempts.append(record)
+                    running[parent_conn] = (name, process, attempt_dir, extract, record)
+                    logger.info(f"启动重建变体 {name}")
+
+                for conn in wait(list(running)):
+                    name, process, attempt_dir, extract, record = running.pop(conn)
+                    try:
+                        result = conn.recv()
+                    except EOFError:
+                        result = {"success": False, "message": f"进程异常退出，退出码: {process.exitcode}"}
+                    conn.close()
+                    process.join()
+                    if not result["success"]:
+                        record.update(status="failed", message=result["message"])
+                        logger.warning(f"重建变体 {name} 失败: {result['message']}")
+                        continue
+                    ratio = registered_ratio(result)
+                    record.update(status="done", registered_ratio=round(ratio, 3), num_images=result["num_images"],
+                                  elapsed=round(time.time() - start, 1))
+                    logger.info(f"重建变体 {name} 完成：注册{result['num_images']}/{result['num_frames']}张（{ratio:.0%}）")
+                    if best is None or (ratio, result["num_images"]) > (registered_ratio(best[1]), best[1]["num_images"]):
+                        best = (name, result, attempt_dir, extract)
+                    if ratio >= self.good_ratio:
+                        # 已足够好，不再等待其余尝试
+                        good_enough = True
+                        attempts.extend({"name": skipped, "status": "skipped"} for skipped, _, _ in pending)
+                        break
+        finally:
+            for conn, (name, process, attempt_dir, extract, record) in running.items():
+                process.kill()
+                process.join()
+                conn.close()
+                record["status"] = "cancelled"
+                logger.info(f"终止重建变体 {name}")
+
+        try:
+            if best is None:
+                raise RuntimeError("稀疏重建失败，首次重建及所有参数变体均无有效数据")
+            name, stats, attempt_dir, extract = best
+            if attempt_dir is not None:
+                self._install(attempt_dir, colmap_dir, frames_dir, sparse_dir, extract)
+            logger.info(f"采用重建结果 {name}（注册比例{registered_ratio(stats):.0%}）")
+        finally:
+            shutil.rmtree(attempts_root, ignore_errors=True)
+        return dict(stats, strategy=name, attempts=attempts)
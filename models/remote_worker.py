@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from config import Config
+from models.task_control import TaskControl, TaskCancelled, StageTimeout
+from models.worker_queue import pack_paths, safe_extract, RemotePipeline
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerClient:
+    """工作节点访问Web端阶段任务接口的HTTP客户端（仅用标准库）"""
+
+    def __init__(self, server, token, worker_id, timeout=60):
+        self.server = server.rstrip("/")
+        self.token = token
+        self.worker_id = worker_id
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None, headers=None, params=None):
+        query = urllib.parse.urlencode(dict(params or {}, worker_id=self.worker_id))
+        request = urllib.request.Request(f"{self.server}{path}?{query}", data=data, method=method,
+                                         headers=dict(headers or {}, **{'X-Worker-Token': self.token}))
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def post_json(self, path, payload=None):
+        """POST JSON，返回(状态码, 响应JSON)；4xx不抛异常"""
+        body = json.dumps(dict(payload or {}, worker_id=self.worker_id)).encode("utf-8")
+        try:
+            with self._request("POST", path, body, {'Content-Type': 'application/json'}) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise
+            return e.code, json.load(e)
+
+    def download(self, path, target):
+        """流式下载到文件"""
+        target = Path(target)
+        with self._request("GET", path) as response, open(target, 'wb') as f:
+            shutil.copyfileobj(response, f, Config.WORKER_TRANSFER_CHUNK_SIZE)
+        return target
+
+    def upload(self, path, source):
+        """PUT上传文件原始字节"""
+        source = Path(source)
+        with open(source, 'rb') as f:
+            headers = {'Content-Type': 'application/octet-stream', 'Content-Length': str(source.stat().st_size)}
+            with self._request("PUT", path, f, headers) as response:
+                return json.load(response)
+
+
+class StageWorker:
+    """
+    工作节点：轮询领取阶段任务（colmap / training），拉取输入、在本机运行，上传结果
+    运行期间后台线程定期心跳续约；Web端取消任务或租约丢失时终止当前阶段的进程组。
+    """
+
+    STAGES = ("colmap", "training")
+
+    def __init__(self, client, work_dir, stages=None, gpu_id=None):
+        self.client = client
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(exist_ok=True, parents=True)
+        self.stages = list(stages or self.STAGES)
+        self.gpu_id = gpu_id
+        self._stop = threading.Event()
+
+    @staticmethod
+    def default_worker_id():
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat(self, job, control, done):
+        """心跳线程：取消或租约丢失时请求终止当前阶段"""
+        path = f"/api/worker/jobs/{job['job_id']}/heartbeat"
+        interval = min(Config.WORKER_HEARTBEAT_SECONDS, job['lease_seconds'] / 3)
+        while not done.wait(interval):
+            try:
+                status, data = self.client.post_json(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"心跳失败 {job['job_id']}: {e}")
+                continue
+            if status == 409:
+                logger.warning(f"阶段任务 {job['job_id']} 租约已失效，终止执行")
+                control.cancel()
+                return
+            if data.get('cancel'):
+                logger.info(f"阶段任务 {job['job_id']} 已被取消，终止执行")
+                control.cancel()
+                return
+
+    def _run_colmap(self, job, job_dir, control):
+        payload = job['payload']
+        video_path = job_dir / Path(payload['video_name']).name
+        self.client.download(f"/api/worker/jobs/{job['job_id']}/inputs/video", video_path)
+        from models.colmap_generator import generate_from_video_stage
+        result = control.run_in_subprocess("colmap", generate_from_video_stage, (str(video_path), payload['settings']))
+        if not result.get('success'):
+            return result, None
+        archive = pack_paths(result['colmap_dir'], RemotePipeline.COLMAP_ARCHIVE_NAMES, job_dir / "result.tar")
+        return result, archive
+
+    def _run_training(self, job, job_dir, control):
+        payload = job['payload']
+        archive = self.client.download(f"/api/worker/jobs/{job['job_id']}/inputs/colmap", job_dir / "colmap.tar")
+        colmap_dir = job_dir / "colmap"
+        safe_extract(archive, colmap_dir)
+        archive.unlink()
+        from models.trainer import ModelTrainer
+        output_dir = job_dir / "output"
+        result = ModelTrainer().train(colmap_dir, output_dir, payload['extra_args'], gpu_id=self.gpu_id,
+                                      control=control)
+        if not result.get('success'):
+            return result, None
+        result['ply_relpath'] = str(Path(result['ply_path']).relative_to(output_dir))
+        archive = pack_paths(output_dir, sorted(os.listdir(output_dir)), job_dir / "result.tar")
+        return result, archive
+
+    def run_job(self, job):
+        """执行一个阶段任务并提交结果"""
+        job_id = job['job_id']
+        job_dir = self.work_dir / job_id
+        if job_dir.exists():
+            shutil.rmtree(job_dir)
+        job_dir.mkdir(parents=True)
+        stage = job['stage']
+        control = TaskControl(job_id, {stage: job['payload'].get('timeout')}, workspace=job_dir)
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, control, done), name=f"heartbeat-{job_id}")
+        heartbeat.daemon = True
+        heartbeat.start()
+        logger.info(f"开始执行阶段任务 {job_id}（第{job['attempt']}次）")
+        try:
+            try:
+                runner = self._run_colmap if stage == "colmap" else self._run_training
+                result, archive = runner(job, job_dir, control)
+            except TaskCancelled:
+                raise
+            except StageTimeout as e:
+                result, archive = {'success': False, 'message': f"处理超时: {e}"}, None
+            except Exception as e:
+                # 阶段子进程崩溃（段错误、OOM被杀）、归档损坏等：作为失败结果提交，服务端无需等待租约过期
+                logger.error(f"阶段任务 {job_id} 执行出错: {e}", exc_info=True)
+                result, archive = {'success': False, 'message': f"工作节点执行出错: {type(e).__name__}: {e}"}, None
+            result['resources'] = control.resources_snapshot().get(stage)
+            if archive is not None:
+                self.client.upload(f"/api/worker/jobs/{job_id}/artifact", archive)
+            status, data = self.client.post_json(f"/api/worker/jobs/{job_id}/complete", {'result': result})
+            if status != 200:
+                logger.warning(f"提交阶段任务 {job_id} 结果被拒绝: {data.get('message')}")
+            else:
+                logger.info(f"阶段任务 {job_id} 已提交（成功={result.get('success')}）")
+        except TaskCancelled:
+            logger.info(f"阶段任务 {job_id} 已终止")
+        finally:
+            done.set()
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def run_forever(self):
+        """主循环：领取、执行，无任务时按轮询间隔等待"""
+        logger.info(f"工作节点 {self.client.worker_id} 启动，阶段: {', '.join(self.stages)}，服务端: {self.client.server}")
+        while not self._stop.is_set():
+            try:
+                status, data = self.client.post_json("/api/worker/claim", {'stages': self.stages})
+            except (OSError, ValueError) as e:
+                logger.warning(f"领取任务失败: {e}")
+                self._stop.wait(Config.WORKER_POLL_SECONDS)
+                continue
+            job = data.get('job') if status == 200 else None
+            if job is None:
+                if status != 200:
+                    logger.error(f"领取任务被拒绝: {data.get('message')}")
+                self._stop.wait(Config.WORKER_POLL_SECONDS)
+                continue
+            try:
+                self.run_job(job)
+            except Exception as e:
+                # 网络中断等未能提交结果：服务端租约过期后会重新排队，节点继续领取下一个任务
+                logger.error(f"阶段任务 {job['job_id']} 执行出错: {e}", exc_info=True)
@@ -0,0 +1,235 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def read_process(pid):
+    """
+    读取/proc/<pid>的资源计数，进程已退出或无权限返回None
+    :return: {'ppid', 'session', 'start', 'name', 'utime', 'stime', 'rss', 'read_bytes', 'write_bytes'}
+    """
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # 进程名可能含空格和括号，以最后一个')'分隔
+    name = stat[stat.find("(") + 1:stat.rfind(")")]
+    fields = stat[stat.rfind(")") + 2:].split()
+    info = {
+        'ppid': int(fields[1]),
+        'session': int(fields[3]),
+        'start': int(fields[19]),  # 启动时刻（用于区分复用的pid）
+        'name': name,
+        'utime': int(fields[11]) / CLOCK_TICKS,
+        'stime': int(fields[12]) / CLOCK_TICKS,
+        'rss': int(fields[21]) * PAGE_SIZE,
+        'read_bytes': 0,
+        'write_bytes': 0,
+    }
+    try:
+        with open(f"/proc/{pid}/io", 'r') as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ('read_bytes', 'write_bytes'):
+                    info[key] = int(value)
+    except OSError:
+        pass
+    return info
+
+
+def process_tree(root_pid):
+    """
+    根进程及其全部后代：按父子关系，加上同一会话中已被托管给init的进程
+    （阶段进程都以独立会话启动，会话号即根进程pid）
+    :return: {pid: read_process结果}
+    """
+    processes = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            info = read_process(int(entry))
+            if info is not None:
+                processes[int(entry)] = info
+    children = {}
+    for pid, info in processes.items():
+        children.setdefault(info['ppid'], []).append(pid)
+
+    tree = {pid for pid, info in processes.items() if info['session'] == root_pid}
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in processes:
+            tree.add(pid)
+            stack.extend(child for child in children.get(pid, ()) if child not in tree)
+    return {pid: processes[pid] for pid in tree if pid in processes}
+
+
+def directory_size(path):
+    """目录实际占用的磁盘空间（按分配块计）"""
+    total = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_blocks * 512
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def combine_usage(usages, previous=None):
+    """
+    合并同一阶段多次运行的资源统计（参数扫描、分块训练中并发的训练进程，或先后多次运行）
+    CPU、I/O、采样次数相加；内存取运行中各进程树之和，峰值取历次合计与单次峰值中的最大者；
+    工作目录相同，磁盘占用取最大值
+    :param previous: 该阶段上一次的合并结果（保留并发合计的历史峰值）
+    """
+    usages = list(usages)
+    running = [usage for usage in usages if usage.get('running')]
+    biggest = max(usages, key=lambda usage: usage.get('peak_rss_bytes', 0))
+    rss = sum(usage.get('rss_bytes', 0) for usage in running)
+    combined = {
+        'running': bool(running),
+        'runs': sum(usage.get('runs', 1) for usage in usages),
+        'wall_seconds': max(usage.get('wall_seconds', 0.0) for usage in usages),
+        'samples': sum(usage.get('samples', 0) for usage in usages),
+        'rss_bytes': rss,
+        'peak_rss_bytes': max(rss, biggest.get('peak_rss_bytes', 0)),
+        'peak_rss_process': biggest.get('peak_rss_process'),
+        'peak_processes': max(sum(usage.get('peak_processes', 0) for usage in running),
+                              max(usage.get('peak_processes', 0) for usage in usages)),
+        'cpu_user_seconds': round(sum(usage.get('cpu_user_seconds', 0.0) for usage in usages), 2),
+        'cpu_system_seconds': round(sum(usage.get('cpu_system_seconds', 0.0) for usage in usages), 2),
+        'io_read_bytes': sum(usage.get('io_read_bytes', 0) for usage in usages),
+        'io_write_bytes': sum(usage.get('io_write_bytes', 0) for usage in usages),
+    }
+    for key, pick in (('disk_start_bytes', min), ('disk_bytes', max), ('disk_peak_bytes', max)):
+        values = [usage[key] for usage in usages if usage.get(key) is not None]
+        combined[key] = pick(values) if values else None
+    if previous:
+        if previous.get('peak_rss_bytes', 0) > combined['peak_rss_bytes']:
+            combined['peak_rss_bytes'] = previous['peak_rss_bytes']
+            combined['peak_rss_process'] = previous.get('peak_rss_process')
+        combined['peak_processes'] = max(combined['peak_processes'], previous.get('peak_processes', 0))
+    return combined
+
+
+class ResourceSampler:
+    """
+    阶段资源采样：后台线程定期从/proc读取阶段进程树（含shell启动的训练进程及其子进程）的
+    内存、CPU时间、磁盘I/O，并统计工作目录占用的磁盘空间。
+    CPU和I/O为各进程最后一次采样值之和，采样间隔内退出的进程会少计其最后一个间隔。
+    """
+
+    def __init__(self, root_pid, workspace=None, interval=None, disk_interval=None, on_update=None):
+        self.root_pid = root_pid
+        self.workspace = Path(workspace) if workspace else None
+        self.interval = interval or Config.RESOURCE_SAMPLE_INTERVAL
+        self.disk_interval = disk_interval or Config.RESOURCE_DISK_INTERVAL
+        self.on_update = on_update
+        self._counters = {}  # (pid, 启动时刻) -> 最后一次采样的累计值
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._disk_checked_at = 0
+        self._usage = {
+            'running': True,
+            'wall_seconds': 0.0,
+            'samples': 0,
+            'rss_bytes': 0,
+            'peak_rss_bytes': 0,
+            'peak_rss_process': None,
+            'peak_processes': 0,
+            'cpu_user_seconds': 0.0,
+            'cpu_system_seconds': 0.0,
+            'io_read_bytes': 0,
+            'io_write_bytes': 0,
+            'disk_start_bytes': None,
+            'disk_bytes': None,
+            'disk_peak_bytes': None,
+        }
+
+    def _sample_disk(self):
+        size = directory_size(self.workspace)
+        self._disk_checked_at = time.time()
+        if self._usage['disk_start_bytes'] is None:
+            self._usage['disk_start_bytes'] = size
+        self._usage['disk_bytes'] = size
+        self._usage['disk_peak_bytes'] = max(size, self._usage['disk_peak_bytes'] or 0)
+
+    def sample(self):
+        """采样一次，返回当前统计的副本"""
+        tree = process_tree(self.root_pid)
+        with self._lock:
+            usage = self._usage
+            for pid, info in tree.items():
+                self._counters[(pid, info['start'])] = info
+            counters = self._counters.values()
+            rss = sum(info['rss'] for info in tree.values())
+            usage['rss_bytes'] = rss
+            if rss > usage['peak_rss_bytes']:
+                usage['peak_rss_bytes'] = rss
+                biggest = max(tree.values(), key=lambda info: info['rss'])
+                usage['peak_rss_process'] = biggest['name']
+            usage['peak_processes'] = max(usage['peak_processes'], len(tree))
+            usage['cpu_user_seconds'] = round(sum(info['utime'] for info in counters), 2)
+            usage['cpu_system_seconds'] = round(sum(info['stime'] for info in counters), 2)
+            usage['io_read_bytes'] = sum(info['read_bytes'] for info in counters)
+            usage['io_write_bytes'] = sum(info['write_bytes'] for info in counters)
+            usage['samples'] += 1
+            usage['wall_seconds'] = round(time.time() - self._started_at, 1)
+            if self.workspace is not None and time.time() - self._disk_checked_at >= self.disk_interval:
+                self._sample_disk()
+            snapshot = dict(usage)
+        if self.on_update is not None:
+            self.on_update(snapshot)
+        return snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"资源采样失败（pid {self.root_pid}）: {e}")
+
+    def start(self):
+        self._started_at = time.time()
+        if self.workspace is not None:
+            self._sample_disk()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name=f"resource-sampler-{self.root_pid}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止采样并返回最终统计（进程结束前调用可多采到最后一个间隔）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if self.workspace is not None:
+                self._sample_disk()
+            self._usage['running'] = False
+            self._usage['wall_seconds'] = round(time.time() - self._started_at, 1)
+            snapshot = dict(self._usage)
+        if self.on_update is not None:
+            self.on_update(snapshot)
+        return snapshot
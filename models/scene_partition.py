@@ -0,0 +1,353 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from config import Config
+from models import colmap_io
+from models.ply_reader import (mmap_vertices, read_ply_header, vertex_dtype, ply_header_bytes,
+                               little_endian_dtype)
+from models.trainer import ModelTrainer
+
+logger = logging.getLogger(__name__)
+
+MERGE_CHUNK = 1 << 20  # 合并PLY时每次写出的高斯数
+
+
+def ground_basis(images):
+    """
+    场景地面平面的两个坐标轴：以相机"上"方向的平均值为法向，
+    平面内按相机中心分布的主方向排列（第一轴沿拍摄路线）
+    :return: 2x3矩阵，世界坐标乘以其转置即得平面坐标
+    """
+    # COLMAP相机坐标系y轴朝下，旋转矩阵第二行即相机y轴在世界坐标中的方向
+    ups = np.array([-colmap_io.qvec2rotmat(image.qvec)[1] for image in images])
+    up = ups.mean(axis=0)
+    up /= max(np.linalg.norm(up), 1e-12)
+    centers = np.array([colmap_io.camera_center(image) for image in images])
+    centered = centers - centers.mean(axis=0)
+    in_plane = centered - np.outer(centered @ up, up)
+    if len(images) >= 2 and np.linalg.norm(in_plane) > 1e-12:
+        _, _, Vt = np.linalg.svd(in_plane, full_matrices=False)
+        axis_u = Vt[0]
+    else:
+        axis_u = np.cross(up, [1.0, 0.0, 0.0] if abs(up[0]) < 0.9 else [0.0, 1.0, 0.0])
+    axis_u -= (axis_u @ up) * up
+    axis_u /= np.linalg.norm(axis_u)
+    axis_v = np.cross(up, axis_u)
+    return np.stack([axis_u, axis_v])
+
+
+def inside(xy, bounds):
+    """平面坐标是否落在[lo, hi)范围内（边界可为±inf）"""
+    lo, hi = bounds
+    return np.all((xy >= lo) & (xy < hi), axis=1)
+
+
+class ScenePartitioner:
+    """
+    大场景分块训练：把稀疏模型按地面平面切分为空间分块，每块向外扩展一圈重叠区，
+    为每块写出子数据集（图像链接 + 过滤后的稀疏模型）并发训练，
+    合并时每块只保留落在自身分块（不含重叠区）内的高斯，拼接为一个PLY。
+    """
+
+    def __init__(self, max_images_per_cell=None, overlap=None, max_parallel=None):
+        self.max_images_per_cell = max(1, int(max_images_per_cell or Config.PARTITION_MAX_IMAGES_PER_CELL))
+        self.overlap = Config.PARTITION_OVERLAP if overlap is None else overlap
+        self.visibility_ratio = Config.PARTITION_VISIBILITY_RATIO
+        self.gpu_ids = ModelTrainer.detect_gpus()
+        if max_parallel is None:
+            max_parallel = Config.PARTITION_MAX_PARALLEL
+        # 每个分块独占一块GPU，并发数不超过GPU数量（无GPU时为1）
+        self.max_parallel = max(1, min(int(max_parallel or len(self.gpu_ids)), len(self.gpu_ids) or 1))
+
+    @staticmethod
+    def should_partition(num_images):
+        return Config.PARTITION_ENABLED and num_images >= Config.PARTITION_MIN_IMAGES
+
+    def split(self, camera_xy, point_xy):
+        """
+        递归二分：沿相机分布较长的方向，在稀疏点的中位数处切开（点密的区域分得更细），
+        切分位置限制在相机的25%~75%分位之间，保证两侧都有足够的相机
+        :return: 分块范围列表[(lo, hi)]，最外侧的边界为±inf，各分块互不重叠且覆盖整个平面
+        """
+        cells = []
+        stack = [(np.full(2, -np.inf), np.full(2, np.inf))]
+        while stack:
+            bounds = stack.pop()
+            cameras = camera_xy[inside(camera_xy, bounds)]
+            if len(cameras) <= self.max_images_per_cell:
+                cells.append(bounds)
+                continue
+            axis = int(np.argmax(np.ptp(cameras, axis=0)))
+            points = point_xy[inside(point_xy, bounds)]
+            low, high = np.percentile(cameras[:, axis], [25, 75])
+            value = np.median(points[:, axis]) if len(points) else np.median(cameras[:, axis])
+            value = min(max(value, low), high)
+            if not (cameras[:, axis] < value).any() or not (cameras[:, axis] >= value).any():
+                # 相机位置重合无法再分
+                cells.append(bounds)
+                continue
+            lo, hi = bounds
+            left_hi, right_lo = hi.copy(), lo.copy()
+            left_hi[axis] = right_lo[axis] = value
+            stack.extend([(lo, left_hi), (right_lo, hi)])
+        cells.sort(key=lambda bounds: tuple(np.maximum(bounds[0], -1e300)))
+        return cells
+
+    def expand(self, bounds, camera_xy, point_xy):
+        """按分块内相机和点的实际范围向外扩展重叠区（无穷边界保持不变）"""
+        lo, hi = bounds
+        content = np.vstack([camera_xy[inside(camera_xy, bounds)], point_xy[inside(point_xy, bounds)]])
+        if not len(content):
+            return lo.copy(), hi.copy()
+        extent = np.minimum(content.max(axis=0), hi) - np.maximum(content.min(axis=0), lo)
+        margin = np.maximum(extent, 1e-6) * self.overlap
+        return lo - margin, hi + margin
+
+    def plan(self, sparse_dir):
+        """
+        计算分块方案
+        :return: (模型(cameras, images, points3D), 平面坐标轴, 分块列表)，
+                 分块含core/expanded范围、image_ids、point_ids
+        """
+        cameras, images, points3D = colmap_io.read_model(sparse_dir)
+        if not images:
+            raise ValueError(f"稀疏模型中没有已注册的图像: {sparse_dir}")
+        image_list = list(images.values())
+        basis = ground_basis(image_list)
+        camera_xy = np.array([colmap_io.camera_center(image) for image in image_list]) @ basis.T
+        point_ids = np.array(sorted(points3D), dtype=np.int64)
+        point_xy = (np.array([points3D[pid].xyz for pid in point_ids]).reshape(-1, 3)) @ basis.T
+
+        cells = []
+        for index, core in enumerate(self.split(camera_xy, point_xy)):
+            expanded = self.expand(core, camera_xy, point_xy)
+            point_in_core = inside(point_xy, core)
+            keep_points = inside(point_xy, expanded)
+            keep_images = set()
+            candidates = []
+            for image, in_expanded in zip(image_list, inside(camera_xy, expanded)):
+                if in_expanded:
+                    keep_images.add(image.id)
+                    continue
+                # 从分块外看向分块内的相机：观测点有足够比例落在分块内时加入
+                observed = image.point3D_ids[image.point3D_ids != -1]
+                if len(observed):
+                    positions = np.searchsorted(point_ids, observed)
+                    valid = positions < len(point_ids)
+                    valid[valid] = point_ids[positions[valid]] == observed[valid]
+                    ratio = point_in_core[positions[valid]].sum() / len(observed)
+                    if ratio >= self.visibility_ratio:
+                        candidates.append((ratio, image.id))
+            # 分块图像总数不超过上限（含重叠区），优先加入观测比例高的相机
+            limit = int(np.ceil(self.max_images_per_cell * (1 + 2 * self.overlap)))
+            for _, image_id in sorted(candidates, reverse=True)[:max(0, limit - len(keep_images))]:
+                keep_images.add(image_id)
+            cells.append({
+                'index': index,
+                'core': core,
+                'expanded': expanded,
+                'image_ids': keep_images,
+                'point_ids': set(point_ids[keep_points].tolist()),
+            })
+        return (cameras, images, points3D), basis, cells
+
+    @staticmethod
+    def write_cell(model, cell, images_dir, cell_dir):
+        """写出分块子数据集：images（链接原图）和sparse/0（只含分块内的图像和点）"""
+        cameras, images, points3D = model
+        cell_dir = Path(cell_dir)
+        cell_images_dir = cell_dir / "images"
+        cell_images_dir.mkdir(parents=True)
+        image_ids = cell['image_ids']
+        image_id_array = np.array(sorted(image_ids), dtype=np.int64)
+
+        sub_points = {}
+        for pid in cell['point_ids']:
+            point = points3D[pid]
+            mask = np.isin(point.image_ids, image_id_array)
+            if mask.any():
+                sub_points[pid] = point._replace(image_ids=point.image_ids[mask],
+                                                 point2D_idxs=point.point2D_idxs[mask])
+        point_id_array = np.array(sorted(sub_points), dtype=np.int64)
+        sub_images = {}
+        for image_id in image_ids:
+            image = images[image_id]
+            point3D_ids = image.point3D_ids.copy()
+            point3D_ids[~np.isin(point3D_ids, point_id_array)] = -1
+            sub_images[image_id] = image._replace(point3D_ids=point3D_ids)
+            source = Path(images_dir) / image.name
+            target = cell_images_dir / image.name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.symlink(source.absolute(), target)
+            except OSError:
+                shutil.copy2(source, target)
+        sub_cameras = {image.camera_id: cameras[image.camera_id] for image in sub_images.values()}
+        colmap_io.write_model(sub_cameras, sub_images, sub_points, Config.sparse_model_dir(cell_dir))
+        return len(sub_images), len(sub_points)
+
+    def _train_cell(self, cell, cell_dir, extra_args, gpu_pool, control, task_log):
+        """训练单个分块（在线程池中执行，占用一个GPU槽位）"""
+        gpu_id = gpu_pool.get()
+        try:
+            if control is not None:
+                control.check("training")
+            message = f"分块 {cell['index']} 开始训练：{len(cell['image_ids'])}张图像，GPU: {gpu_id}"
+            logger.info(message)
+            if task_log is not None:
+                task_log.info(message)
+            # 各分块的训练输出写入各自的training.log，避免交错
+            result = ModelTrainer().train(cell_dir, cell_dir / "output", extra_args=extra_args,
+                                          gpu_id=gpu_id, control=control)
+        finally:
+            gpu_pool.put(gpu_id)
+        if task_log is not None:
+            task_log.info(f"分块 {cell['index']} 训练结束: {result['message']}")
+        return result
+
+    @staticmethod
+    def merge(cells, basis, output_path):
+        """
+        合并各分块的PLY：每块只保留平面坐标落在自身分块（不含重叠区）内的高斯
+        以内存映射逐块读取，按块写出，不把全部高斯载入内存
+        :return: 合并后的高斯数
+        """
+        sources = []
+        dtype = None
+        for cell in cells:
+            header = read_ply_header(cell['ply_path'])
+            cell_dtype = vertex_dtype(header)
+            if dtype is None:
+                dtype = cell_dtype
+            elif cell_dtype.names != dtype.names:
+                raise ValueError(f"分块 {cell['index']} 的PLY属性与其他分块不一致（球谐阶数不同？）")
+            vertices = mmap_vertices(cell['ply_path'], header)
+            keep = []
+            for start in range(0, len(vertices), MERGE_CHUNK):
+                chunk = vertices[start:start + MERGE_CHUNK]
+                xyz = np.stack([chunk['x'], chunk['y'], chunk['z']], axis=1).astype(np.float64)
+                keep.append(start + np.flatnonzero(inside(xyz @ basis.T, cell['core'])))
+            keep = np.concatenate(keep) if keep else np.zeros(0, dtype=np.int64)
+            cell['gaussians_total'] = len(vertices)
+            cell['gaussians_kept'] = len(keep)
+            sources.append((vertices, keep))
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        out_dtype = little_endian_dtype(dtype)
+        total = sum(len(keep) for _, keep in sources)
+        tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(ply_header_bytes(out_dtype, total))
+            for vertices, keep in sources:
+                for start in range(0, len(keep), MERGE_CHUNK):
+                    f.write(vertices[keep[start:start + MERGE_CHUNK]].astype(out_dtype).tobytes())
+        os.replace(tmp_path, output_path)
+        return total
+
+    def train(self, colmap_dir, output_dir=None, extra_args=None, task_log=None, control=None):
+        """
+        分块并行训练并合并
+        :param colmap_dir: COLMAP目录（含images和sparse）
+        :param output_dir: 合并模型的输出目录，默认为colmap_dir同级的output
+        :param extra_args: 每个分块的train.py参数
+        :return: 与ModelTrainer.train相同格式的结果，附带cells（各分块统计）
+        """
+        try:
+            start_time = time.time()
+            colmap_dir = Path(colmap_dir).absolute()
+            output_dir = Path(output_dir).absolute() if output_dir else colmap_dir.parent / "output"
+            partition_dir = colmap_dir.parent / "partition"
+            if partition_dir.exists():
+                shutil.rmtree(partition_dir)
+
+            model, basis, cells = self.plan(Config.sparse_model_dir(colmap_dir))
+            for cell in cells:
+                cell['dir'] = partition_dir / f"cell_{cell['index']:02d}"
+                cell['num_images'], cell['num_points'] = self.write_cell(model, cell, colmap_dir / "images",
+                                                                         cell['dir'])
+            logger.info(f"场景切分为{len(cells)}个分块（图像数: {[c['num_images'] for c in cells]}），"
+                        f"并发数{self.max_parallel}")
+            # 没有稀疏点的分块无法初始化高斯，跳过（该区域没有可重建的几何）
+            for cell in cells:
+                if cell['num_points'] == 0:
+                    logger.warning(f"分块 {cell['index']} 没有稀疏点，跳过训练")
+            cells = [cell for cell in cells if cell['num_points']]
+            if not cells:
+                raise ValueError("稀疏模型中没有三维点")
+
+            gpu_pool = queue.Queue()
+            slots = self.gpu_ids or [None]
+            for i in range(self.max_parallel):
+                gpu_pool.put(slots[i % len(slots)])
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                futures = [executor.submit(self._train_cell, cell, cell['dir'], extra_args, gpu_pool, control,
+                                           task_log) for cell in cells]
+                results = [future.result() for future in futures]
+
+            failed = [(cell['index'], result['message']) for cell, result in zip(cells, results)
+                      if not result['success']]
+            if failed:
+                raise RuntimeError(f"{len(failed)}/{len(cells)}个分块训练失败: {failed[0][1]}")
+
+            for cell, result in zip(cells, results):
+                cell['ply_path'] = result['ply_path']
+                cell['psnr'] = result.get('psnr')
+                cell['elapsed_time'] = result.get('elapsed_time')
+            iterations = results[0]['iterations']
+            ply_path = output_dir / "point_cloud" / f"iteration_{iterations}" / "point_cloud.ply"
+            num_gaussians = self.merge(cells, basis, ply_path)
+            # 之前的训练/扩展可能留下迭代数更大的iteration_*目录，find_model_ply会优先选中而遮住合并结果
+            for stale_dir in (output_dir / "point_cloud").glob("iteration_*"):
+                if stale_dir != ply_path.parent:
+                    shutil.rmtree(stale_dir, ignore_errors=True)
+
+            summary = [{
+                'index': cell['index'],
+                'core': [np.asarray(bound).tolist() for bound in cell['core']],
+                'expanded': [np.asarray(bound).tolist() for bound in cell['expanded']],
+                'num_images': cell['num_images'],
+                'num_points': cell['num_points'],
+                'gaussians_total': cell['gaussians_total'],
+                'gaussians_kept': cell['gaussians_kept'],
+                'psnr': cell['psnr'],
+                'elapsed_time': cell['elapsed_time'],
+                'ply_path': cell['ply_path'],
+            } for cell in cells]
+            with open(output_dir / "partition.json", 'w', encoding='utf-8') as f:
+                json.dump({'basis': basis.tolist(), 'cells': summary}, f, ensure_ascii=False, indent=2)
+
+            psnrs = [cell['psnr'] for cell in cells if cell['psnr'] is not None]
+            elapsed_time = time.time() - start_time
+            logger.info(f"分块训练完成：{len(cells)}个分块，合并后{num_gaussians}个高斯，"
+                        f"总耗时{elapsed_time:.2f}秒: {ply_path}")
+            return {
+                'success': True,
+                'partitioned': True,
+                'ply_path': str(ply_path),
+                'output_dir': str(output_dir),
+                'elapsed_time': round(elapsed_time, 2),
+                'iterations': iterations,
+                'psnr': round(float(np.mean(psnrs)), 2) if psnrs else None,
+                'num_gaussians': num_gaussians,
+                'cells': summary,
+                'message': f'分块训练完成（{len(cells)}个分块），耗时{elapsed_time:.2f}秒'
+            }
+
+        except Exception as e:
+            if control is not None:
+                control.check("training")
+            error_msg = f"分块训练失败: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return {
+                'success': False,
+                'message': error_msg,
+            }
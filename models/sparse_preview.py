@@ -0,0 +1,89 @@
+import logging
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from config import Config
+from models import colmap_io
+
+logger = logging.getLogger(__name__)
+
+# 预览文件格式（小端，所有数组按4字节对齐，浏览器可直接用TypedArray读取）:
+#   头部16字节: magic "QSPV" | uint32 版本 | uint32 点数N | uint32 相机数M
+#   float32[N*3]  点坐标
+#   uint8[N*3]    点颜色RGB（补齐到4字节）
+#   float32[M*15] 相机视锥：相机中心 + 4个像平面角点（世界坐标）
+PREVIEW_MAGIC = b"QSPV"
+PREVIEW_VERSION = 1
+
+
+def _pad4(size):
+    return (4 - size % 4) % 4
+
+
+def camera_frustums(cameras, images, depth):
+    """计算每个已注册图像的视锥顶点（中心+4个角点），返回Mx5x3数组"""
+    frustums = []
+    for image in sorted(images.values(), key=lambda im: im.name):
+        camera = cameras[image.camera_id]
+        fx, fy, cx, cy = colmap_io.camera_intrinsics(camera)
+        R = colmap_io.qvec2rotmat(image.qvec)
+        center = colmap_io.camera_center(image)
+        corners = np.array([[0, 0], [camera.width, 0], [camera.width, camera.height], [0, camera.height]],
+                           dtype=np.float64)
+        directions = np.stack([(corners[:, 0] - cx) / fx, (corners[:, 1] - cy) / fy, np.ones(4)], axis=1)
+        corners_world = (directions * depth) @ R + center  # R^T * d + C
+        frustums.append(np.vstack([center, corners_world]))
+    return np.array(frustums, dtype=np.float32).reshape(-1, 5, 3)
+
+
+def export_sparse_preview(sparse_dir, output_path=None, max_points=None):
+    """
+    把稀疏重建导出为紧凑的二进制预览（点、颜色、相机视锥）
+    :param sparse_dir: 稀疏模型目录（cameras.bin / images.bin / points3D.bin）
+    :param output_path: 输出路径，默认sparse_dir/Config.SPARSE_PREVIEW_NAME
+    :param max_points: 最多导出的点数（等间隔抽样）
+    :return: {'path', 'num_points', 'num_cameras', 'size'}
+    """
+    sparse_dir = Path(sparse_dir)
+    output_path = Path(output_path or sparse_dir / Config.SPARSE_PREVIEW_NAME)
+    max_points = max_points or Config.SPARSE_PREVIEW_MAX_POINTS
+    cameras, images, points3D = colmap_io.read_model(sparse_dir)
+
+    if points3D:
+        xyz = np.array([p.xyz for p in points3D.values()], dtype=np.float32)
+        rgb = np.array([p.rgb for p in points3D.values()], dtype=np.uint8)
+    else:
+        xyz = np.zeros((0, 3), dtype=np.float32)
+        rgb = np.zeros((0, 3), dtype=np.uint8)
+    if len(xyz) > max_points:
+        index = np.linspace(0, len(xyz) - 1, max_points).astype(np.int64)
+        xyz, rgb = xyz[index], rgb[index]
+
+    # 视锥深度取场景尺度的一小部分，保证在不同尺度的场景中都清晰可见
+    if len(xyz):
+        radius = np.percentile(np.linalg.norm(xyz - np.median(xyz, axis=0), axis=1), 90)
+    else:
+        radius = 1.0
+    frustums = camera_frustums(cameras, images, depth=max(radius, 1e-6) * 0.05)
+
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(PREVIEW_MAGIC)
+        f.write(struct.pack("<III", PREVIEW_VERSION, len(xyz), len(frustums)))
+        f.write(xyz.astype("<f4").tobytes())
+        f.write(rgb.tobytes())
+        f.write(b"\0" * _pad4(rgb.nbytes))
+        f.write(frustums.astype("<f4").tobytes())
+    os.replace(tmp_path, output_path)
+
+    size = output_path.stat().st_size
+    logger.info(f"稀疏预览导出完成: {output_path}（点数={len(xyz)}, 相机数={len(frustums)}, {size}字节）")
+    return {
+        'path': str(output_path),
+        'num_points': len(xyz),
+        'num_cameras': len(frustums),
+        'size': size,
+    }
@@ -0,0 +1,294 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+from pathlib import Path
+
+import cv2
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MKV_MAGIC = b"\x1a\x45\xdf\xa3"  # EBML头（MKV / WebM）
+MP4_EXTENSIONS = {"mp4", "mov"}
+
+
+def probe_streamable(head, extension):
+    """
+    根据文件开头判断容器能否边接收边解码
+    MKV/WebM按顺序存放索引之外的全部信息；MP4/MOV要求moov（或分片的moof）在mdat之前，
+    moov在文件末尾时解码器必须先跳到末尾读取索引，只能等上传完成。
+    :return: (是否可流式解码, 原因)
+    """
+    extension = extension.lower().lstrip(".")
+    if head.startswith(MKV_MAGIC):
+        return True, "mkv"
+    if extension not in MP4_EXTENSIONS:
+        return False, f"{extension}容器不支持流式解码"
+
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box_type = struct.unpack(">I4s", head[offset:offset + 8])
+        if box_type in (b"moov", b"moof"):
+            return True, "fragmented mp4" if box_type == b"moof" else "moov在前"
+        if box_type == b"mdat":
+            return False, "moov在文件末尾"
+        if size == 1:
+            if offset + 16 > len(head):
+                break
+            size = struct.unpack(">Q", head[offset + 8:offset + 16])[0]
+        if size < 8:
+            break
+        offset += size
+    return False, "文件开头未找到moov"
+
+
+class StreamingIngest:
+    """
+    流式接收上传：请求体边写入磁盘边送入解码器抽帧，上传结束时抽帧也基本完成
+    可流式解码的容器（MKV、moov在前或分片的MP4）由投喂线程从正在增长的文件读取数据写入FIFO，
+    解码线程通过OpenCV从FIFO顺序解码（解码慢时只阻塞投喂线程，不影响接收）；
+    其他容器、解码失败或解码帧数不足时退回上传完成后再抽帧。
+    """
+
+    def __init__(self, video_path, generator, decode=True):
+        """
+        :param video_path: 视频保存路径
+        :param generator: 决定抽帧参数的ColmapGenerator（与后续重建使用的预设一致）
+        :param decode: False时只接收文件（仍计算SHA-256）
+        """
+        self.video_path = Path(video_path)
+        self.generator = generator
+        self.decode = decode and Config.STREAM_INGEST_ENABLED
+        self.frames_dir = self.video_path.parent / ".ingest_frames"
+        self.fifo_path = self.video_path.parent / ".ingest.fifo"
+        self.sha256 = hashlib.sha256()
+        self.bytes_received = 0
+        self.streaming = False
+        self.reason = None
+        self._written = threading.Condition()
+        self._upload_done = False
+        self._aborted = False
+        self._decoder = None
+        self._feeder = None
+        self._decode_error = None
+        self._decoded_frames = 0
+        self._decode_seconds = 0.0
+        self._prepared = None
+        self._finished = False
+        self._finish_lock = threading.Lock()
+
+    @property
+    def digest(self):
+        return self.sha256.hexdigest()
+
+    def _start_streaming(self):
+        for path in (self.frames_dir, self.fifo_path):
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        self.frames_dir.mkdir(parents=True)
+        os.mkfifo(self.fifo_path)
+        self.streaming = True
+        self._decoder = threading.Thread(target=self._decode, name=f"ingest-decode-{self.video_path.parent.name}")
+        self._feeder = threading.Thread(target=self._feed, name=f"ingest-feed-{self.video_path.parent.name}")
+        for thread in (self._decoder, self._feeder):
+            thread.daemon = True
+            thread.start()
+
+    def receive(self, stream, content_length=None, chunk_size=None):
+        """
+        从请求流接收视频：写盘、计算SHA-256，可流式解码时同时抽帧
+        :raises ValueError: 接收的字节数与Content-Length不一致，或未给出Content-Length时达到MAX_CONTENT_LENGTH（可能已被截断）
+        """
+        chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+        self.video_path.parent.mkdir(exist_ok=True, parents=True)
+        head = b""
+        try:
+            with open(self.video_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    self.sha256.update(chunk)
+                    self.bytes_received += len(chunk)
+                    if content_length is None and self.bytes_received >= Config.MAX_CONTENT_LENGTH:
+                        raise ValueError(f"上传超过大小上限（{Config.MAX_CONTENT_LENGTH}字节）")
+                    if self.reason is None:
+                        # 攒够文件头后判断容器能否流式解码，之前的数据稍后由投喂线程从文件读取
+                        head += chunk
+                        if len(head) >= Config.STREAM_INGEST_PROBE_BYTES:
+                            self._probe(head)
+                    f.write(chunk)
+                    f.flush()
+                    with self._written:
+                        self._written.notify_all()
+                if self.reason is None:
+                    self._probe(head)
+        except Exception:
+            self.discard()
+            raise
+        finally:
+            with self._written:
+                self._upload_done = True
+                self._written.notify_all()
+
+        if content_length is not None and self.bytes_received != content_length:
+            self.discard()
+            raise ValueError(f"上传不完整（{self.bytes_received}/{content_length}字节）")
+        logger.info(f"视频接收完成: {self.video_path}（{self.bytes_received}字节，"
+                    f"{'流式抽帧' if self.streaming else '上传后抽帧'}: {self.reason}）")
+
+    def _probe(self, head):
+        streamable, self.reason = probe_streamable(head, self.video_path.suffix)
+        if streamable and self.decode:
+            self._start_streaming()
+
+    def _open_fifo(self):
+        """以非阻塞方式等待解码端打开FIFO（解码线程提前退出时放弃），返回写端fd或None"""
+        while True:
+            try:
+                fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+                os.set_blocking(fd, True)
+                return fd
+            except OSError as e:
+                if e.errno != errno.ENXIO or not self._decoder.is_alive():
+                    return None
+            time.sleep(0.05)
+
+    def _feed(self):
+        """投喂线程：跟随正在写入的视频文件，把新数据写入FIFO，上传结束且读完后关闭"""
+        fd = self._open_fifo()
+        if fd is None:
+            return
+        try:
+            with open(self.video_path, 'rb') as source:
+                upload_done = False
+                while not self._aborted:
+                    data = source.read(Config.UPLOAD_CHUNK_SIZE * 16)
+                    if data:
+                        view = memoryview(data)
+                        while view:
+                            view = view[os.write(fd, view):]
+                        continue
+                    if upload_done:
+                        break
+                    # 读到当前末尾：等待新数据；上传结束后再读一轮到文件末尾
+                    with self._written:
+                        upload_done = self._upload_done
+                        if not upload_done:
+                            self._written.wait(0.5)
+        except BrokenPipeError:
+            # 解码端已放弃（容器无法解码）
+            pass
+        except OSError as e:
+            logger.warning(f"流式投喂中断 {self.video_path}: {e}")
+        finally:
+            os.close(fd)
+
+    def _decode(self):
+        """解码线程：从FIFO顺序解码，按基础抽帧间隔保存帧"""
+        start = time.time()
+        interval = max(1, self.generator.frame_interval)
+        ext = self.generator.image_ext
+        cap = cv2.VideoCapture(str(self.fifo_path), cv2.CAP_FFMPEG)
+        try:
+            if not cap.isOpened():
+                self._decode_error = "解码器无法打开视频流"
+                return
+            frame_count = 0
+            saved_count = 0
+            while not self._aborted:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_count % interval == 0:
+                    cv2.imwrite(str(self.frames_dir / f"frame_{saved_count:06d}.{ext}"), frame,
+                                [cv2.IMWRITE_JPEG_QUALITY, 95])
+                    saved_count += 1
+                frame_count += 1
+            self._decoded_frames = frame_count
+        except Exception as e:
+            self._decode_error = str(e)
+        finally:
+            cap.release()
+            self._decode_seconds = time.time() - start
+
+    def _thin_frames(self):
+        """
+        总帧数在上传结束后才确定：按max_frames换算的实际抽帧间隔，
+        从已按基础间隔保存的帧中等间隔保留，并重新连续编号
+        """
+        base_interval = max(1, self.generator.frame_interval)
+        interval = self.generator.effective_frame_interval(self._decoded_frames)
+        step = -(-interval // base_interval)
+        frames = sorted(self.frames_dir.glob(f"*.{self.generator.image_ext}"))
+        if step > 1:
+            keep = set(frames[::step])
+            for path in frames:
+                if path not in keep:
+                    path.unlink()
+            for index, path in enumerate(sorted(keep)):
+                path.rename(path.with_name(f"frame_{index:06d}{path.suffix}"))
+        return base_interval * step, len(frames[::step])
+
+    def finish(self):
+        """
+        等待流式抽帧结束并校验
+        :return: {'frames_dir', 'num_frames', 'total_frames', 'frame_interval', 'decode_seconds'}，
+                 未流式抽帧或抽帧结果不可用时返回None（由重建阶段重新抽帧）
+        """
+        with self._finish_lock:
+            if self._finished:
+                return self._prepared
+            self._finished = True
+            if not self.streaming:
+                return None
+            self._decoder.join()
+            self._feeder.join()
+            if self.fifo_path.exists():
+                self.fifo_path.unlink()
+
+            message = self._decode_error
+            if message is None and not self._aborted:
+                # 与完整文件的帧数比对，防止流中途解码出错只得到部分帧
+                cap = cv2.VideoCapture(str(self.video_path))
+                expected = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+                cap.release()
+                if self._decoded_frames == 0:
+                    message = "未解码出任何帧"
+                elif expected and self._decoded_frames < expected * Config.STREAM_INGEST_MIN_DECODED_RATIO:
+                    message = f"只解码出{self._decoded_frames}/{expected}帧"
+            elif message is None:
+                message = "已中止"
+            if message is not None:
+                logger.warning(f"流式抽帧不可用，重建时重新抽帧 {self.video_path}: {message}")
+                shutil.rmtree(self.frames_dir, ignore_errors=True)
+                return None
+
+            frame_interval, num_frames = self._thin_frames()
+            self._prepared = {
+                'frames_dir': str(self.frames_dir),
+                'num_frames': num_frames,
+                'total_frames': self._decoded_frames,
+                'frame_interval': frame_interval,
+                'decode_seconds': round(self._decode_seconds, 2),
+            }
+            logger.info(f"流式抽帧完成 {self.video_path}: {self._prepared}")
+            return self._prepared
+
+    def discard(self):
+        """中止解码并删除已抽取的帧（上传失败或直接复用缓存结果时）"""
+        self._aborted = True
+        with self._written:
+            self._upload_done = True
+            self._written.notify_all()
+        if self.streaming:
+            self.finish()
+        shutil.rmtree(self.frames_dir, ignore_errors=True)
@@ -0,0 +1,160 @@
+import itertools
+import json
+import logging
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import Config
+from models.trainer import ModelTrainer
+from models.ply_reader import count_gaussians
+from models.presets import TRAINING_OPTIONS, validate_options
+
+logger = logging.getLogger(__name__)
+
+
+class TrainingSweep:
+    """参数扫描：复用同一份COLMAP稀疏重建结果，并发训练多组train.py参数"""
+
+    def __init__(self, max_parallel=None):
+        self.gpu_ids = ModelTrainer.detect_gpus()
+        # 每个参数组独占一块GPU，并发数不超过GPU数量（无GPU时为1）和SWEEP_MAX_PARALLEL
+        limit = len(self.gpu_ids) or 1
+        if Config.SWEEP_MAX_PARALLEL is not None:
+            limit = min(limit, Config.SWEEP_MAX_PARALLEL)
+        self.max_parallel = max(1, min(int(max_parallel or limit), limit))
+
+    @staticmethod
+    def expand_grid(grid):
+        """
+        把参数网格展开为参数组列表
+        :param grid: {"iterations": [7000, 30000], "resolution": [1, 2]}
+        :return: [{"iterations": 7000, "resolution": 1}, ...]
+        """
+        keys = list(grid.keys())
+        values = [v if isinstance(v, (list, tuple)) else [v] for v in grid.values()]
+        return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+    @classmethod
+    def validate_variants(cls, variants):
+        """
+        校验参数组，只允许预设中可覆盖的训练参数（参数会拼进训练命令行）
+        :param variants: 参数组列表，或参数网格字典（会被展开）
+        :return: 参数组列表
+        :raises ValueError: 参数组为空，或含不支持/非法的参数
+        """
+        if isinstance(variants, dict):
+            variants = cls.expand_grid(variants)
+        if not isinstance(variants, list) or not variants:
+            raise ValueError("参数组为空")
+        for args in variants:
+            if not isinstance(args, dict):
+                raise ValueError("每组参数必须是参数字典")
+            validate_options(args, TRAINING_OPTIONS)
+        return variants
+
+    @staticmethod
+    def variant_name(args):
+        """根据参数生成可读的目录名"""
+        if not args:
+            return "default"
+        parts = [f"{key}-{value}" for key, value in sorted(args.items())]
+        return re.sub(r"[^\w.-]+", "_", "_".join(parts))[:100]
+
+    def _train_variant(self, index, args, colmap_dir, output_root, gpu_pool, control=None):
+        """训练单个参数组（在线程池中执行，占用一个GPU槽位）"""
+        name = self.variant_name(args)
+        output_dir = output_root / f"{index:02d}_{name}"
+        gpu_id = gpu_pool.get()
+        try:
+            if control is not None:
+                control.check("training")
+            logger.info(f"参数扫描 [{index}] 开始训练: {args}，GPU: {gpu_id}，输出: {output_dir}")
+            trainer = ModelTrainer()
+            result = trainer.train(colmap_dir, output_dir, extra_args=args, gpu_id=gpu_id, control=control)
+        finally:
+            gpu_pool.put(gpu_id)
+
+        row = {
+            'index': index,
+            'name': name,
+            'args': args,
+            'success': result['success'],
+            'output_dir': str(output_dir),
+            'elapsed_time': result.get('elapsed_time'),
+            'gaussian_count': None,
+            'ply_size_mb': None,
+            'psnr': result.get('psnr'),
+            'message': result.get('message', ''),
+        }
+        if result['success']:
+            ply_path = Path(result['ply_path'])
+            row['ply_path'] = str(ply_path)
+            row['gaussian_count'] = count_gaussians(ply_path)
+            row['ply_size_mb'] = round(ply_path.stat().st_size / (1024 * 1024), 2)
+        return row
+
+    def run(self, colmap_dir, variants, output_root=None, control=None):
+        """
+        对同一份COLMAP结果并发训练多组参数
+        :param colmap_dir: 已完成的COLMAP目录（含images和sparse）
+        :param variants: 参数组列表，或参数网格字典（会被展开）
+        :param output_root: 扫描结果根目录，默认为colmap_dir同级的sweeps/<时间戳>
+        :param control: TaskControl，取消/超时时终止所有训练进程并抛出异常
+        :return: 结果字典，table为每组参数的对比结果
+        """
+        try:
+            colmap_dir = Path(colmap_dir).absolute()
+            if not (Config.sparse_model_dir(colmap_dir) / "images.bin").exists():
+                raise ValueError(f"COLMAP稀疏重建结果不存在: {Config.sparse_model_dir(colmap_dir)}")
+
+            variants = self.validate_variants(variants)
+
+            if output_root is None:
+                output_root = colmap_dir.parent / "sweeps" / time.strftime("%Y%m%d_%H%M%S")
+            output_root = Path(output_root).absolute()
+            output_root.mkdir(exist_ok=True, parents=True)
+
+            # GPU槽位池：有GPU时每个训练独占一块，无GPU时不指定
+            gpu_pool = queue.Queue()
+            slots = self.gpu_ids or [None]
+            for i in range(self.max_parallel):
+                gpu_pool.put(slots[i % len(slots)])
+
+            logger.info(f"开始参数扫描：{len(variants)}组参数，并发数{self.max_parallel}，输出: {output_root}")
+            start_time = time.time()
+
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                futures = [
+                    executor.submit(self._train_variant, index, dict(args), colmap_dir, output_root, gpu_pool, control)
+                    for index, args in enumerate(variants)
+                ]
+                table = [future.result() for future in futures]
+
+            elapsed_time = time.time() - start_time
+            summary = {
+                'colmap_dir': str(colmap_dir),
+                'output_root': str(output_root),
+                'elapsed_time': round(elapsed_time, 2),
+                'table': table,
+            }
+            with open(output_root / "sweep_results.json", 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+
+            succeeded = sum(1 for row in table if row['success'])
+            logger.info(f"参数扫描完成：成功{succeeded}/{len(table)}组，总耗时{elapsed_time:.2f}秒")
+
+            return dict(summary, success=True,
+                        message=f'参数扫描完成：成功{succeeded}/{len(table)}组，耗时{elapsed_time:.2f}秒')
+
+        except Exception as e:
+            if control is not None:
+                control.check("training")
+            error_msg = f"参数扫描失败: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            return {
+                'success': False,
+                'message': error_msg,
+            }
@@ -0,0 +1,207 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from config import Config
+from models.resource_monitor import ResourceSampler, combine_usage
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    """任务被用户取消"""
+
+
+class StageTimeout(Exception):
+    """阶段运行超出时限"""
+
+
+def _stage_entry(conn, target, args):
+    """子进程入口：自成进程组（连同其派生的子进程可被一次性杀掉），结果通过管道返回"""
+    os.setsid()
+    try:
+        conn.send(target(*args))
+    except Exception as e:
+        conn.send({'success': False, 'message': f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+class TaskControl:
+    """
+    单个任务的取消、超时控制与资源统计
+    每个阶段运行在独立的进程组中，取消或超时时终止整个进程组（包括CUDA训练进程、COLMAP子进程），
+    调度器槽位随任务函数返回立即释放；阶段运行期间采样其进程树的资源占用，记录在resources中。
+    """
+
+    def __init__(self, task_id, timeouts=None, workspace=None):
+        """
+        :param workspace: 任务工作目录，用于统计各阶段的磁盘占用
+        """
+        self.task_id = task_id
+        self.timeouts = dict(Config.STAGE_TIMEOUTS, **(timeouts or {}))
+        self.kill_grace = Config.STAGE_KILL_GRACE
+        self.cancel_event = threading.Event()
+        self.timed_out_stage = None
+        self.workspace = workspace
+        self.resources = {}  # 阶段 -> 资源统计（运行中由采样线程实时更新，读取用resources_snapshot）
+        self._runs = {}  # 阶段 -> {运行编号: 单次运行的资源统计}，同一阶段并发或先后多次运行时合并为resources[阶段]
+        self._run_ids = itertools.count(1)
+        self._resources_lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """请求取消：监视循环在0.5秒内终止当前阶段的进程组"""
+        self.cancel_event.set()
+        logger.info(f"任务 {self.task_id} 已请求取消")
+
+    def check(self, stage=None):
+        """阶段间检查：已取消或已超时则抛出对应异常"""
+        if self.cancelled:
+            raise TaskCancelled(f"任务 {self.task_id} 已取消")
+        if self.timed_out_stage is not None:
+            raise StageTimeout(f"{self.timed_out_stage}阶段超时（{self.timeouts.get(self.timed_out_stage)}秒）")
+
+    def kill_process_group(self, pid):
+        """先SIGTERM整个进程组，宽限期后仍存活则SIGKILL"""
+        try:
+            pgid = os.getpgid(pid)
+        except ProcessLookupError:
+            return
+        if pgid == os.getpgid(0):
+            # 子进程尚未建立自己的进程组，不能误杀服务进程
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            return
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+
+        deadline = time.time() + self.kill_grace
+        while time.time() < deadline:
+            try:
+                os.killpg(pgid, 0)
+            except ProcessLookupError:
+                return
+            time.sleep(0.2)
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+            logger.warning(f"进程组 {pgid} 未响应SIGTERM，已强制结束")
+        except ProcessLookupError:
+            pass
+
+    def _deadline(self, stage):
+        timeout = self.timeouts.get(stage)
+        return time.time() + timeout if timeout else None
+
+    def _on_timeout(self, stage, pid):
+        self.timed_out_stage = stage
+        logger.error(f"任务 {self.task_id} 的{stage}阶段超时，终止进程组")
+        self.kill_process_group(pid)
+
+    def record_resources(self, stage, usage, run=None):
+        """
+        记录阶段一次运行的资源统计（采样线程、远程节点结果）
+        :param run: 运行编号，同一阶段的多次运行（参数扫描的各变体、各分块的训练）分别记录后合并
+        """
+        with self._resources_lock:
+            runs = self._runs.setdefault(stage, {})
+            runs[run] = usage
+            self.resources[stage] = combine_usage(runs.values(), self.resources.get(stage))
+
+    def resources_snapshot(self):
+        """各阶段资源统计的副本（加锁拷贝，序列化时不会被采样线程修改）"""
+        with self._resources_lock:
+            return {stage: dict(usage) for stage, usage in self.resources.items()}
+
+    def _start_sampler(self, stage, pid):
+        run = next(self._run_ids)
+
+        def on_update(usage):
+            self.record_resources(stage, usage, run)
+        return ResourceSampler(pid, self.workspace, on_update=on_update).start()
+
+    def _stop_sampler(self, stage, sampler):
+        usage = sampler.stop()
+        logger.info(f"任务 {self.task_id} 的{stage}阶段资源: 峰值内存{usage['peak_rss_bytes'] / 2 ** 20:.0f}MB"
+                    f"（{usage['peak_rss_process']}），CPU {usage['cpu_user_seconds'] + usage['cpu_system_seconds']:.1f}秒，"
+                    f"读{usage['io_read_bytes'] / 2 ** 20:.0f}MB/写{usage['io_write_bytes'] / 2 ** 20:.0f}MB")
+
+    def run_in_subprocess(self, stage, target, args=()):
+        """
+        在独立子进程（新进程组）中运行阶段函数，支持取消和超时
+        :param target: 模块级函数（spawn方式启动，需可pickle）
+        :return: target的返回值
+        """
+        self.check(stage)
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(target=_stage_entry, args=(child_conn, target, args),
+                                  name=f"{stage}-{self.task_id}")
+        process.start()
+        child_conn.close()
+        deadline = self._deadline(stage)
+        sampler = self._start_sampler(stage, process.pid)
+
+        result = None
+        try:
+            while True:
+                if parent_conn.poll(0.5):
+                    try:
+                        result = parent_conn.recv()
+                    except EOFError:
+                        result = None
+                    break
+                if not process.is_alive():
+                    result = parent_conn.recv() if parent_conn.poll() else None
+                    break
+                if self.cancelled:
+                    self.kill_process_group(process.pid)
+                    break
+                if deadline is not None and time.time() > deadline:
+                    self._on_timeout(stage, process.pid)
+                    break
+            process.join(self.kill_grace)
+        finally:
+            parent_conn.close()
+            self._stop_sampler(stage, sampler)
+
+        self.check(stage)
+        if result is None:
+            raise RuntimeError(f"{stage}阶段子进程异常退出，退出码: {process.exitcode}")
+        return result
+
+    def watch_process(self, stage, process):
+        """
+        监视已用start_new_session=True启动的Popen进程，取消或超时时终止其进程组，并采样其资源占用
+        :return: 监视线程（进程结束、资源统计定稿后退出）
+        """
+        deadline = self._deadline(stage)
+        sampler = self._start_sampler(stage, process.pid)
+
+        def watch():
+            try:
+                while process.poll() is None:
+                    if self.cancel_event.wait(0.5):
+                        self.kill_process_group(process.pid)
+                        return
+                    if deadline is not None and time.time() > deadline:
+                        self._on_timeout(stage, process.pid)
+                        return
+            finally:
+                self._stop_sampler(stage, sampler)
+
+        watcher = threading.Thread(target=watch, name=f"{stage}-watch-{self.task_id}")
+        watcher.daemon = True
+        watcher.start()
+        return watcher
@@ -0,0 +1,173 @@
+import gzip
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    """轮转时把旧日志压缩为.gz"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class _LogPathFilter(logging.Filter):
+    """给记录附加目标文件路径，供监听线程分发"""
+
+    def __init__(self, log_path):
+        super().__init__()
+        self.log_path = str(log_path)
+
+    def filter(self, record):
+        record.log_path = self.log_path
+        return True
+
+
+class _RoutingHandler(logging.Handler):
+    """后台监听线程中把记录分发到对应任务的文件handler"""
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+
+    def handle(self, record):
+        self.manager._dispatch(record)
+        return True
+
+
+class TaskLogManager:
+    """
+    按任务/查看器分文件的异步日志
+    调用线程只把记录放入内存队列，由后台QueueListener写入各自的轮转日志文件（旧文件gzip压缩），
+    训练输出等高频日志不再进入app.log，也不阻塞训练监控线程。
+    """
+
+    def __init__(self):
+        self.max_bytes = Config.TASK_LOG_MAX_BYTES
+        self.backup_count = Config.TASK_LOG_BACKUP_COUNT
+        self._queue = queue.Queue(-1)
+        self._handlers = {}   # logger名 -> 文件handler（仅监听线程访问）
+        self._loggers = {}    # 日志路径 -> logger
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        # 监听线程在第一次获取logger时启动（只导入本模块的阶段子进程不启动）
+        self._listener = None
+
+    def _create_file_handler(self, log_path):
+        log_path.parent.mkdir(exist_ok=True, parents=True)
+        handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8')
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        return handler
+
+    def _dispatch(self, record):
+        """监听线程：按logger名写入文件，收到关闭标记时关闭文件"""
+        if getattr(record, 'close_log', False):
+            handler = self._handlers.pop(record.name, None)
+            if handler:
+                handler.close()
+            return
+        handler = self._handlers.get(record.name)
+        if handler is None:
+            handler = self._create_file_handler(Path(record.log_path))
+            self._handlers[record.name] = handler
+        try:
+            handler.handle(record)
+        except Exception:
+            handler.handleError(record)
+
+    def get_logger(self, log_path):
+        """获取写入指定文件的异步logger（同一路径复用同一个logger）"""
+        log_path = Path(log_path).absolute()
+        with self._lock:
+            if self._listener is None:
+                self._listener = logging.handlers.QueueListener(self._queue, _RoutingHandler(self))
+                self._listener.start()
+            task_logger = self._loggers.get(log_path)
+            if task_logger is None:
+                task_logger = logging.getLogger(f"qs_task_log.{next(self._ids)}")
+                task_logger.setLevel(logging.INFO)
+                task_logger.propagate = False  # 不写入app.log
+                queue_handler = logging.handlers.QueueHandler(self._queue)
+                queue_handler.addFilter(_LogPathFilter(log_path))
+                task_logger.addHandler(queue_handler)
+                self._loggers[log_path] = task_logger
+        return task_logger
+
+    def close(self, log_path):
+        """关闭日志文件（排在已入队的记录之后执行）"""
+        log_path = Path(log_path).absolute()
+        with self._lock:
+            task_logger = self._loggers.pop(log_path, None)
+        if task_logger is None:
+            return
+        record = task_logger.makeRecord(task_logger.name, logging.INFO, "", 0, "", (), None,
+                                        extra={'close_log': True})
+        task_logger.handle(record)
+        for handler in list(task_logger.handlers):
+            task_logger.removeHandler(handler)
+
+    @staticmethod
+    def read(log_path, offset=0, unit="bytes", limit=None):
+        """
+        从偏移量读取日志，供前端低成本增量拉取
+        :param offset: 字节偏移（unit=bytes）或行号（unit=lines）
+        :param limit: 最多返回的字节数/行数，限制在1到TASK_LOG_READ_MAX_BYTES/LINES之间
+        :return: {'text', 'offset', 'next_offset', 'size', 'rotated'}
+        :raises ValueError: 偏移量为负
+        """
+        if offset < 0:
+            raise ValueError("offset不能为负")
+        log_path = Path(log_path)
+        size = log_path.stat().st_size if log_path.exists() else 0
+        rotated = False
+
+        if unit == "lines":
+            limit = min(max(1, limit or Config.TASK_LOG_READ_MAX_LINES), Config.TASK_LOG_READ_MAX_LINES)
+            lines = []
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in itertools.islice(f, offset, offset + limit):
+                    lines.append(line)
+            return {
+                'text': "".join(lines),
+                'offset': offset,
+                'next_offset': offset + len(lines),
+                'size': size,
+                'rotated': rotated,
+            }
+
+        limit = min(max(1, limit or Config.TASK_LOG_READ_MAX_BYTES), Config.TASK_LOG_READ_MAX_BYTES)
+        if offset > size:
+            # 文件已轮转，从新文件开头读取
+            offset, rotated = 0, True
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(limit)
+        # 只返回完整的行，剩余部分下次读取
+        if offset + len(data) < size and b"\n" in data:
+            data = data[:data.rindex(b"\n") + 1]
+        return {
+            'text': data.decode('utf-8', errors='replace'),
+            'offset': offset,
+            'next_offset': offset + len(data),
+            'size': size,
+            'rotated': rotated,
+        }
+
+
+task_log_manager = TaskLogManager()
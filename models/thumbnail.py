@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import Config
+from models import colmap_io
+from models.ply_reader import read_vertices
+
+logger = logging.getLogger(__name__)
+
+SH_C0 = 0.28209479177387814  # 0阶球谐系数
+
+
+class ThumbnailRenderer:
+    """CPU缩略图渲染：用NumPy把高斯中心（或稀疏点云）按训练相机投影成小图，不启动查看器"""
+
+    def __init__(self, width=None, max_points=None):
+        self.width = width or Config.THUMBNAIL_WIDTH
+        self.max_points = max_points or Config.THUMBNAIL_MAX_POINTS
+        self.background = np.array([255, 255, 255], dtype=np.float32)  # 白色背景（RGB）
+        self.min_opacity = 0.2  # 透明度低于该值的高斯不参与渲染
+
+    def _load_gaussians(self, ply_path):
+        """读取高斯中心、颜色（0阶球谐）和不透明度"""
+        vertices = read_vertices(ply_path)
+        names = vertices.dtype.names
+        xyz = np.stack([vertices['x'], vertices['y'], vertices['z']], axis=1).astype(np.float32)
+
+        if 'f_dc_0' in names:
+            dc = np.stack([vertices['f_dc_0'], vertices['f_dc_1'], vertices['f_dc_2']], axis=1)
+            rgb = np.clip(0.5 + SH_C0 * dc, 0, 1) * 255
+        elif 'red' in names:
+            rgb = np.stack([vertices['red'], vertices['green'], vertices['blue']], axis=1)
+        else:
+            rgb = np.full((len(vertices), 3), 128)
+
+        if 'opacity' in names:
+            opacity = 1 / (1 + np.exp(-vertices['opacity'].astype(np.float32)))
+        else:
+            opacity = np.ones(len(vertices), dtype=np.float32)
+
+        keep = opacity >= self.min_opacity
+        return xyz[keep], rgb[keep].astype(np.float32), opacity[keep]
+
+    @staticmethod
+    def _load_sparse_points(sparse_dir):
+        """读取稀疏点云的坐标和颜色"""
+        points3D = colmap_io.read_points3D_binary(Path(sparse_dir) / "points3D.bin")
+        if not points3D:
+            return np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32), np.zeros(0, np.float32)
+        xyz = np.array([p.xyz for p in points3D.values()], dtype=np.float32)
+        rgb = np.array([p.rgb for p in points3D.values()], dtype=np.float32)
+        return xyz, rgb, np.ones(len(xyz), dtype=np.float32)
+
+    @staticmethod
+    def _camera_from_json(cameras_json):
+        """从gaussian-splatting输出的cameras.json取中间一个训练相机"""
+        with open(cameras_json, 'r', encoding='utf-8') as f:
+            cameras = json.load(f)
+        if not cameras:
+            return None
+        camera = sorted(cameras, key=lambda c: c.get('img_name', ''))[len(cameras) // 2]
+        R_c2w = np.array(camera['rotation'], dtype=np.float64)
+        return {
+            'R': R_c2w.T,  # 世界 -> 相机
+            'center': np.array(camera['position'], dtype=np.float64),
+            'fx': camera['fx'], 'fy': camera['fy'],
+            'cx': camera['width'] / 2, 'cy': camera['height'] / 2,
+            'width': camera['width'], 'height': camera['height'],
+        }
+
+    @staticmethod
+    def _camera_from_sparse(sparse_dir):
+        """从COLMAP稀疏模型取中间一个已注册图像的相机"""
+        sparse_dir = Path(sparse_dir)
+        cameras = colmap_io.read_cameras_binary(sparse_dir / "cameras.bin")
+        images = colmap_io.read_images_binary(sparse_dir / "images.bin")
+        if not images:
+            return None
+        image = sorted(images.values(), key=lambda im: im.name)[len(images) // 2]
+        camera = cameras[image.camera_id]
+        fx, fy, cx, cy = colmap_io.camera_intrinsics(camera)
+        return {
+            'R': colmap_io.qvec2rotmat(image.qvec),
+            'center': colmap_io.camera_center(image),
+            'fx': fx, 'fy': fy, 'cx': cx, 'cy': cy,
+            'width': camera.width, 'height': camera.height,
+        }
+
+    @staticmethod
+    def _default_camera(xyz):
+        """没有训练相机时，沿点云最短主轴方向俯视整个点云"""
+        center = np.median(xyz, axis=0)
+        centered = xyz - center
+        _, _, Vt = np.linalg.svd(centered[::max(1, len(xyz) // 10000)], full_matrices=False)
+        forward, right = Vt[2], Vt[0]
+        down = np.cross(forward, right)
+        radius = np.percentile(np.linalg.norm(centered, axis=1), 90)
+        width, height = 400, 300
+        focal = width  # 约53度水平视场
+        return {
+            'R': np.stack([right, down, forward]),
+            'center': center - forward * radius * 2.5,
+            'fx': focal, 'fy': focal, 'cx': width / 2, 'cy': height / 2,
+            'width': width, 'height': height,
+        }
+
+    def render(self, xyz, rgb, opacity, camera, point_size=1):
+        """
+        向量化投影渲染（每个像素取最近的点，按不透明度与背景混合）
+        :return: HxWx3 RGB uint8图像
+        """
+        scale = self.width / camera['width']
+        width = self.width
+        height = max(1, int(round(camera['height'] * scale)))
+        image = np.empty((height, width, 3), dtype=np.float32)
+        image[:] = self.background
+
+        if len(xyz) > self.max_points:
+            index = np.linspace(0, len(xyz) - 1, self.max_points).astype(np.int64)
+            xyz, rgb, opacity = xyz[index], rgb[index], opacity[index]
+
+        cam = (xyz - camera['center']) @ camera['R'].T
+        z = cam[:, 2]
+        front = z > 1e-3
+        cam, z, rgb, opacity = cam[front], z[front], rgb[front], opacity[front]
+        u = np.floor((camera['fx'] * cam[:, 0] / z + camera['cx']) * scale).astype(np.int64)
+        v = np.floor((camera['fy'] * cam[:, 1] / z + camera['cy']) * scale).astype(np.int64)
+
+        # 点尺寸大于1时按方块展开
+        if point_size > 1:
+            offsets = np.arange(point_size) - point_size // 2
+            du, dv = np.meshgrid(offsets, offsets)
+            u = (u[:, None] + du.ravel()).ravel()
+            v = (v[:, None] + dv.ravel()).ravel()
+            repeat = point_size * point_size
+            z, rgb, opacity = np.repeat(z, repeat), np.repeat(rgb, repeat, axis=0), np.repeat(opacity, repeat)
+
+        inside = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        pixel = v[inside] * width + u[inside]
+        z, rgb, opacity = z[inside], rgb[inside], opacity[inside]
+        if len(pixel):
+            # 深度缓冲：按(像素, 深度)排序，取每个像素最近的点
+            order = np.lexsort((z, pixel))
+            unique_pixel, first = np.unique(pixel[order], return_index=True)
+            nearest = order[first]
+            alpha = opacity[nearest][:, None]
+            flat = image.reshape(-1, 3)
+            flat[unique_pixel] = alpha * rgb[nearest] + (1 - alpha) * self.background
+
+        return np.clip(image, 0, 255).astype(np.uint8)
+
+    def render_to_file(self, output_path, ply_path=None, sparse_dir=None):
+        """渲染缩略图并写入文件，优先使用高斯模型，其次稀疏点云"""
+        camera = None
+        if ply_path is not None:
+            cameras_json = Path(ply_path).parents[2] / "cameras.json"
+            if cameras_json.exists():
+                camera = self._camera_from_json(cameras_json)
+        if camera is None and sparse_dir is not None:
+            camera = self._camera_from_sparse(sparse_dir)
+
+        if ply_path is not None:
+            xyz, rgb, opacity = self._load_gaussians(ply_path)
+            point_size = 1
+        else:
+            xyz, rgb, opacity = self._load_sparse_points(sparse_dir)
+            point_size = 3  # 稀疏点较少，放大显示
+        if not len(xyz):
+            raise ValueError("没有可渲染的点")
+        if camera is None:
+            camera = self._default_camera(xyz)
+
+        image = self.render(xyz, rgb, opacity, camera, point_size)
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(f".{output_path.stem}.tmp{output_path.suffix}")
+        cv2.imwrite(str(tmp_path), cv2.cvtColor(image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 85])
+        os.replace(tmp_path, output_path)
+        return output_path
+
+    def get_thumbnail(self, username, filename):
+        """
+        获取（必要时生成）模型缩略图，缓存在PLY旁边；PLY更新后自动重新生成
+        尚未训练完成时使用稀疏点云生成预览，缓存在稀疏模型目录（sparse/0）
+        :return: 缩略图路径，无可用数据时返回None
+        """
+        ply_path = Config.find_model_ply(username, filename)
+        sparse_dir = Config.sparse_model_dir(Config.DATA_DIR / username / filename / "colmap")
+        has_sparse = (sparse_dir / "points3D.bin").exists()
+
+        if ply_path is not None:
+            source, output_path = ply_path, ply_path.with_name(Config.THUMBNAIL_NAME)
+        elif has_sparse:
+            source, output_path = sparse_dir / "points3D.bin", sparse_dir / Config.THUMBNAIL_NAME
+        else:
+            return None
+
+        if output_path.exists() and output_path.stat().st_mtime >= source.stat().st_mtime:
+            return output_path
+
+        try:
+            self.render_to_file(output_path, ply_path=ply_path, sparse_dir=sparse_dir if has_sparse else None)
+            logger.info(f"生成缩略图: {output_path}")
+            return output_path
+        except Exception as e:
+            logger.error(f"生成缩略图失败 {source}: {str(e)}")
+            return None
@@ -5,12 +5,21 @@ from pathlib import Path
 import logging
 import time
 import os
+import re
+import shlex
 
 # 导入你的Config配置（确保Config里包含修正后的conda和环境配置）
 from config import Config
+from models.task_logger import task_log_manager
+from models.task_control import TaskCancelled, StageTimeout
 
 logger = logging.getLogger(__name__)
 
+# train.py评估输出格式: "[ITER 30000] Evaluating test: L1 0.0123 PSNR 27.45"
+PSNR_PATTERN = re.compile(r"\[ITER (\d+)\] Evaluating (\w+): L1 ([\d.eE+-]+) PSNR ([\d.eE+-]+)")
+# train.py保存的检查点: chkpnt30000.pth
+CHECKPOINT_PATTERN = re.compile(r"chkpnt(\d+)\.pth$")
+
 class ModelTrainer:
     """高斯溅射模型训练器（适配conda虚拟环境+环境变量）"""
     
@@ -31,12 +40,105 @@ class ModelTrainer:
         activate_cmd = f"source {self.conda_base}/etc/profile.d/conda.sh && conda activate {self.gs_env}"
         # 3. 切换到项目目录
         cd_cmd = f"cd {self.gs_repo_path}"
-        # 4. 拼接最终命令（用&&保证前一步成功才执行后一步）
-        full_cmd = " && ".join(env_commands + [activate_cmd, cd_cmd] + [" ".join(cmd_list)])
+        # 4. 拼接最终命令（用&&保证前一步成功才执行后一步；每个参数都转义，避免被shell解析）
+        full_cmd = " && ".join(env_commands + [activate_cmd, cd_cmd] + [" ".join(shlex.quote(arg) for arg in cmd_list)])
         return full_cmd
 
-    def train(self, colmap_path, output_dir=None):
-        """训练高斯溅射模型（适配conda环境+环境变量）"""
+    @staticmethod
+    def detect_gpus():
+        """检测可用GPU编号列表（优先CUDA_VISIBLE_DEVICES，其次nvidia-smi）"""
+        visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+        if visible is not None:
+            return [gpu.strip() for gpu in visible.split(",") if gpu.strip()]
+        try:
+            result = subprocess.run(
+                ["nvidia-smi", "--query-gpu=index", "--format=csv,noheader"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=10
+            )
+            if result.returncode == 0:
+                return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+        except Exception as e:
+            logger.warning(f"检测GPU失败: {e}")
+        return []
+
+    @staticmethod
+    def _format_extra_args(extra_args):
+        """把参数字典转换为train.py命令行参数（True -> 开关参数，列表 -> 多值参数）"""
+        cmd = []
+        for key, value in (extra_args or {}).items():
+            flag = f"--{key}"
+            if value is True:
+                cmd.append(flag)
+            elif value is False or value is None:
+                continue
+            elif isinstance(value, (list, tuple)):
+                cmd.append(flag)
+                cmd.extend(str(v) for v in value)
+            else:
+                cmd.extend([flag, str(value)])
+        return cmd
+
+    @staticmethod
+    def parse_psnr(training_log):
+        """从训练日志中解析最后一次测试集评估的PSNR（无测试集时退回训练集）"""
+        psnr = {}
+        for line in training_log:
+            match = PSNR_PATTERN.search(line)
+            if match:
+                psnr[match.group(2)] = float(match.group(4))
+        return psnr.get("test", psnr.get("train"))
+
+    @staticmethod
+    def find_checkpoint(output_dir):
+        """
+        查找输出目录中迭代数最大的检查点
+        :return: (检查点路径, 迭代数)，没有时为(None, 0)
+        """
+        checkpoints = []
+        for path in Path(output_dir).glob("chkpnt*.pth"):
+            match = CHECKPOINT_PATTERN.search(path.name)
+            if match:
+                checkpoints.append((int(match.group(1)), path))
+        if not checkpoints:
+            return None, 0
+        iteration, path = max(checkpoints)
+        return path, iteration
+
+    def fine_tune(self, colmap_path, output_dir=None, iterations=None, extra_args=None, **kwargs):
+        """
+        从已有模型的检查点继续训练（场景新增图像后微调）
+        没有检查点时（旧任务未保存）退化为从头训练
+        :param iterations: 在检查点基础上追加的迭代数，默认Config.EXTEND_TRAINING_ITERATIONS
+        """
+        colmap_path = Path(colmap_path).absolute()
+        if output_dir is None:
+            output_dir = colmap_path.parent / "output"
+        extra_args = dict(extra_args or {})
+        checkpoint, checkpoint_iteration = self.find_checkpoint(output_dir)
+        if checkpoint is not None:
+            extra_args["start_checkpoint"] = str(checkpoint)
+            extra_args["iterations"] = checkpoint_iteration + (iterations or Config.EXTEND_TRAINING_ITERATIONS)
+            logger.info(f"从检查点继续训练: {checkpoint}（{checkpoint_iteration} -> {extra_args['iterations']}迭代）")
+        else:
+            logger.warning(f"输出目录没有检查点，从头训练: {output_dir}")
+        result = self.train(colmap_path, output_dir, extra_args, **kwargs)
+        if result.get('success'):
+            result['resumed_from'] = checkpoint_iteration if checkpoint is not None else None
+        return result
+
+    def train(self, colmap_path, output_dir=None, extra_args=None, gpu_id=None, task_log=None, control=None):
+        """
+        训练高斯溅射模型（适配conda环境+环境变量）
+        :param colmap_path: COLMAP数据目录（含images和sparse）
+        :param output_dir: 模型输出目录，默认为colmap_path同级的output
+        :param extra_args: 额外的train.py参数字典，如{"iterations": 7000, "densify_until_iter": 5000}
+        :param gpu_id: 指定使用的GPU编号（设置CUDA_VISIBLE_DEVICES）
+        :param task_log: 任务日志logger（训练输出写入其中），默认写入输出目录的training.log
+        :param control: TaskControl，支持取消和超时（终止训练进程组），取消/超时时抛出异常
+        """
         try:
             # 校验输入路径
             colmap_path = Path(colmap_path).absolute()
@@ -47,7 +149,7 @@ class ModelTrainer:
             if output_dir is None:
                 output_dir = colmap_path.parent / "output"
             output_dir = Path(output_dir).absolute()
-            output_dir.mkdir(exist_ok=True)
+            output_dir.mkdir(exist_ok=True, parents=True)
             
             # 检查训练脚本是否存在
             if not self.train_script or not self.train_script.exists():
@@ -56,14 +158,28 @@ class ModelTrainer:
                     'message': f'训练脚本不存在: {self.train_script}'
                 }
             
+            # 额外参数可覆盖迭代数
+            extra_args = dict(extra_args or {})
+            train_iterations = int(extra_args.pop("iterations", self.train_iterations))
+            # 保证最后一次迭代做测试集评估，用于输出最终PSNR
+            extra_args.setdefault("test_iterations", [train_iterations])
+            # 保存最终检查点，之后扩展场景时可以接着训练
+            if Config.GAUSSIAN_SAVE_CHECKPOINT:
+                extra_args.setdefault("checkpoint_iterations", [train_iterations])
+            
             # 构建基础训练命令（仅python+参数，无环境激活）
             base_train_cmd = [
                 "python", str(self.train_script),  # 用虚拟环境内的python，而非sys.executable
                 '-s', str(colmap_path),
                 '-m', str(output_dir),
-                '--iterations', str(self.train_iterations),
+                '--iterations', str(train_iterations),
                 '--eval'
-            ]
+            ] + self._format_extra_args(extra_args)
+            
+            # 指定GPU
+            env = os.environ.copy()
+            if gpu_id is not None:
+                env["CUDA_VISIBLE_DEVICES"] = str(gpu_id)
             
             # 构建带conda激活和环境变量的完整命令
             full_train_cmd = self._build_conda_command(base_train_cmd)
@@ -79,27 +195,41 @@ class ModelTrainer:
                 bufsize=1,
                 universal_newlines=True,
                 cwd=self.gs_repo_path,  # 工作目录设为高斯溅射项目根目录
-                env=os.environ.copy()  # 继承当前环境变量
+                env=env,  # 继承当前环境变量（可能指定了GPU）
+                start_new_session=True  # 独立进程组，取消时连同CUDA子进程一起终止
             )
+            watcher = control.watch_process("training", process) if control is not None else None
             
-            # 实时监控训练输出
+            # 实时监控训练输出（异步写入任务日志，不进入app.log）
+            own_log_path = None
+            if task_log is None:
+                own_log_path = output_dir / "training.log"
+                task_log = task_log_manager.get_logger(own_log_path)
             training_log = []
             start_time = time.time()
             logger.info(f"训练启动，输出目录: {output_dir}")
             
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-                if output:
-                    output_strip = output.strip()
-                    training_log.append(output_strip)
-                    logger.info(f"训练日志 [{time.strftime('%H:%M:%S')}]: {output_strip}")
+            try:
+                while True:
+                    output = process.stdout.readline()
+                    if output == '' and process.poll() is not None:
+                        break
+                    if output:
+                        output_strip = output.strip()
+                        training_log.append(output_strip)
+                        task_log.info(output_strip)
+            finally:
+                if own_log_path is not None:
+                    task_log_manager.close(own_log_path)
             
             # 等待进程结束并获取返回码
             return_code = process.wait()
             elapsed_time = time.time() - start_time
             logger.info(f"训练进程结束，返回码: {return_code}，耗时: {elapsed_time:.2f}秒")
+            if control is not None:
+                # 等待监视线程完成资源统计
+                watcher.join()
+                control.check("training")
             
             # 检查训练是否成功
             if return_code != 0:
@@ -110,7 +240,7 @@ class ModelTrainer:
             # 查找生成的PLY文件（适配30000迭代数的默认路径）
             ply_path = None
             # 优先找指定迭代数的路径
-            target_iter_dir = output_dir / "point_cloud" / f"iteration_{self.train_iterations}"
+            target_iter_dir = output_dir / "point_cloud" / f"iteration_{train_iterations}"
             target_ply = target_iter_dir / "point_cloud.ply"
             if target_ply.exists():
                 ply_path = target_ply
@@ -119,7 +249,7 @@ class ModelTrainer:
                 fallback_ply = output_dir / "point_cloud" / "iteration_7000" / "point_cloud.ply"
                 if fallback_ply.exists():
                     ply_path = fallback_ply
-                    logger.warning(f"未找到{self.train_iterations}迭代的PLY，使用7000迭代版本: {ply_path}")
+                    logger.warning(f"未找到{train_iterations}迭代的PLY，使用7000迭代版本: {ply_path}")
                 else:
                     # 全局查找所有PLY文件
                     ply_files = list(output_dir.glob("**/*.ply"))
@@ -143,9 +273,13 @@ class ModelTrainer:
                 'output_dir': str(output_dir.absolute()),
                 'log': training_log[-10:],  # 返回最后10行日志
                 'elapsed_time': round(elapsed_time, 2),
-                'message': f'模型训练完成（{self.train_iterations}迭代），耗时{elapsed_time:.2f}秒'
+                'iterations': train_iterations,
+                'psnr': self.parse_psnr(training_log),
+                'message': f'模型训练完成（{train_iterations}迭代），耗时{elapsed_time:.2f}秒'
             }
             
+        except (TaskCancelled, StageTimeout):
+            raise
         except Exception as e:
             error_msg = f"训练失败: {str(e)}"
             logger.error(error_msg, exc_info=True)
@@ -1,6 +1,7 @@
 import os
 import shutil
 import sys
+import time
 import uuid
 from pathlib import Path
 from werkzeug.utils import secure_filename
@@ -24,23 +25,37 @@ class UploadHandler:
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
     
+    def prepare_video_path(self, username, filename):
+        """
+        确定视频的保存位置（不写入文件），流式接收时由调用方自行写入
+        :raises ValueError: 不支持的文件类型
+        """
+        if not self.allowed_file(filename):
+            raise ValueError(f"不支持的文件类型，允许的类型: {self.allowed_extensions}")
+        
+        # 安全文件名
+        original_filename = secure_filename(filename)
+        filename_without_ext = Path(original_filename).stem
+        extension = Path(original_filename).suffix
+        
+        # 创建用户目录
+        user_dir = Config.get_user_dir(username)
+        video_dir = user_dir / filename_without_ext
+        video_dir.mkdir(exist_ok=True, parents=True)
+        
+        return {
+            'success': True,
+            'video_path': str(video_dir / f"input{extension}"),
+            'video_dir': str(video_dir),
+            'filename': filename_without_ext,
+            'original_filename': original_filename
+        }
+    
     def save_video(self, username, file):
         """保存视频文件"""
         try:
-            if not self.allowed_file(file.filename):
-                raise ValueError(f"不支持的文件类型，允许的类型: {self.allowed_extensions}")
-            
-            # 安全文件名
-            original_filename = secure_filename(file.filename)
-            filename_without_ext = Path(original_filename).stem
-            extension = Path(original_filename).suffix
-            
-            # 创建用户目录
-            user_dir = Config.get_user_dir(username)
-            video_dir = user_dir / filename_without_ext
-            video_dir.mkdir(exist_ok=True, parents=True)
-            
-            video_path = video_dir / f"input{extension}"
+            video_info = self.prepare_video_path(username, file.filename)
+            video_path = video_info['video_path']
            
            # 4. 核心修复：Flask文件读取（关键！重置指针 + 正确保存）
             # 重置文件指针（避免中间件/前置操作读取过文件，导致指针到末尾）
@@ -50,16 +65,44 @@ class UploadHandler:
             
             logger.info(f"视频文件保存到: {video_path}")
             
+            return video_info
+            
+        except Exception as e:
+            logger.error(f"保存视频失败: {str(e)}")
+            return {
+                'success': False,
+                'message': str(e)
+            }
+    
+    def save_extension_video(self, username, filename, file):
+        """保存用于扩展已有场景的新视频（存放在场景目录的extensions子目录）"""
+        try:
+            if not self.allowed_file(file.filename):
+                raise ValueError(f"不支持的文件类型，允许的类型: {self.allowed_extensions}")
+            
+            video_dir = Config.get_user_dir(username) / secure_filename(filename)
+            if not video_dir.exists():
+                raise FileNotFoundError(f"场景不存在: {filename}")
+            
+            extension_dir = video_dir / "extensions"
+            extension_dir.mkdir(exist_ok=True)
+            original_filename = secure_filename(file.filename)
+            video_path = extension_dir / f"{int(time.time())}_{original_filename}"
+            
+            file.seek(0)
+            file.save(str(video_path))
+            logger.info(f"扩展视频保存到: {video_path}")
+            
             return {
                 'success': True,
                 'video_path': str(video_path),
                 'video_dir': str(video_dir),
-                'filename': filename_without_ext,
+                'filename': video_dir.name,
                 'original_filename': original_filename
             }
             
         except Exception as e:
-            logger.error(f"保存视频失败: {str(e)}")
+            logger.error(f"保存扩展视频失败: {str(e)}")
             return {
                 'success': False,
                 'message': str(e)
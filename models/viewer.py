@@ -6,8 +6,11 @@ from pathlib import Path
 import logging
 import signal
 import os
+import shlex
+from collections import deque
 
 from config import Config
+from models.task_logger import task_log_manager
 
 logger = logging.getLogger(__name__)
 
@@ -23,26 +26,26 @@ class ViewerManager:
         self.web_3dgs_exports = Config.WEB_3DGS_EXPORTS  # 环境变量配置
         
         self.viewer_process = None
+        self.monitor_thread = None
         self.current_port = Config.VIEWER_PORT if hasattr(Config, 'VIEWER_PORT') else 8080
         self.host = Config.HOST if hasattr(Config, 'HOST') else "0.0.0.0"
         self.is_running = False
-        self.viewer_log = []  # 存储查看器日志
+        self.viewer_log = deque(maxlen=100)  # 最近的查看器日志（完整日志写入独立的轮转文件）
+        self.log_path = Config.VIEWER_LOG_DIR / f"viewer_{self.current_port}.log"
     
     def _build_conda_command(self, cmd_list):
-        """构建带conda激活+环境变量的完整bash命令（后台运行）"""
+        """构建带conda激活+环境变量的完整bash命令（exec替换shell，输出由管道读取）"""
         # 1. 拼接环境变量export命令（值用单引号包裹避免解析错误）
         env_commands = [f"export {k}='{v}'" for k, v in self.web_3dgs_exports.items()]
         # 2. Conda激活命令（系统级conda）
         activate_cmd = f"source {self.conda_base}/etc/profile.d/conda.sh && conda activate {self.web_3dgs_env}"
         # 3. 切换到web-3dgs项目目录
         cd_cmd = f"cd {self.web_3dgs_repo_path}"
-        # 4. 拼接基础命令 + 后台运行（nohup+&，避免进程阻塞）
-        # 日志输出到项目目录的viser.log，方便排查
-        base_cmd = " ".join(cmd_list)
-        nohup_cmd = f"nohup {base_cmd} > viser.log 2>&1 &"
+        # 4. exec启动查看器，使Popen的PID即查看器进程；输出经管道写入查看器日志
+        exec_cmd = "exec " + " ".join(shlex.quote(arg) for arg in cmd_list)
         
         # 组合完整命令（&& 保证前一步成功才执行后一步）
-        full_cmd = " && ".join(env_commands + [activate_cmd, cd_cmd, nohup_cmd])
+        full_cmd = " && ".join(env_commands + [activate_cmd, cd_cmd, exec_cmd])
         return full_cmd
     
     def _get_pid_by_port(self, port):
@@ -101,15 +104,25 @@ class ViewerManager:
             logger.info(f"启动3D查看器（conda环境）: {full_viewer_cmd}")
             
             # 5. 执行启动命令（shell=True执行bash命令）
-            # 后台运行，不阻塞主线程
-            subprocess.run(
+            # 独立会话后台运行，不阻塞主线程
+            self.viewer_process = subprocess.Popen(
                 full_viewer_cmd,
                 shell=True,
                 cwd=self.web_3dgs_repo_path,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                start_new_session=True
+            )
+            
+            # 日志读取线程：阻塞读取管道，无需轮询日志文件
+            self.monitor_thread = threading.Thread(
+                target=self._monitor_viewer_log,
+                args=(self.viewer_process,)
             )
+            self.monitor_thread.daemon = True
+            self.monitor_thread.start()
             
             # 6. 等待查看器启动（延长等待时间，确保服务加载完成）
             start_timeout = 10
@@ -120,22 +133,13 @@ class ViewerManager:
             while time.time() - start_time < start_timeout:
                 port_pids = self._get_pid_by_port(self.current_port)
                 if port_pids:
-                    self.viewer_process = port_pids[0]  # 记录主进程PID
-                    logger.info(f"端口{self.current_port}已监听，查看器启动成功（PID: {self.viewer_process}）")
+                    logger.info(f"端口{self.current_port}已监听，查看器启动成功（PID: {self.viewer_process.pid}）")
                     break
                 time.sleep(1)
             else:
                 raise TimeoutError(f"查看器启动超时（{start_timeout}秒），端口{self.current_port}未监听")
             
-            # 7. 启动日志监控线程
-            monitor_thread = threading.Thread(
-                target=self._monitor_viewer_log,
-                args=(self.web_3dgs_repo_path / "viser.log",)
-            )
-            monitor_thread.daemon = True
-            monitor_thread.start()
-            
-            # 8. 构造访问URL
+            # 7. 构造访问URL
             viewer_url = f"http://{self.host}:{self.current_port}"
             logger.info(f"查看器启动成功，访问地址: {viewer_url}")
             
@@ -155,6 +159,10 @@ class ViewerManager:
             if self.viewer_process and isinstance(self.viewer_process, subprocess.Popen):
                 self.viewer_process.terminate()
                 self.viewer_process.wait(timeout=5)
+            # 等待日志线程读完剩余输出并关闭日志文件
+            if self.monitor_thread is not None:
+                self.monitor_thread.join(timeout=5)
+                self.monitor_thread = None
             
             # 2. 根据端口终止残留进程
             port_pids = self._get_pid_by_port(self.current_port)
@@ -180,27 +188,19 @@ class ViewerManager:
         except Exception as e:
             logger.error(f"停止查看器失败: {str(e)}")
     
-    def _monitor_viewer_log(self, log_file):
-        """监控查看器的nohup日志文件"""
+    def _monitor_viewer_log(self, process):
+        """读取查看器输出管道（阻塞读取，进程退出即结束），写入查看器的异步日志"""
+        viewer_logger = task_log_manager.get_logger(self.log_path)
         try:
-            if not log_file.exists():
-                # 创建空日志文件
-                log_file.touch()
-            
-            # 实时读取日志（类似tail -f）
-            with open(log_file, 'r', encoding='utf-8') as f:
-                f.seek(0, 2)  # 移动到文件末尾
-                while self.is_running:
-                    line = f.readline()
-                    if line:
-                        line_strip = line.strip()
-                        self.viewer_log.append(line_strip)
-                        logger.debug(f"查看器日志: {line_strip}")
-                    else:
-                        time.sleep(0.5)
+            for line in process.stdout:
+                line_strip = line.strip()
+                self.viewer_log.append(line_strip)
+                viewer_logger.info(line_strip)
         except Exception as e:
             if self.is_running:  # 运行中报错才记录
                 logger.error(f"监控查看器日志失败: {str(e)}")
+        finally:
+            task_log_manager.close(self.log_path)
     
     def get_status(self):
         """获取查看器状态（增强版）"""
@@ -212,8 +212,9 @@ class ViewerManager:
             'is_running': self.is_running,
             'port': self.current_port if self.is_running else None,
             'url': f"http://{self.host}:{self.current_port}" if self.is_running else None,
-            'pid': self.viewer_process if self.is_running else None,
-            'last_logs': self.viewer_log[-10:] if self.viewer_log else []  # 返回最后10行日志
+            'pid': self.viewer_process.pid if self.is_running and self.viewer_process else None,
+            'log_path': str(self.log_path),
+            'last_logs': list(self.viewer_log)[-10:]  # 返回最后10行日志
         }
     
     def __del__(self):
@@ -0,0 +1,365 @@
+import collections
+import copy
+import itertools
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+from config import Config
+from models.task_control import TaskCancelled
+
+logger = logging.getLogger(__name__)
+
+
+def pack_paths(base_dir, names, archive_path):
+    """把base_dir下的若干文件/目录打包为tar（不压缩，图像和PLY本身压缩率很低）"""
+    base_dir = Path(base_dir)
+    archive_path = Path(archive_path)
+    archive_path.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = archive_path.with_name(f".{archive_path.name}.tmp")
+    with tarfile.open(tmp_path, "w") as tar:
+        for name in names:
+            path = base_dir / name
+            if path.exists():
+                tar.add(str(path), arcname=name)
+    os.replace(tmp_path, archive_path)
+    return archive_path
+
+
+def safe_extract(archive_path, dest_dir):
+    """解压tar，拒绝绝对路径、上级目录、链接和设备文件等成员"""
+    dest_dir = Path(dest_dir).absolute()
+    dest_dir.mkdir(exist_ok=True, parents=True)
+    with tarfile.open(archive_path, "r") as tar:
+        members = tar.getmembers()
+        for member in members:
+            target = (dest_dir / member.name).resolve()
+            if not (member.isfile() or member.isdir()):
+                raise ValueError(f"不允许的归档成员类型: {member.name}")
+            if target != dest_dir.resolve() and dest_dir.resolve() not in target.parents:
+                raise ValueError(f"归档成员路径越界: {member.name}")
+        tar.extractall(str(dest_dir), members=members)
+
+
+class WorkQueue:
+    """
+    远程工作节点的阶段任务队列（服务端）
+    Web端发布阶段任务，worker.py节点通过HTTP领取（租约）、定期心跳续约、上传结果；
+    租约过期未续约的任务重新排队（超过最大尝试次数则失败），取消的任务在下次心跳时通知节点终止。
+    """
+
+    def __init__(self, lease_seconds=None, max_attempts=None):
+        self.lease_seconds = lease_seconds or Config.WORKER_LEASE_SECONDS
+        self.max_attempts = max_attempts or Config.WORKER_MAX_ATTEMPTS
+        self._jobs = {}
+        self._pending = collections.deque()
+        self._condition = threading.Condition()
+        self._ids = itertools.count(1)
+
+    def _public(self, job):
+        """发给工作节点的任务描述（不含服务端路径）"""
+        return {
+            'job_id': job['job_id'],
+            'task_id': job['task_id'],
+            'stage': job['stage'],
+            'payload': copy.deepcopy(job['payload']),
+            'inputs': sorted(job['inputs']),
+            'attempt': job['attempts'],
+            'lease_seconds': self.lease_seconds,
+        }
+
+    def publish(self, task_id, stage, payload, inputs=None, spool_dir=None):
+        """
+        发布阶段任务
+        :param payload: 发给节点的参数（JSON可序列化）
+        :param inputs: {输入名: 服务端文件路径}，节点通过HTTP拉取
+        :param spool_dir: 节点上传结果归档的存放目录
+        :return: job_id
+        """
+        job_id = f"{task_id}-{stage}-{next(self._ids)}"
+        now = time.time()
+        job = {
+            'job_id': job_id,
+            'task_id': task_id,
+            'stage': stage,
+            'payload': payload,
+            'inputs': {name: str(path) for name, path in (inputs or {}).items()},
+            'spool_dir': str(spool_dir) if spool_dir else None,
+            'status': 'pending',
+            'worker_id': None,
+            'lease_expires': None,
+            'attempts': 0,
+            'result': None,
+            'artifact_path': None,
+            'message': '',
+            'created_at': now,
+            'updated_at': now,
+        }
+        with self._condition:
+            self._jobs[job_id] = job
+            self._pending.append(job_id)
+            self._condition.notify_all()
+        logger.info(f"发布阶段任务 {job_id}")
+        return job_id
+
+    def _expire_leases(self):
+        """租约过期的任务重新排队（调用方需持有锁）"""
+        now = time.time()
+        for job in list(self._jobs.values()):
+            if job['status'] not in ('leased', 'cancelled') or job['lease_expires'] > now:
+                continue
+            if job['status'] == 'cancelled':
+                # 节点已失联，无需再通知终止
+                self._jobs.pop(job['job_id'])
+                continue
+            logger.warning(f"阶段任务 {job['job_id']} 租约过期（节点 {job['worker_id']}）")
+            job['worker_id'] = None
+            job['updated_at'] = now
+            if job['attempts'] >= self.max_attempts:
+                job['status'] = 'failed'
+                job['message'] = f"工作节点失联，已尝试{job['attempts']}次"
+            else:
+                job['status'] = 'pending'
+                self._pending.appendleft(job['job_id'])
+            self._condition.notify_all()
+
+    def claim(self, worker_id, stages=None):
+        """工作节点领取一个任务，没有可领取的任务返回None"""
+        with self._condition:
+            self._expire_leases()
+            for job_id in list(self._pending):
+                job = self._jobs[job_id]
+                if stages and job['stage'] not in stages:
+                    continue
+                self._pending.remove(job_id)
+                job.update({
+                    'status': 'leased',
+                    'worker_id': worker_id,
+                    'lease_expires': time.time() + self.lease_seconds,
+                    'attempts': job['attempts'] + 1,
+                    'updated_at': time.time(),
+                })
+                logger.info(f"节点 {worker_id} 领取阶段任务 {job_id}（第{job['attempts']}次）")
+                return self._public(job)
+        return None
+
+    def _leased_job(self, job_id, worker_id):
+        """返回该节点持有租约的任务，租约已失效返回None（调用方需持有锁）"""
+        job = self._jobs.get(job_id)
+        if job is None or job['worker_id'] != worker_id or job['status'] not in ('leased', 'cancelled'):
+            return None
+        return job
+
+    def heartbeat(self, job_id, worker_id, message=None):
+        """
+        续约
+        :return: {'cancel': 是否应终止}，租约已失效返回None
+        """
+        with self._condition:
+            self._expire_leases()
+            job = self._leased_job(job_id, worker_id)
+            if job is None:
+                return None
+            if job['status'] == 'cancelled':
+                self._jobs.pop(job_id)
+                return {'cancel': True}
+            job['lease_expires'] = time.time() + self.lease_seconds
+            job['updated_at'] = time.time()
+            if message:
+                job['message'] = message
+            return {'cancel': False}
+
+    def input_path(self, job_id, worker_id, name):
+        """节点拉取输入文件的服务端路径，无权访问返回None"""
+        with self._condition:
+            job = self._leased_job(job_id, worker_id)
+            if job is None:
+                return None
+            return job['inputs'].get(name)
+
+    def artifact_target(self, job_id, worker_id):
+        """节点上传结果归档的目标路径，无权访问返回None"""
+        with self._condition:
+            job = self._leased_job(job_id, worker_id)
+            if job is None or not job['spool_dir']:
+                return None
+            return Path(job['spool_dir']) / f"{job_id}.tar"
+
+    def complete(self, job_id, worker_id, result, artifact_path=None):
+        """节点提交结果，租约已失效返回False"""
+        with self._condition:
+            job = self._leased_job(job_id, worker_id)
+            if job is None or job['status'] != 'leased':
+                return False
+            job.update({
+                'status': 'done' if result.get('success') else 'failed',
+                'result': result,
+                'artifact_path': str(artifact_path) if artifact_path else None,
+                'message': result.get('message', ''),
+                'updated_at': time.time(),
+            })
+            self._condition.notify_all()
+        logger.info(f"阶段任务 {job_id} 完成（节点 {worker_id}，成功={result.get('success')}）")
+        return True
+
+    def cancel(self, job_id):
+        """取消任务：未领取的直接移除，已领取的在下次心跳时通知节点终止"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in ('done', 'failed', 'cancelled'):
+                return
+            if job['status'] == 'pending':
+                self._pending.remove(job_id)
+                self._jobs.pop(job_id)
+                return
+            job['status'] = 'cancelled'
+            job['updated_at'] = time.time()
+            self._condition.notify_all()
+
+    def wait(self, job_id, control=None):
+        """
+        等待阶段任务结束
+        :param control: TaskControl，任务被取消时同时取消阶段任务并抛出TaskCancelled；
+            超过该阶段的时限（加上等待节点领取的宽限）时取消阶段任务并抛出StageTimeout，与本地执行一致
+        :return: 节点提交的结果（附带服务端的artifact_path）
+        """
+        with self._condition:
+            job = self._jobs[job_id]
+            stage = job['stage']
+            timeout = control.timeouts.get(stage) if control is not None else None
+            deadline = job['created_at'] + timeout + Config.WORKER_PENDING_GRACE_SECONDS if timeout else None
+            while True:
+                self._expire_leases()
+                job = self._jobs[job_id]
+                if job['status'] in ('done', 'failed'):
+                    result = dict(job['result'] or {'success': False, 'message': job['message']})
+                    result['artifact_path'] = job['artifact_path']
+                    self._jobs.pop(job_id)
+                    return result
+                if control is not None and control.cancelled:
+                    break
+                if deadline is not None and time.time() > deadline:
+                    break
+                self._condition.wait(0.5)
+        timed_out = control is not None and not control.cancelled
+        if timed_out:
+            logger.error(f"阶段任务 {job_id} 超时（状态{job['status']}，节点 {job['worker_id']}），取消")
+        # 未领取的直接移除，已领取的在下次心跳时通知节点终止
+        self.cancel(job_id)
+        if timed_out:
+            control.timed_out_stage = stage
+            control.check(stage)
+        raise TaskCancelled(f"阶段任务 {job_id} 已取消")
+
+    def get_status(self):
+        with self._condition:
+            self._expire_leases()
+            return [{
+                'job_id': job['job_id'],
+                'task_id': job['task_id'],
+                'stage': job['stage'],
+                'status': job['status'],
+                'worker_id': job['worker_id'],
+                'attempts': job['attempts'],
+                'message': job['message'],
+                'lease_remaining': round(job['lease_expires'] - time.time(), 1)
+                if job['status'] == 'leased' else None,
+            } for job in self._jobs.values()]
+
+
+class RemotePipeline:
+    """
+    通过工作节点执行流水线阶段，返回值与本地的ColmapGenerator / ModelTrainer一致（路径为服务端路径）
+    COLMAP阶段上传 images + sparse + database.db 的归档，训练阶段直接复用该归档作为输入。
+    """
+
+    COLMAP_ARCHIVE_NAMES = ("images", "sparse", "database.db")
+
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
+
+    @staticmethod
+    def _spool_dir(video_dir):
+        spool_dir = Path(video_dir) / ".worker"
+        spool_dir.mkdir(exist_ok=True, parents=True)
+        return spool_dir
+
+    @staticmethod
+    def _record_resources(control, stage, result):
+        """工作节点采样的阶段资源占用并入任务统计"""
+        resources = result.pop('resources', None)
+        if control is not None and resources:
+            control.record_resources(stage, resources)
+
+    def generate_from_video(self, task_id, video_path, settings, control=None):
+        """远程执行抽帧和稀疏重建，结果解压到视频目录的colmap子目录"""
+        video_path = Path(video_path)
+        video_dir = video_path.parent
+        spool_dir = self._spool_dir(video_dir)
+        timeout = control.timeouts.get("colmap") if control else None
+        payload = {'settings': settings, 'timeout': timeout, 'video_name': video_path.name}
+        job_id = self.work_queue.publish(task_id, "colmap", payload, inputs={'video': video_path}, spool_dir=spool_dir)
+        result = self.work_queue.wait(job_id, control)
+        self._record_resources(control, "colmap", result)
+        if not result.get('success'):
+            return result
+        if not result.get('artifact_path'):
+            return {'success': False, 'message': '工作节点未上传COLMAP结果'}
+
+        colmap_dir = video_dir / "colmap"
+        for name in self.COLMAP_ARCHIVE_NAMES:
+            path = colmap_dir / name
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+        safe_extract(result['artifact_path'], colmap_dir)
+        # 归档保留，训练阶段直接作为输入
+        archive_path = spool_dir / "colmap.tar"
+        os.replace(result.pop('artifact_path'), archive_path)
+
+        sparse_dir = colmap_dir / "sparse"
+        preview_path = Config.sparse_model_dir(colmap_dir) / Config.SPARSE_PREVIEW_NAME
+        result.update({
+            'video_path': str(video_path),
+            'colmap_dir': str(colmap_dir),
+            'frames_dir': str(colmap_dir / "images"),
+            'sparse_dir': str(sparse_dir),
+            'preview_path': str(preview_path) if preview_path.exists() else None,
+            'colmap_archive': str(archive_path),
+        })
+        return result
+
+    def train(self, task_id, colmap_dir, extra_args=None, control=None):
+        """远程训练，输出解压到colmap同级的output目录"""
+        colmap_dir = Path(colmap_dir)
+        video_dir = colmap_dir.parent
+        spool_dir = self._spool_dir(video_dir)
+        archive_path = spool_dir / "colmap.tar"
+        if not archive_path.exists():
+            pack_paths(colmap_dir, self.COLMAP_ARCHIVE_NAMES, archive_path)
+
+        timeout = control.timeouts.get("training") if control else None
+        job_id = self.work_queue.publish(task_id, "training", {'extra_args': extra_args or {}, 'timeout': timeout},
+                                         inputs={'colmap': archive_path}, spool_dir=spool_dir)
+        result = self.work_queue.wait(job_id, control)
+        self._record_resources(control, "training", result)
+        if not result.get('success'):
+            return result
+        if not result.get('artifact_path'):
+            return {'success': False, 'message': '工作节点未上传训练结果'}
+
+        output_dir = video_dir / "output"
+        if output_dir.exists():
+            shutil.rmtree(output_dir)
+        safe_extract(result['artifact_path'], output_dir)
+        os.remove(result.pop('artifact_path'))
+        result.update({
+            'output_dir': str(output_dir),
+            'ply_path': str(output_dir / result['ply_relpath']),
+        })
+        return result
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 测试直接导入仓库根目录下的config和models
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import colmap_io  # noqa: E402
+
+
+def build_colmap_model(centers, points, rotations=None):
+    """
+    构造合成稀疏模型：第i个相机位于centers[i]（默认朝向为单位旋转），
+    每个三维点被所有相机观测（图像名为frame_00001.jpg起）
+    :return: (cameras, images, points3D)
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    cameras = {1: colmap_io.Camera(1, "PINHOLE", 640, 480, np.array([500.0, 500.0, 320.0, 240.0]))}
+    images = {}
+    for index, center in enumerate(centers):
+        image_id = index + 1
+        R = np.eye(3) if rotations is None else rotations[index]
+        images[image_id] = colmap_io.Image(
+            image_id, colmap_io.rotmat2qvec(R), -R @ center, 1, f"frame_{image_id:05d}.jpg",
+            np.tile([[320.0, 240.0]], (len(points), 1)), np.arange(1, len(points) + 1, dtype=np.int64))
+    points3D = {}
+    for index, xyz in enumerate(points):
+        point_id = index + 1
+        points3D[point_id] = colmap_io.Point3D(
+            point_id, xyz, np.array([128, 128, 128], dtype=np.uint8), 0.5,
+            np.array(sorted(images), dtype=np.int32), np.full(len(images), index, dtype=np.int32))
+    return cameras, images, points3D
+
+
+@pytest.fixture
+def colmap_model():
+    return build_colmap_model
@@ -0,0 +1,127 @@
+import collections
+
+import pytest
+
+from config import Config
+from models import admission as admission_module
+from models.admission import AdmissionController, AdmissionRejected
+
+GB = 1024 ** 3
+DiskUsage = collections.namedtuple("DiskUsage", ["total", "used", "free"])
+
+
+class FakeScheduler:
+    def __init__(self, max_concurrent=1, pending=0):
+        self.max_concurrent = max_concurrent
+        self.pending = pending
+
+    def pending_count(self):
+        return self.pending
+
+
+@pytest.fixture
+def limits(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(Config, "ADMISSION_MAX_JOBS_PER_USER", 2)
+    monkeypatch.setattr(Config, "ADMISSION_MAX_QUEUE_DEPTH", 5)
+    monkeypatch.setattr(Config, "ADMISSION_DEFER_BACKLOG_SECONDS", 3600)
+    monkeypatch.setattr(Config, "ADMISSION_MAX_BACKLOG_SECONDS", 7200)
+    monkeypatch.setattr(Config, "ADMISSION_DEFAULT_JOB_SECONDS", 600)
+    monkeypatch.setattr(Config, "ADMISSION_MIN_FREE_BYTES", 1 * GB)
+    monkeypatch.setattr(Config, "ADMISSION_DISK_FACTOR", 4)
+    monkeypatch.setattr(Config, "ADMISSION_RETRY_AFTER_RANGE", (30, 3600))
+    monkeypatch.setattr(admission_module.shutil, "disk_usage", lambda path: DiskUsage(100 * GB, 90 * GB, 10 * GB))
+
+
+def make_controller(tasks=None, scheduler=None):
+    tasks = {} if tasks is None else tasks
+    return AdmissionController(scheduler or FakeScheduler(), lambda: dict(tasks)), tasks
+
+
+def test_per_user_limit_counts_uploads_and_tasks(limits):
+    controller, tasks = make_controller()
+    tasks['alice_1'] = {'owner': 'alice', 'estimate': {'total_seconds': 100}}
+    controller.admit('alice', GB // 4)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('alice', GB // 4)
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after == 100
+    # 其他用户不受影响
+    controller.admit('bob', GB // 4)
+
+
+def test_queue_depth_rejected(limits):
+    controller, _ = make_controller(scheduler=FakeScheduler(pending=5))
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('alice', GB // 4)
+    assert rejected.value.status_code == 503
+    assert 30 <= rejected.value.retry_after <= 3600
+
+
+def test_backlog_rejects_and_defers(limits):
+    tasks = {f'u{i}_1': {'owner': f'u{i}', 'estimate': {'total_seconds': 1800}} for i in range(3)}
+    controller, _ = make_controller(tasks)
+    assert controller.backlog_seconds() == 5400
+    assert controller.should_defer() is not None
+    controller.admit('alice', GB // 4)
+
+    tasks['u3_1'] = {'owner': 'u3', 'eta': None}
+    tasks['u4_1'] = {'owner': 'u4', 'estimate': {'total_seconds': 1200}}
+    controller, _ = make_controller(tasks)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('alice', GB // 4)
+    assert rejected.value.status_code == 503
+
+
+def test_backlog_scaled_by_concurrency(limits):
+    tasks = {'a_1': {'owner': 'a', 'estimate': {'total_seconds': 4000}}}
+    controller, _ = make_controller(tasks, FakeScheduler(max_concurrent=2))
+    assert controller.backlog_seconds() == 2000
+    assert controller.should_defer() is None
+
+
+def test_disk_reservation_held_until_task_ends(limits):
+    controller, _ = make_controller()
+    # 空闲10GB，保留1GB，每次上传预留 2GB * 4 = 8GB
+    token = controller.admit('alice', 2 * GB)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit('bob', 2 * GB)
+    assert rejected.value.status_code == 503
+
+    controller.attach(token, 'alice_1')
+    controller.finish_upload(token)
+    status = controller.get_status()
+    assert status['uploads_in_progress'] == 0
+    assert status['tasks_reserving'] == 1
+    assert status['reserved_bytes'] == 8 * GB
+    with pytest.raises(AdmissionRejected):
+        controller.admit('bob', 2 * GB)
+
+    controller.release_task('alice_1')
+    assert controller.get_status()['reserved_bytes'] == 0
+    controller.admit('bob', 2 * GB)
+
+
+def test_unattached_upload_released_on_finish(limits):
+    controller, _ = make_controller()
+    token = controller.admit('alice', 2 * GB)
+    assert controller.get_status()['uploads_in_progress'] == 1
+
+    controller.finish_upload(token)
+
+    assert controller.get_status()['reserved_bytes'] == 0
+
+
+def test_unknown_size_reserves_max_content_length(limits, monkeypatch):
+    monkeypatch.setattr(Config, "MAX_CONTENT_LENGTH", GB // 2)
+    controller, _ = make_controller()
+    controller.admit('alice')
+    assert controller.get_status()['reserved_bytes'] == 2 * GB
+
+
+def test_remaining_seconds_prefers_eta():
+    assert AdmissionController.remaining_seconds({'eta': 150.0}, now=100.0) == 50.0
+    assert AdmissionController.remaining_seconds({'eta': 50.0}, now=100.0) == 0.0
+    assert AdmissionController.remaining_seconds({'estimate': {'total_seconds': 70}}) == 70
+    assert AdmissionController.remaining_seconds({}) == Config.ADMISSION_DEFAULT_JOB_SECONDS
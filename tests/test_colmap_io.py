@@ -0,0 +1,62 @@
+import numpy as np
+
+from models import colmap_io
+
+
+def random_rotation(rng):
+    q = rng.normal(size=4)
+    return colmap_io.qvec2rotmat(q / np.linalg.norm(q))
+
+
+def test_model_round_trip(tmp_path, colmap_model):
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-5, 5, size=(4, 3))
+    cameras, images, points3D = colmap_model(centers, rng.uniform(-5, 5, size=(6, 3)),
+                                             [random_rotation(rng) for _ in centers])
+
+    colmap_io.write_model(cameras, images, points3D, tmp_path / "sparse" / "0")
+    read_cameras, read_images, read_points3D = colmap_io.read_model(tmp_path / "sparse" / "0")
+
+    assert read_cameras.keys() == cameras.keys()
+    assert read_cameras[1].model == "PINHOLE"
+    np.testing.assert_array_equal(read_cameras[1].params, cameras[1].params)
+    assert read_images.keys() == images.keys()
+    for image_id, image in images.items():
+        read_image = read_images[image_id]
+        assert read_image.name == image.name
+        assert read_image.camera_id == image.camera_id
+        np.testing.assert_array_equal(read_image.qvec, image.qvec)
+        np.testing.assert_array_equal(read_image.tvec, image.tvec)
+        np.testing.assert_array_equal(read_image.xys, image.xys)
+        np.testing.assert_array_equal(read_image.point3D_ids, image.point3D_ids)
+    assert read_points3D.keys() == points3D.keys()
+    for point_id, point in points3D.items():
+        read_point = read_points3D[point_id]
+        np.testing.assert_array_equal(read_point.xyz, point.xyz)
+        np.testing.assert_array_equal(read_point.rgb, point.rgb)
+        np.testing.assert_array_equal(read_point.image_ids, point.image_ids)
+        np.testing.assert_array_equal(read_point.point2D_idxs, point.point2D_idxs)
+
+
+def test_read_entry_count(tmp_path, colmap_model):
+    model = colmap_model(np.zeros((3, 3)), np.zeros((5, 3)))
+    colmap_io.write_model(*model, tmp_path)
+    assert colmap_io.read_entry_count(tmp_path / "images.bin") == 3
+    assert colmap_io.read_entry_count(tmp_path / "points3D.bin") == 5
+
+
+def test_qvec_rotmat_round_trip():
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        R = random_rotation(rng)
+        np.testing.assert_allclose(colmap_io.qvec2rotmat(colmap_io.rotmat2qvec(R)), R, atol=1e-9)
+        assert colmap_io.rotmat2qvec(R)[0] >= 0
+
+
+def test_camera_center():
+    rng = np.random.default_rng(2)
+    R = random_rotation(rng)
+    center = np.array([1.0, -2.0, 3.0])
+    image = colmap_io.Image(1, colmap_io.rotmat2qvec(R), -R @ center, 1, "a.jpg", np.zeros((0, 2)),
+                            np.zeros(0, dtype=np.int64))
+    np.testing.assert_allclose(colmap_io.camera_center(image), center, atol=1e-9)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from models import colmap_io
+from models.model_merger import ModelMerger
+
+
+def similarity(seed):
+    rng = np.random.default_rng(seed)
+    q = rng.normal(size=4)
+    R = colmap_io.qvec2rotmat(q / np.linalg.norm(q))
+    return 1.7, R, np.array([0.5, -2.0, 3.0])
+
+
+def transform_model(model, s, R, t):
+    """把模型变换到另一坐标系: X' = s * R @ X + t"""
+    cameras, images, points3D = model
+    moved_images = {}
+    for image_id, image in images.items():
+        R_i = colmap_io.qvec2rotmat(image.qvec) @ R.T
+        center = s * R @ colmap_io.camera_center(image) + t
+        moved_images[image_id] = image._replace(qvec=colmap_io.rotmat2qvec(R_i), tvec=-R_i @ center)
+    moved_points = {pid: point._replace(xyz=s * R @ point.xyz + t) for pid, point in points3D.items()}
+    return cameras, moved_images, moved_points
+
+
+def test_umeyama_recovers_similarity():
+    s, R, t = similarity(0)
+    src = np.random.default_rng(1).uniform(-3, 3, size=(10, 3))
+    dst = (s * (R @ src.T)).T + t
+
+    est_s, est_R, est_t = ModelMerger.umeyama(src, dst)
+
+    assert est_s == pytest.approx(s)
+    np.testing.assert_allclose(est_R, R, atol=1e-9)
+    np.testing.assert_allclose(est_t, t, atol=1e-9)
+
+
+def test_merge_aligns_second_model(tmp_path, colmap_model):
+    rng = np.random.default_rng(3)
+    centers = np.column_stack([np.arange(10.0), rng.uniform(-0.5, 0.5, 10), rng.uniform(-0.5, 0.5, 10)])
+    points = rng.uniform(-2, 12, size=(8, 3))
+    full = colmap_model(centers, points)
+
+    # 子模型A含帧1~7（图像最多，作为基准），子模型B含帧5~10且位于另一坐标系，共享帧5~7
+    cameras, images, points3D = full
+    model_a = (cameras, {i: images[i] for i in range(1, 8)}, {})
+    s, R, t = similarity(4)
+    model_b = transform_model((cameras, {i: images[i] for i in range(5, 11)}, points3D), s, R, t)
+    colmap_io.write_model(*model_a, tmp_path / "a")
+    colmap_io.write_model(*model_b, tmp_path / "b")
+
+    stats = ModelMerger().merge([tmp_path / "a", tmp_path / "b"], tmp_path / "merged")
+
+    assert stats['merged_models'] == 2
+    assert stats['skipped_models'] == 0
+    assert stats['num_images'] == 10
+    _, merged_images, merged_points = colmap_io.read_model(tmp_path / "merged")
+    merged_centers = {image.name: colmap_io.camera_center(image) for image in merged_images.values()}
+    for image in images.values():
+        np.testing.assert_allclose(merged_centers[image.name], colmap_io.camera_center(image), atol=1e-6)
+    # 点云变换回子模型A的坐标系
+    assert len(merged_points) == len(points)
+    for point in merged_points.values():
+        assert np.min(np.linalg.norm(points - point.xyz, axis=1)) < 1e-6
+
+
+def test_merge_skips_model_without_shared_frames(tmp_path, colmap_model):
+    cameras, images, _ = colmap_model(np.column_stack([np.arange(8.0), np.zeros(8), np.zeros(8)]), [])
+    colmap_io.write_model(cameras, {i: images[i] for i in range(1, 5)}, {}, tmp_path / "a")
+    colmap_io.write_model(cameras, {i: images[i] for i in range(6, 9)}, {}, tmp_path / "b")
+
+    stats = ModelMerger().merge([tmp_path / "a", tmp_path / "b"], tmp_path / "merged")
+
+    assert stats['merged_models'] == 1
+    assert stats['skipped_models'] == 1
+    assert stats['num_images'] == 4
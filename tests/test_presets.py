@@ -0,0 +1,62 @@
+import pytest
+
+from config import Config
+from models.presets import TRAINING_OPTIONS, preset_key, resolve_preset, validate_options
+
+
+def test_named_preset():
+    preset = resolve_preset("draft")
+    assert preset['name'] == "draft"
+    assert preset['colmap'] == Config.PIPELINE_PRESETS["draft"]["colmap"]
+    assert preset['training'] == Config.PIPELINE_PRESETS["draft"]["training"]
+
+
+def test_default_preset():
+    assert resolve_preset()['base'] == Config.DEFAULT_PRESET
+
+
+def test_custom_overrides_base():
+    preset = resolve_preset("custom", {"base": "draft", "iterations": 15000, "camera_model": "SIMPLE_PINHOLE",
+                                       "max_frames": None, "resolution": -1})
+    assert preset['base'] == "draft"
+    assert preset['training']['iterations'] == 15000
+    assert preset['training']['resolution'] == -1
+    assert preset['colmap']['camera_model'] == "SIMPLE_PINHOLE"
+    assert preset['colmap']['max_frames'] is None
+    # 不修改配置中的预设
+    assert Config.PIPELINE_PRESETS["draft"]["training"]['iterations'] != 15000
+
+
+def test_preset_key_ignores_name():
+    custom = resolve_preset("custom", {"base": "draft"})
+    assert preset_key(custom) == preset_key(resolve_preset("draft"))
+    assert preset_key(custom) != preset_key(resolve_preset("custom", {"base": "draft", "iterations": 100}))
+
+
+@pytest.mark.parametrize("name, overrides", [
+    ("unknown", None),
+    ("draft", {"iterations": 100}),
+    ("custom", {"base": "unknown"}),
+    ("custom", {"unknown_option": 1}),
+    ("custom", {"matcher": "spatial"}),
+    ("custom", {"camera_model": "OPENCV"}),
+    ("custom", {"camera_model": "SIMPLE_RADIAL"}),
+    ("custom", {"max_frames": 1}),
+    ("custom", {"max_frames": True}),
+    ("custom", {"resolution": 0}),
+    ("custom", {"resolution": False}),
+    ("custom", {"iterations": True}),
+    ("custom", {"iterations": "30000"}),
+    ("custom", {"frame_interval": 0}),
+])
+def test_invalid_presets_rejected(name, overrides):
+    with pytest.raises(ValueError):
+        resolve_preset(name, overrides)
+
+
+def test_validate_options_restricts_keys():
+    validate_options({"iterations": 7000, "resolution": 2}, TRAINING_OPTIONS)
+    with pytest.raises(ValueError):
+        validate_options({"matcher": "exhaustive"}, TRAINING_OPTIONS)
+    with pytest.raises(ValueError):
+        validate_options({"iterations": -1}, TRAINING_OPTIONS)
@@ -0,0 +1,44 @@
+from models.remote_worker import StageWorker
+
+
+class FakeClient:
+    """记录请求的工作节点客户端，领取时依次返回jobs中的任务"""
+
+    worker_id = "w1"
+    server = "http://test"
+
+    def __init__(self, worker, jobs):
+        self.worker = worker
+        self.jobs = list(jobs)
+        self.posted = []
+
+    def post_json(self, path, payload=None):
+        self.posted.append((path, payload))
+        if path.endswith("/claim"):
+            if not self.jobs:
+                self.worker.stop()
+                return 200, {'job': None}
+            return 200, {'job': self.jobs.pop(0)}
+        return 200, {}
+
+    def download(self, path, target):
+        target.write_bytes(b"not a tar archive")
+        return target
+
+
+def job(job_id):
+    return {'job_id': job_id, 'stage': 'training', 'payload': {}, 'attempt': 1, 'lease_seconds': 30}
+
+
+def test_failed_job_reported_and_loop_continues(tmp_path):
+    worker = StageWorker(None, tmp_path)
+    worker.client = FakeClient(worker, [job("j1"), job("j2")])
+
+    worker.run_forever()
+
+    completed = [(path, payload['result']) for path, payload in worker.client.posted if path.endswith("/complete")]
+    assert [path for path, _ in completed] == ["/api/worker/jobs/j1/complete", "/api/worker/jobs/j2/complete"]
+    for _, result in completed:
+        assert not result['success']
+        assert "ReadError" in result['message']
+    assert not (tmp_path / "j1").exists()
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from config import Config
+from models import colmap_io
+from models.ply_reader import ply_header_bytes, read_vertices
+from models.scene_partition import ScenePartitioner, ground_basis, inside
+
+
+@pytest.fixture
+def partitioner(monkeypatch):
+    # 不调用nvidia-smi
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "")
+    return ScenePartitioner(max_images_per_cell=10, overlap=0.15)
+
+
+@pytest.fixture
+def street(tmp_path, colmap_model):
+    """沿x轴拍摄的40个相机，稀疏点分布在路线两侧"""
+    rng = np.random.default_rng(0)
+    centers = np.column_stack([np.linspace(0, 39, 40), rng.uniform(-0.2, 0.2, 40), rng.uniform(-1, 1, 40)])
+    points = np.column_stack([rng.uniform(-2, 41, 200), rng.uniform(-1, 1, 200), rng.uniform(2, 6, 200)])
+    model = colmap_model(centers, points)
+    colmap_io.write_model(*model, Config.sparse_model_dir(tmp_path / "colmap"))
+    return tmp_path / "colmap", model
+
+
+def test_ground_basis_spans_route(street):
+    _, (_, images, _) = street
+    basis = ground_basis(list(images.values()))
+    np.testing.assert_allclose(basis @ basis.T, np.eye(2), atol=1e-9)
+    # 相机y轴朝下（单位旋转），地面平面为xz平面，第一轴沿路线方向
+    np.testing.assert_allclose(basis[:, 1], 0, atol=1e-9)
+    assert abs(basis[0, 0]) > 0.99
+
+
+def test_plan_cells_cover_scene(partitioner, street):
+    colmap_dir, _ = street
+    (cameras, images, points3D), basis, cells = partitioner.plan(Config.sparse_model_dir(colmap_dir))
+
+    assert len(cells) >= 4
+    camera_xy = {image.id: colmap_io.camera_center(image) @ basis.T for image in images.values()}
+    point_xy = {pid: point.xyz @ basis.T for pid, point in points3D.items()}
+    for image_id, xy in camera_xy.items():
+        owners = [cell for cell in cells if inside(xy[None], cell['core'])[0]]
+        assert len(owners) == 1
+        assert image_id in owners[0]['image_ids']
+    for pid, xy in point_xy.items():
+        owners = [cell for cell in cells if inside(xy[None], cell['core'])[0]]
+        assert len(owners) == 1
+        assert pid in owners[0]['point_ids']
+    for cell in cells:
+        in_core = sum(inside(xy[None], cell['core'])[0] for xy in camera_xy.values())
+        assert in_core <= partitioner.max_images_per_cell
+        assert np.all(cell['expanded'][0] <= cell['core'][0]) and np.all(cell['expanded'][1] >= cell['core'][1])
+
+
+def test_plan_rejects_empty_model(partitioner, tmp_path, colmap_model):
+    colmap_io.write_model(*colmap_model(np.zeros((0, 3)), []), tmp_path)
+    with pytest.raises(ValueError):
+        partitioner.plan(tmp_path)
+
+
+def test_write_cell(partitioner, street, tmp_path):
+    colmap_dir, _ = street
+    images_dir = colmap_dir / "images"
+    images_dir.mkdir()
+    for image_id in range(1, 41):
+        (images_dir / f"frame_{image_id:05d}.jpg").write_bytes(b"jpg")
+    model, _, cells = partitioner.plan(Config.sparse_model_dir(colmap_dir))
+    cell = cells[0]
+
+    num_images, num_points = partitioner.write_cell(model, cell, images_dir, tmp_path / "cell_00")
+
+    _, images, points3D = colmap_io.read_model(Config.sparse_model_dir(tmp_path / "cell_00"))
+    assert set(images) == cell['image_ids'] and num_images == len(images)
+    assert set(points3D) <= cell['point_ids'] and num_points == len(points3D)
+    for point in points3D.values():
+        assert set(point.image_ids.tolist()) <= cell['image_ids']
+    assert sorted(path.name for path in (tmp_path / "cell_00" / "images").iterdir()) == \
+        sorted(images[i].name for i in images)
+
+
+def write_gaussians(path, x, cell_index):
+    dtype = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("opacity", "<f4")])
+    vertices = np.zeros(len(x), dtype=dtype)
+    vertices["x"] = x
+    vertices["opacity"] = cell_index
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(ply_header_bytes(dtype, len(vertices)))
+        f.write(vertices.tobytes())
+    return path
+
+
+def test_merge_keeps_core_gaussians(tmp_path):
+    basis = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+    overlap_x = [-3.0, -1.0, 0.5, 2.0]
+    cells = [
+        {'index': 0, 'core': (np.array([-np.inf, -np.inf]), np.array([0.0, np.inf])),
+         'ply_path': write_gaussians(tmp_path / "cell_00.ply", overlap_x, 0)},
+        {'index': 1, 'core': (np.array([0.0, -np.inf]), np.array([np.inf, np.inf])),
+         'ply_path': write_gaussians(tmp_path / "cell_01.ply", overlap_x, 1)},
+    ]
+
+    total = ScenePartitioner.merge(cells, basis, tmp_path / "merged" / "point_cloud.ply")
+
+    merged = read_vertices(tmp_path / "merged" / "point_cloud.ply")
+    assert total == len(merged) == 4
+    assert [cell['gaussians_kept'] for cell in cells] == [2, 2]
+    assert [cell['gaussians_total'] for cell in cells] == [4, 4]
+    np.testing.assert_array_equal(merged["x"], [-3.0, -1.0, 0.5, 2.0])
+    np.testing.assert_array_equal(merged["opacity"], [0, 0, 1, 1])
+
+
+def test_merge_rejects_mismatched_properties(tmp_path):
+    other = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4")])
+    path = tmp_path / "cell_01.ply"
+    with open(path, "wb") as f:
+        f.write(ply_header_bytes(other, 1))
+        f.write(np.zeros(1, dtype=other).tobytes())
+    bounds = (np.full(2, -np.inf), np.full(2, np.inf))
+    cells = [{'index': 0, 'core': bounds, 'ply_path': write_gaussians(tmp_path / "cell_00.ply", [0.0], 0)},
+             {'index': 1, 'core': bounds, 'ply_path': path}]
+    with pytest.raises(ValueError):
+        ScenePartitioner.merge(cells, np.eye(3)[[0, 2]], tmp_path / "merged.ply")
@@ -0,0 +1,53 @@
+import pytest
+
+from config import Config
+from models.task_logger import TaskLogManager
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "TASK_LOG_READ_MAX_BYTES", 64)
+    monkeypatch.setattr(Config, "TASK_LOG_READ_MAX_LINES", 5)
+    path = tmp_path / "task.log"
+    path.write_text("".join(f"line {i:03d}\n" for i in range(20)), encoding="utf-8")  # 每行9字节
+    return path
+
+
+def test_bytes_returns_whole_lines(log_path):
+    chunk = TaskLogManager.read(log_path, 0, "bytes", 20)
+    assert chunk['text'] == "line 000\nline 001\n"
+    assert chunk['next_offset'] == 18
+    assert chunk['size'] == 180
+
+    chunk = TaskLogManager.read(log_path, chunk['next_offset'], "bytes", 20)
+    assert chunk['text'] == "line 002\nline 003\n"
+
+
+@pytest.mark.parametrize("limit", [None, 0, 10 ** 9])
+def test_bytes_limit_capped(log_path, limit):
+    chunk = TaskLogManager.read(log_path, 0, "bytes", limit)
+    assert 0 < chunk['next_offset'] <= Config.TASK_LOG_READ_MAX_BYTES
+
+
+def test_negative_bytes_limit_does_not_read_whole_log(log_path):
+    chunk = TaskLogManager.read(log_path, 0, "bytes", -1)
+    assert chunk['next_offset'] == 1
+
+
+@pytest.mark.parametrize("limit, expected", [(None, 5), (2, 2), (-3, 1), (10 ** 9, 5)])
+def test_lines_limit_clamped(log_path, limit, expected):
+    chunk = TaskLogManager.read(log_path, 3, "lines", limit)
+    assert chunk['next_offset'] == 3 + expected
+    assert chunk['text'].splitlines()[0] == "line 003"
+
+
+def test_negative_offset_rejected(log_path):
+    with pytest.raises(ValueError):
+        TaskLogManager.read(log_path, -1)
+
+
+def test_offset_past_end_restarts_after_rotation(log_path):
+    chunk = TaskLogManager.read(log_path, 10 ** 6, "bytes", 9)
+    assert chunk['rotated']
+    assert chunk['offset'] == 0
+    assert chunk['text'] == "line 000\n"
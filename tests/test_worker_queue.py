@@ -0,0 +1,137 @@
+import io
+import tarfile
+import time
+
+import pytest
+
+from config import Config
+from models.task_control import StageTimeout, TaskCancelled, TaskControl
+from models.worker_queue import WorkQueue, pack_paths, safe_extract
+
+
+def write_tar(path, members):
+    """members: [(TarInfo, 内容或None)]"""
+    with tarfile.open(path, "w") as tar:
+        for info, data in members:
+            if data is not None:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            else:
+                tar.addfile(info)
+    return path
+
+
+def test_pack_and_extract(tmp_path):
+    (tmp_path / "src" / "sparse" / "0").mkdir(parents=True)
+    (tmp_path / "src" / "sparse" / "0" / "cameras.bin").write_bytes(b"cameras")
+    (tmp_path / "src" / "database.db").write_bytes(b"db")
+    archive = pack_paths(tmp_path / "src", ("sparse", "database.db", "missing"), tmp_path / "out.tar")
+
+    safe_extract(archive, tmp_path / "dest")
+
+    assert (tmp_path / "dest" / "sparse" / "0" / "cameras.bin").read_bytes() == b"cameras"
+    assert (tmp_path / "dest" / "database.db").read_bytes() == b"db"
+
+
+@pytest.mark.parametrize("name", ["../escape.txt", "sub/../../escape.txt", "/tmp/absolute.txt"])
+def test_extract_rejects_paths_outside(tmp_path, name):
+    archive = write_tar(tmp_path / "bad.tar", [(tarfile.TarInfo(name), b"x")])
+    with pytest.raises(ValueError):
+        safe_extract(archive, tmp_path / "dest")
+    assert not (tmp_path / "escape.txt").exists()
+
+
+@pytest.mark.parametrize("member_type", [tarfile.SYMTYPE, tarfile.LNKTYPE, tarfile.CHRTYPE])
+def test_extract_rejects_links_and_devices(tmp_path, member_type):
+    info = tarfile.TarInfo("link")
+    info.type = member_type
+    info.linkname = "/etc/passwd"
+    archive = write_tar(tmp_path / "bad.tar", [(info, None)])
+    with pytest.raises(ValueError):
+        safe_extract(archive, tmp_path / "dest")
+
+
+def test_claim_heartbeat_complete_wait():
+    queue = WorkQueue(lease_seconds=30)
+    job_id = queue.publish("task", "colmap", {'settings': {}})
+
+    assert queue.claim("w1", stages=["training"]) is None
+    job = queue.claim("w1", stages=["colmap"])
+    assert job['job_id'] == job_id
+    assert job['attempt'] == 1
+    assert queue.claim("w2") is None
+    assert queue.heartbeat(job_id, "w2") is None
+    assert queue.heartbeat(job_id, "w1") == {'cancel': False}
+    assert not queue.complete(job_id, "w2", {'success': True})
+    assert queue.complete(job_id, "w1", {'success': True, 'message': 'ok'}, "/spool/a.tar")
+
+    result = queue.wait(job_id)
+    assert result == {'success': True, 'message': 'ok', 'artifact_path': "/spool/a.tar"}
+    assert queue.get_status() == []
+
+
+def test_expired_lease_requeued_then_failed():
+    queue = WorkQueue(lease_seconds=0.05, max_attempts=2)
+    job_id = queue.publish("task", "training", {})
+
+    queue.claim("w1")
+    time.sleep(0.1)
+    # 失联节点的租约已过期，任务重新排队给其他节点
+    assert queue.heartbeat(job_id, "w1") is None
+    job = queue.claim("w2")
+    assert job['job_id'] == job_id
+    assert job['attempt'] == 2
+
+    time.sleep(0.1)
+    result = queue.wait(job_id)
+    assert not result['success']
+    assert "失联" in result['message']
+
+
+def test_heartbeat_extends_lease():
+    queue = WorkQueue(lease_seconds=0.2)
+    job_id = queue.publish("task", "colmap", {})
+    queue.claim("w1")
+    for _ in range(4):
+        time.sleep(0.1)
+        assert queue.heartbeat(job_id, "w1") == {'cancel': False}
+
+
+def test_cancel_notifies_worker_on_heartbeat():
+    queue = WorkQueue(lease_seconds=30)
+    pending = queue.publish("task", "colmap", {})
+    queue.cancel(pending)
+    assert queue.claim("w1") is None
+
+    job_id = queue.publish("task", "training", {})
+    queue.claim("w1")
+    queue.cancel(job_id)
+    assert queue.heartbeat(job_id, "w1") == {'cancel': True}
+    assert queue.get_status() == []
+
+
+def test_wait_raises_when_task_cancelled():
+    queue = WorkQueue(lease_seconds=30)
+    job_id = queue.publish("task", "colmap", {})
+    control = TaskControl("task")
+    control.cancel()
+    with pytest.raises(TaskCancelled):
+        queue.wait(job_id, control)
+    assert queue.get_status() == []
+
+
+@pytest.mark.parametrize("claimed", [False, True])
+def test_wait_enforces_stage_timeout(monkeypatch, claimed):
+    monkeypatch.setattr(Config, "WORKER_PENDING_GRACE_SECONDS", 0)
+    queue = WorkQueue(lease_seconds=30)
+    job_id = queue.publish("task", "colmap", {})
+    if claimed:
+        queue.claim("w1")
+    control = TaskControl("task", {"colmap": 0.2})
+
+    with pytest.raises(StageTimeout):
+        queue.wait(job_id, control)
+    assert control.timed_out_stage == "colmap"
+    if claimed:
+        assert queue.heartbeat(job_id, "w1") == {'cancel': True}
+    assert queue.get_status() == []
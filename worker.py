@@ -0,0 +1,38 @@
+"""
+远程工作节点：从Web端领取COLMAP重建/训练阶段任务在本机执行
+用法: python worker.py --server http://web-host:8090 --token <WORKER_TOKEN> [--stages colmap,training] [--gpu 0]
+Web端需设置 WORKER_MODE=remote，可在多台机器（或同一台机器的多个进程）上同时运行。
+"""
+import argparse
+import logging
+
+from config import Config
+from models.remote_worker import WorkerClient, StageWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="3DGS流水线远程工作节点")
+    parser.add_argument("--server", default=f"http://127.0.0.1:{Config.PORT}", help="Web端地址")
+    parser.add_argument("--token", default=Config.WORKER_TOKEN, help="工作节点令牌（与Web端WORKER_TOKEN一致）")
+    parser.add_argument("--stages", default=",".join(StageWorker.STAGES), help="可执行的阶段，逗号分隔")
+    parser.add_argument("--work-dir", default=str(Config.BASE_DIR / "worker_data"), help="本地工作目录")
+    parser.add_argument("--gpu", type=int, default=None, help="训练使用的GPU编号")
+    parser.add_argument("--worker-id", default=None, help="节点标识，默认为 主机名-进程号")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(StageWorker.STAGES)
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(sorted(unknown))}")
+
+    client = WorkerClient(args.server, args.token, args.worker_id or StageWorker.default_worker_id())
+    worker = StageWorker(client, args.work_dir, stages, args.gpu)
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()